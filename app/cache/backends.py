@@ -0,0 +1,131 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+
+class CacheBackend:
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: int):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, ttl: int) -> int:
+        raise NotImplementedError
+
+    async def stats(self) -> dict:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Stamps are kept apart from the entries, in order of their last write, which is also expiry order
+        self._stamps: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self.stamp_evictions = 0
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            if key in self._stamps:
+                expires_at, stamp = self._stamps[key]
+                values.append(stamp if expires_at > now else None)
+                continue
+            item = self._entries.get(key)
+            if item is None:
+                values.append(None)
+            elif item[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                values.append(None)
+            else:
+                self._entries.move_to_end(key)
+                values.append(item[1])
+        return values
+
+    async def set(self, key: str, value: Any, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def incr(self, key: str, ttl: int) -> int:
+        now = time.monotonic()
+        expires_at, stamp = self._stamps.pop(key, (0, 0))
+        stamp = stamp + 1 if expires_at > now else 1
+        self._stamps[key] = (now + ttl, stamp)
+        while len(self._stamps) > self.max_entries:
+            _, (expires_at, _) = self._stamps.popitem(last=False)
+            if expires_at > now:
+                # A live stamp reads as 0 once evicted, which entries cached before its first write would match
+                # again; dropping the entries too keeps that from serving them. Each entry is dropped at most once
+                self._entries.clear()
+                self.stamp_evictions += 1
+        return stamp
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stamps": len(self._stamps),
+            "stamp_evictions": self.stamp_evictions,
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        # Imported lazily so redis is only needed when this backend is selected
+        from redis.asyncio import Redis
+        return cls(Redis.from_url(url))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        values = await self.client.mget(keys)
+        return [json.loads(value) if value is not None else None for value in values]
+
+    async def set(self, key: str, value: Any, ttl: int):
+        await self.client.set(key, json.dumps(value), ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def incr(self, key: str, ttl: int) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+            stamp, _ = await pipe.execute()
+        return stamp
+
+    async def stats(self) -> dict:
+        info = await self.client.info("stats")
+        return {
+            "backend": "redis",
+            "evictions": info.get("evicted_keys", 0),
+            "expirations": info.get("expired_keys", 0),
+        }
+
+    async def close(self):
+        await self.client.aclose()
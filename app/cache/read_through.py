@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional, Tuple
+
+from app.cache.backends import CacheBackend
+
+
+class EntityCache:
+    """
+    Read-through cache for one entity type, keyed by any lookup field (id, title, ...).
+
+    Every entry records the entity's stamp at the time it was loaded. Writes bump the stamp,
+    so an entry filled by a read that raced with a write is rejected on the next lookup
+    instead of being served stale. Stamps outlive entries (2x TTL) for the same reason.
+    """
+
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: int = 300):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _entry_key(self, field: str, value: str) -> str:
+        return f"{self.namespace}:{field}:{value}"
+
+    def _stamp_key(self, entity_id: str) -> str:
+        return f"{self.namespace}:stamp:{entity_id}"
+
+    async def lookup(self, field: str, value: str) -> Tuple[Optional[dict], Optional[int]]:
+        """Return (cached data, current stamp); the stamp is only known up front for id lookups."""
+        if field == "id":
+            entry, stamp = await self.backend.get_many([self._entry_key(field, value), self._stamp_key(value)])
+            stamp = stamp or 0
+        else:
+            entry, = await self.backend.get_many([self._entry_key(field, value)])
+            if entry is None:
+                self.misses += 1
+                return None, None
+            stamp = await self.stamp(entry["data"]["id"])
+
+        if entry is None:
+            self.misses += 1
+            return None, stamp
+        if entry["stamp"] != stamp:
+            self.stale += 1
+            self.misses += 1
+            return None, stamp
+        self.hits += 1
+        return entry["data"], stamp
+
+    async def stamp(self, entity_id: str) -> int:
+        stamp, = await self.backend.get_many([self._stamp_key(entity_id)])
+        return stamp or 0
+
+    async def stamps(self, entity_ids: List[str]) -> Dict[str, int]:
+        values = await self.backend.get_many([self._stamp_key(entity_id) for entity_id in entity_ids])
+        return {entity_id: stamp or 0 for entity_id, stamp in zip(entity_ids, values)}
+
+    async def store(self, field: str, value: str, data: dict, stamp: int):
+        """`stamp` must have been read before `data` was loaded, or a racing write could be cached over."""
+        await self.backend.set(self._entry_key(field, value), {"stamp": stamp, "data": data}, self.ttl)
+
+    async def invalidate(self, entity_id: str, *keys: Tuple[str, str]):
+        await self.backend.incr(self._stamp_key(entity_id), self.ttl * 2)
+        await self.backend.delete(self._entry_key("id", entity_id), *[self._entry_key(f, v) for f, v in keys])
+
+    async def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            **await self.backend.stats(),
+        }
+
+
+def create_entity_cache(backend: Optional[CacheBackend], namespace: str, ttl: int) -> Optional[EntityCache]:
+    if backend is None:
+        return None
+    return EntityCache(backend, namespace, ttl)
@@ -1,27 +1,262 @@
+import os
+from typing import Optional
+
 from dependency_injector import containers, providers
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.cache.backends import InMemoryCacheBackend, RedisCacheBackend
+from app.cache.read_through import create_entity_cache
+from app.crud.facets_crud import BookFacetsCRUD
+from app.crud.reservations_crud import ReservationCRUD, create_hold_reaper
+from app.utils.change_streams import InProcessChangeSource, MongoChangeStreamSource, ResumeTokenStore, \
+    create_change_consumer
+from app.utils.concurrency_limit import create_concurrency_limiter, create_route_limiters
+from app.utils.http_cache import HttpCache, parse_route_policies
+from app.utils.mongo_client import create_mongo_client, get_collection
+from app.utils.mongo_monitoring import CommandMetricsListener, PoolMonitor
+from app.utils.rate_limit import InMemoryRateLimitBackend, RedisRateLimitBackend, create_rate_limiter
+from app.utils.single_flight import create_single_flight
 
 load_dotenv()
 
 
+def as_bool(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def as_optional_int(value) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
 class Container(containers.DeclarativeContainer):
     # Database client
     config = providers.Configuration()
 
+    pool_monitor = providers.Singleton(PoolMonitor)
+
+    command_monitor = providers.Singleton(CommandMetricsListener)
+
     db_client = providers.Singleton(
-        AsyncIOMotorClient,
-        config.mongodb.url
+        create_mongo_client,
+        config.mongodb,
+        providers.List(pool_monitor, command_monitor)
+    )
+
+    database = providers.Factory(
+        lambda client, name: client[name],
+        db_client,
+        config.mongodb.database
     )
 
     book_collection = providers.Factory(
-        lambda client: client["book_store"]["books"],
-        db_client
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "books",
+        read_concern=config.mongodb.write_read_concern
+    )
+
+    # Catalog reads (listings, ranges) can be served by secondaries
+    book_read_collection = providers.Factory(
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "books",
+        read_preference=config.mongodb.catalog_read_preference,
+        read_concern=config.mongodb.catalog_read_concern
+    )
+
+    book_facets_collection = providers.Factory(
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "book_facets"
     )
 
+    book_facets = providers.Factory(BookFacetsCRUD, book_facets_collection, book_read_collection)
+
     author_collection = providers.Factory(
-        lambda client: client["book_store"]["authors"],
-        db_client
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "authors",
+        read_concern=config.mongodb.write_read_concern
+    )
+
+    # Cache
+    cache_backend = providers.Selector(
+        config.cache.backend,
+        memory=providers.Singleton(InMemoryCacheBackend, config.cache.max_entries),
+        redis=providers.Singleton(RedisCacheBackend.from_url, config.cache.redis_url),
+        none=providers.Object(None),
+    )
+
+    book_cache = providers.Singleton(create_entity_cache, cache_backend, "book", config.cache.ttl)
+
+    author_cache = providers.Singleton(create_entity_cache, cache_backend, "author", config.cache.ttl)
+
+    # Coalesces identical concurrent book reads
+    single_flight = providers.Singleton(create_single_flight, config.single_flight.enabled)
+
+    # Change events for books and authors, from any writer
+    change_source = providers.Selector(
+        config.change_stream.source,
+        mongo=providers.Factory(MongoChangeStreamSource, database, ["books", "authors"],
+                                config.change_stream.batch_interval_ms),
+        memory=providers.Singleton(InProcessChangeSource, max_await_ms=config.change_stream.batch_interval_ms),
+        none=providers.Object(None),
+    )
+
+    change_tokens_collection = providers.Factory(
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "change_stream_tokens"
+    )
+
+    leases_collection = providers.Factory(
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "leases"
     )
 
+    change_consumer = providers.Singleton(
+        create_change_consumer,
+        change_source,
+        providers.Factory(ResumeTokenStore, change_tokens_collection, config.change_stream.name),
+        config.change_stream.batch_size,
+        config.change_stream.batch_interval_ms
+    )
+
+    # Stock reservations; holds expire and are purged through a TTL index
+    book_holds_collection = providers.Factory(
+        get_collection,
+        db_client,
+        config.mongodb.database,
+        "book_holds"
+    )
+
+    reservations = providers.Factory(
+        ReservationCRUD,
+        book_collection,
+        book_holds_collection,
+        book_cache,
+        config.reservations.hold_seconds,
+        config.reservations.retention_seconds
+    )
+
+    hold_reaper = providers.Singleton(create_hold_reaper, reservations, config.reservations.reaper_interval_seconds)
+
+    # Rate limits per client (token buckets, shared through Redis or per worker) and concurrency limits per worker
+    rate_limit_backend = providers.Selector(
+        config.rate_limit.backend,
+        memory=providers.Singleton(InMemoryRateLimitBackend),
+        redis=providers.Singleton(RedisRateLimitBackend.from_url, config.rate_limit.redis_url),
+        none=providers.Object(None),
+    )
+
+    rate_limiter = providers.Singleton(create_rate_limiter, rate_limit_backend, config.rate_limit.default,
+                                       config.rate_limit.routes)
+
+    concurrency_limiter = providers.Singleton(create_concurrency_limiter, config.concurrency_limit)
+
+    route_concurrency_limiters = providers.Singleton(
+        create_route_limiters,
+        config.concurrency_limit.routes,
+        config.concurrency_limit.queue_size,
+        config.concurrency_limit.queue_timeout_ms
+    )
+
+    # ETag / Last-Modified handling and Cache-Control per route
+    http_cache = providers.Singleton(HttpCache, config.http_cache.default_policy, config.http_cache.route_policies)
+
+
+def load_config(container: Container):
+    config = container.config
+    config.mongodb.url.from_value(os.getenv("MONGODB_URL"))
+    config.mongodb.database.from_env("MONGODB_DATABASE", default="book_store")
+    config.mongodb.reconcile_indexes.from_env("MONGODB_RECONCILE_INDEXES", default=True, as_=as_bool)
+    config.mongodb.max_pool_size.from_env("MONGODB_MAX_POOL_SIZE", default=100, as_=int)
+    config.mongodb.min_pool_size.from_env("MONGODB_MIN_POOL_SIZE", default=0, as_=int)
+    config.mongodb.pool_budget.from_env("MONGODB_POOL_BUDGET", default=None, as_=as_optional_int)
+    config.mongodb.max_idle_time_ms.from_env("MONGODB_MAX_IDLE_TIME_MS", default=None, as_=as_optional_int)
+    config.mongodb.wait_queue_timeout_ms.from_env("MONGODB_WAIT_QUEUE_TIMEOUT_MS", default=None, as_=as_optional_int)
+    config.mongodb.server_selection_timeout_ms.from_env("MONGODB_SERVER_SELECTION_TIMEOUT_MS", default=30000, as_=int)
+    config.mongodb.compressors.from_env("MONGODB_COMPRESSORS", default=None)
+    config.mongodb.write_concern.from_env("MONGODB_WRITE_CONCERN", default=None)
+    config.mongodb.write_read_concern.from_env("MONGODB_WRITE_READ_CONCERN", default=None)
+    config.mongodb.catalog_read_preference.from_env("MONGODB_CATALOG_READ_PREFERENCE", default="primary")
+    config.mongodb.catalog_read_concern.from_env("MONGODB_CATALOG_READ_CONCERN", default=None)
+
+    # Pools are per process, so a per-host budget is split between the worker processes
+    config.server.workers.from_env("WEB_CONCURRENCY", default=1, as_=int)
+    if config.mongodb.pool_budget():
+        max_pool_size = max(1, config.mongodb.pool_budget() // max(1, config.server.workers()))
+        config.mongodb.max_pool_size.from_value(max_pool_size)
+        config.mongodb.min_pool_size.from_value(min(config.mongodb.min_pool_size(), max_pool_size))
+
+    config.cache.backend.from_env("CACHE_BACKEND", default="memory")
+    config.cache.max_entries.from_env("CACHE_MAX_ENTRIES", default=10000, as_=int)
+    config.cache.ttl.from_env("CACHE_TTL_SECONDS", default=300, as_=int)
+    config.cache.redis_url.from_env("CACHE_REDIS_URL", default="redis://localhost:6379/0")
+
+    config.single_flight.enabled.from_env("SINGLE_FLIGHT_ENABLED", default=True, as_=as_bool)
+
+    config.http_cache.default_policy.from_env("HTTP_CACHE_CONTROL", default="no-cache")
+    config.http_cache.route_policies.from_env("HTTP_CACHE_CONTROL_ROUTES", default=None, as_=parse_route_policies)
+
+    config.change_stream.source.from_env("CHANGE_STREAM_SOURCE", default="none")
+    config.change_stream.name.from_env("CHANGE_STREAM_NAME", default="catalog")
+    config.change_stream.batch_size.from_env("CHANGE_STREAM_BATCH_SIZE", default=500, as_=int)
+    config.change_stream.batch_interval_ms.from_env("CHANGE_STREAM_BATCH_INTERVAL_MS", default=200, as_=int)
+    config.change_stream.facets_rebuild_seconds.from_env("CHANGE_STREAM_FACETS_REBUILD_SECONDS", default=600, as_=int)
+
+    config.reservations.hold_seconds.from_env("RESERVATION_HOLD_SECONDS", default=900, as_=int)
+    config.reservations.retention_seconds.from_env("RESERVATION_RETENTION_SECONDS", default=86400, as_=int)
+    config.reservations.reaper_interval_seconds.from_env("RESERVATION_REAPER_INTERVAL_SECONDS", default=5, as_=float)
+
+    config.rate_limit.backend.from_env("RATE_LIMIT_BACKEND", default="memory")
+    config.rate_limit.redis_url.from_env("RATE_LIMIT_REDIS_URL", default="redis://localhost:6379/0")
+    config.rate_limit.default.from_env("RATE_LIMIT_DEFAULT", default=None)
+    config.rate_limit.routes.from_env("RATE_LIMIT_ROUTES", default=None)
+    config.rate_limit.client_header.from_env("RATE_LIMIT_CLIENT_HEADER", default=None)
+
+    config.concurrency_limit.enabled.from_env("CONCURRENCY_LIMIT_ENABLED", default=True, as_=as_bool)
+    config.concurrency_limit.adaptive.from_env("CONCURRENCY_LIMIT_ADAPTIVE", default=True, as_=as_bool)
+    config.concurrency_limit.initial_limit.from_env("CONCURRENCY_LIMIT_INITIAL", default=None, as_=as_optional_int)
+    config.concurrency_limit.min_limit.from_env("CONCURRENCY_LIMIT_MIN", default=4, as_=int)
+    config.concurrency_limit.max_limit.from_env("CONCURRENCY_LIMIT_MAX", default=200, as_=int)
+    # Start where the pool would make requests queue for connections anyway
+    if config.concurrency_limit.initial_limit() is None:
+        config.concurrency_limit.initial_limit.from_value(
+            min(config.mongodb.max_pool_size(), config.concurrency_limit.max_limit()))
+    config.concurrency_limit.tolerance.from_env("CONCURRENCY_LIMIT_TOLERANCE", default=2.0, as_=float)
+    config.concurrency_limit.queue_size.from_env("CONCURRENCY_LIMIT_QUEUE_SIZE", default=100, as_=int)
+    config.concurrency_limit.queue_timeout_ms.from_env("CONCURRENCY_LIMIT_QUEUE_TIMEOUT_MS", default=1000, as_=int)
+    config.concurrency_limit.routes.from_env("CONCURRENCY_LIMIT_ROUTES", default="get_books_sorted_by_price=4")
+    # Give up on a queued request well before the driver would fail its pool checkout
+    if config.mongodb.wait_queue_timeout_ms():
+        config.concurrency_limit.queue_timeout_ms.from_value(
+            min(config.concurrency_limit.queue_timeout_ms(), config.mongodb.wait_queue_timeout_ms() // 2))
+    config.load_shedding.max_pool_waiting.from_env("LOAD_SHEDDING_MAX_POOL_WAITING", default=None,
+                                                   as_=as_optional_int)
+    if config.load_shedding.max_pool_waiting() is None:
+        config.load_shedding.max_pool_waiting.from_value(config.mongodb.max_pool_size())
+    config.load_shedding.exempt_paths.from_env("LOAD_SHEDDING_EXEMPT_PATHS", default="/healthz,/readyz,/metrics",
+                                               as_=lambda value: [path.strip() for path in value.split(",")
+                                                                  if path.strip()])
+
+    config.startup.warm_connections.from_env("STARTUP_WARM_CONNECTIONS", default=10, as_=int)
+    config.startup.warm_books.from_env("STARTUP_WARM_BOOKS", default=1000, as_=int)
+
+    config.compression.enabled.from_env("COMPRESSION_ENABLED", default=True, as_=as_bool)
+    config.compression.encodings.from_env("COMPRESSION_ENCODINGS", default="zstd,br,gzip",
+                                          as_=lambda value: [name.strip() for name in value.split(",") if name.strip()])
+    config.compression.minimum_size.from_env("COMPRESSION_MINIMUM_SIZE", default=1024, as_=int)
+    config.compression.offload_size.from_env("COMPRESSION_OFFLOAD_SIZE", default=65536, as_=int)
+    config.compression.levels.gzip.from_env("COMPRESSION_GZIP_LEVEL", default=6, as_=int)
+    config.compression.levels.br.from_env("COMPRESSION_BROTLI_LEVEL", default=4, as_=int)
+    config.compression.levels.zstd.from_env("COMPRESSION_ZSTD_LEVEL", default=3, as_=int)
 
+    config.metrics.profiling_enabled.from_env("METRICS_PROFILING_ENABLED", default=False, as_=as_bool)
+    config.metrics.profile_dir.from_env("METRICS_PROFILE_DIR", default="logs/profiles")
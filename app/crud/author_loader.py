@@ -0,0 +1,99 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.schemas.authors_schema import AuthorReferenceResponse
+
+
+class AuthorLoader:
+    """
+    Per-request author batching: every id requested during the same event loop turn is fetched with one
+    `$in` query, and each id is fetched at most once per loader. Create one per request.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, max_batch_size: int = 1000):
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self._results: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self.queries = 0
+
+    def load(self, author_id: str) -> asyncio.Future:
+        future = self._results.get(author_id)
+        if future is None:
+            future = self._results[author_id] = asyncio.get_running_loop().create_future()
+            if not self._queue:
+                asyncio.get_running_loop().call_soon(self._dispatch)
+            self._queue.append(author_id)
+        return future
+
+    async def load_many(self, author_ids: Iterable[str]) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*[self.load(author_id) for author_id in author_ids]))
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, []
+        for start in range(0, len(queue), self.max_batch_size):
+            asyncio.ensure_future(self._fetch(queue[start:start + self.max_batch_size]))
+
+    async def _fetch(self, author_ids: List[str]):
+        try:
+            ids = [ObjectId(author_id) for author_id in author_ids if ObjectId.is_valid(author_id)]
+            self.queries += 1
+            found = {str(author["_id"]): author
+                     async for author in self.collection.find({"_id": {"$in": ids}}, {"name": 1})}
+            for author_id in author_ids:
+                self._results[author_id].set_result(found.get(author_id))
+        except Exception as e:
+            for author_id in author_ids:
+                # Let a later request retry instead of caching the failure for this id
+                future = self._results.pop(author_id)
+                if not future.done():
+                    future.set_exception(e)
+
+
+async def resolve_author_names(books: Iterable, loader: Optional[AuthorLoader]):
+    """Replace embedded author name copies with the current names, in place; a no-op without a loader."""
+    if loader is None:
+        return
+    references: List[AuthorReferenceResponse] = [
+        reference for book in books for reference in (getattr(book, "author_ids", None) or [])
+    ]
+    authors = await loader.load_many({reference.id for reference in references})
+    names = {str(author["_id"]): author["name"] for author in authors if author}
+    for reference in references:
+        reference.name = names.get(reference.id, reference.name)
+
+
+def _reference_id(reference: dict) -> str:
+    return str(reference["_id"]) if "_id" in reference else reference["id"]
+
+
+async def _resolve_document_names(docs: List[dict], loader: AuthorLoader):
+    references = [reference for doc in docs for reference in (doc.get("author_ids") or [])]
+    authors = await loader.load_many({_reference_id(reference) for reference in references})
+    names = {str(author["_id"]): author["name"] for author in authors if author}
+    for reference in references:
+        reference["name"] = names.get(_reference_id(reference), reference["name"])
+
+
+async def resolve_streamed_author_names(docs: AsyncIterator[dict], loader: Optional[AuthorLoader],
+                                        batch_size: int) -> AsyncIterator[dict]:
+    """resolve_author_names for a stream of raw documents, one `$in` query per batch of `batch_size` documents."""
+    if loader is None:
+        async for doc in docs:
+            yield doc
+        return
+    batch = []
+    async for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await _resolve_document_names(batch, loader)
+            for resolved in batch:
+                yield resolved
+            batch = []
+    if batch:
+        await _resolve_document_names(batch, loader)
+        for resolved in batch:
+            yield resolved
@@ -1,39 +1,88 @@
-import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
 
+from app.cache.read_through import EntityCache
 from app.models.authors_model import AuthorModel
 from app.models.py_object_id import PyObjectId
-from app.schemas.authors_schema import AuthorCreate, AuthorResponse
-
-logging.basicConfig(level=logging.INFO)
+from app.schemas.authors_schema import AuthorCreate, AuthorResponse, AuthorUpdate
+from app.schemas.bulk_schema import BulkResultSchema
+from app.utils.bulk import insert_chunk
+from app.utils.logger import logger
 
 
 class AuthorCRUD:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    def __init__(self, collection: AsyncIOMotorCollection, cache: Optional[EntityCache] = None):
         self.collection = collection
+        self.cache = cache
 
     async def create_author(self, author_data: AuthorCreate) -> Optional[AuthorResponse]:
         try:
             new_author = AuthorModel(**author_data.dict())
             result = await self.collection.insert_one(new_author.dict(by_alias=True))
             new_author.id = result.inserted_id
-            logging.info(f"Author created with ID: {new_author.id}")
+            logger.info("Author created with ID: %s", new_author.id)
             return AuthorResponse(**new_author.dict())
         except Exception as e:
-            logging.error(f"Error while creating author: {e}")
+            logger.error("Error while creating author: %s", e)
             raise HTTPException(status_code=500, detail=f"Failed to create author due to an internal error: {e}")
 
+    @staticmethod
+    def _build_author_document(item: Dict[str, Any]) -> dict:
+        return AuthorModel(**AuthorCreate(**item).dict()).dict(by_alias=True)
+
+    async def bulk_create_authors(self, chunks: AsyncIterator[List[Tuple[int, Any]]],
+                                  report: Optional[BulkResultSchema] = None) -> BulkResultSchema:
+        report = report or BulkResultSchema()
+        try:
+            async for chunk in chunks:
+                await insert_chunk(self.collection, chunk, self._build_author_document, report)
+        except Exception as e:
+            logger.error("Error while bulk creating authors: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to create authors due to an internal error: {e}")
+        report.results.sort(key=lambda result: result.index)
+        logger.info("Bulk created %s authors, %s failed", report.succeeded, report.failed)
+        return report
+
     async def get_author(self, author_id: str) -> Optional[AuthorResponse]:
         try:
+            stamp = None
+            if self.cache:
+                cached, stamp = await self.cache.lookup("id", author_id)
+                if cached:
+                    return AuthorResponse.model_construct(**cached)
             author_data = await self.collection.find_one({"_id": PyObjectId(author_id)})
             if author_data:
-                return AuthorResponse(**author_data)
+                author = AuthorResponse.from_mongo(author_data)
+                if self.cache:
+                    await self.cache.store("id", author_id, author.dict(), stamp)
+                return author
             else:
-                logging.warning(f"Author with ID {author_id} not found.")
+                logger.warning("Author with ID %s not found.", author_id)
                 return None
         except Exception as e:
-            logging.error(f"Error while retrieving author with ID {author_id}: {e}")
+            logger.error("Error while retrieving author with ID %s: %s", author_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to retrieve author due to an internal error: {e}")
+
+    async def update_author(self, author_id: str, update_data: AuthorUpdate) -> Tuple[Optional[AuthorResponse], bool]:
+        """Return the updated author and whether its name changed, i.e. whether embedded copies are now stale."""
+        try:
+            fields = update_data.dict(exclude_unset=True)
+            if not fields:
+                raise HTTPException(status_code=400, detail="No fields to update")
+            before = await self.collection.find_one_and_update({"_id": PyObjectId(author_id)}, {"$set": fields},
+                                                               return_document=ReturnDocument.BEFORE)
+            if before is None:
+                logger.warning("Author with ID %s not found for update.", author_id)
+                return None, False
+            if self.cache:
+                await self.cache.invalidate(author_id)
+            logger.info("Author with ID %s updated successfully", author_id)
+            return AuthorResponse.from_mongo({**before, **fields}), "name" in fields and fields["name"] != before["name"]
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while updating author with ID %s: %s", author_id, e)
+            raise HTTPException(status_code=500, detail=f"Failed to update author due to an internal error: {e}")
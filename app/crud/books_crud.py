@@ -1,130 +1,599 @@
-from typing import Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
 
+from bson import ObjectId
 from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
-from app.models.books_model import BookModel
+from app.cache.read_through import EntityCache
+from app.crud.facets_crud import BookFacetsCRUD
+from app.models.authors_model import AuthorReference
+from app.models.books_model import BookModel, utc_now
 from app.models.py_object_id import PyObjectId
-from app.schemas.books_schema import CreateBookSchema, UpdateBookSchema, BookResponseSchema, ListBooksSchema
-from app.utils.logger import logger
+from app.schemas.books_schema import CreateBookSchema, UpdateBookSchema, BookResponseSchema, ListBooksSchema, \
+    BulkUpdateBookSchema, BookReadSchema, BookSearchSchema, UPDATE_CONTROL_FIELDS, book_projection, read_schema
+from app.schemas.bulk_schema import BulkResultSchema
+from app.utils.book_enum import BookSortEnum, BookTypeEnum, Genre
+from app.utils.book_query import BookFilter, BookQuery
+from app.utils.bulk import add_result, insert_chunk, validation_message
+from app.utils.facets import FACET_FIELDS, FACET_PROJECTION
+from app.utils.logger import logger, read_logger
+from app.utils.pagination import next_cursor
+from app.utils.search import PREFIX_MAX_RESULTS, SearchMode, author_terms, prefix_tiers, \
+    search_terms_update, with_search_terms
+from app.utils.single_flight import SingleFlight, query_key
+
+# QueryExceededMemoryLimitNoDiskUseAllowed
+SORT_MEMORY_LIMIT_EXCEEDED = 292
+
+
+def stored_author_fields(fields: dict) -> dict:
+    """Convert `author_ids` from the API shape ({"id": str}) to the stored AuthorReference shape ({"_id": ObjectId})."""
+    if fields.get("author_ids") is None:
+        return fields
+    return {**fields, "author_ids": [AuthorReference(**author).dict(by_alias=True) for author in fields["author_ids"]]}
 
 
 class BookCRUD:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    def __init__(self, collection: AsyncIOMotorCollection, cache: Optional[EntityCache] = None,
+                 read_collection: Optional[AsyncIOMotorCollection] = None,
+                 single_flight: Optional[SingleFlight] = None, facets: Optional[BookFacetsCRUD] = None):
         self.collection = collection
+        self.cache = cache
+        # Catalog listings tolerate replica lag; lookups by id/title stay on the write collection
+        self.read_collection = read_collection if read_collection is not None else collection
+        self.single_flight = single_flight
+        self.facets = facets
+
+    async def _find_one(self, collection: AsyncIOMotorCollection, query: dict,
+                        projection: Optional[dict] = None) -> Optional[dict]:
+        if self.single_flight is None:
+            return await collection.find_one(query, projection)
+        return await self.single_flight.do(query_key(collection, "find_one", query, projection),
+                                           lambda: collection.find_one(query, projection))
+
+    async def _find(self, collection: AsyncIOMotorCollection, query: dict, projection: Optional[dict],
+                    limit: Optional[int], sort: Optional[List[Tuple[str, int]]] = None,
+                    allow_disk_use: bool = False) -> List[dict]:
+        def run():
+            cursor = collection.find(query, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if limit:
+                cursor = cursor.limit(limit)
+            if allow_disk_use:
+                cursor = cursor.allow_disk_use(True)
+            return cursor.to_list(length=limit or None)
+
+        if self.single_flight is None:
+            return await run()
+        key = query_key(collection, "find", query, projection, sort=sort, limit=limit, allow_disk_use=allow_disk_use)
+        return await self.single_flight.do(key, run)
 
     async def create_book(self, book_data: CreateBookSchema) -> str:
         try:
             new_book = BookModel(**book_data.dict())
-            result = await self.collection.insert_one(new_book.dict(by_alias=True))
+            document = with_search_terms(new_book.dict(by_alias=True))
+            result = await self.collection.insert_one(document)
             new_book.id = result.inserted_id
-            logger.info(f"Book created with ID: {new_book.id}")
+            if self.facets:
+                await self.facets.apply(None, document)
+            logger.info("Book created with ID: %s", new_book.id)
             return str(new_book.id)
         except Exception as e:
-            logger.error(f"Error while creating book: {e}")
+            logger.error("Error while creating book: %s", e)
             raise HTTPException(status_code=500, detail=f"Failed to create book due to an internal error: {e}")
 
+    @staticmethod
+    def _build_book_document(item: Dict[str, Any]) -> dict:
+        return with_search_terms(BookModel(**CreateBookSchema(**item).dict()).dict(by_alias=True))
+
+    async def bulk_create_books(self, chunks: AsyncIterator[List[Tuple[int, Any]]],
+                                report: Optional[BulkResultSchema] = None) -> BulkResultSchema:
+        report = report or BulkResultSchema()
+        try:
+            async for chunk in chunks:
+                inserted = await insert_chunk(self.collection, chunk, self._build_book_document, report)
+                if self.facets:
+                    await self.facets.apply_many((None, document) for document in inserted)
+        except Exception as e:
+            logger.error("Error while bulk creating books: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to create books due to an internal error: {e}")
+        report.results.sort(key=lambda result: result.index)
+        logger.info("Bulk created %s books, %s failed", report.succeeded, report.failed)
+        return report
+
+    async def bulk_update_books(self, chunks: AsyncIterator[List[Tuple[int, Any]]]) -> BulkResultSchema:
+        report = BulkResultSchema()
+        try:
+            async for chunk in chunks:
+                updates = []
+                for index, item in chunk:
+                    try:
+                        item = BulkUpdateBookSchema(**item)
+                    except ValidationError as e:
+                        add_result(report, index, "error", error=validation_message(e))
+                        continue
+                    except TypeError as e:
+                        add_result(report, index, "error", error=str(e))
+                        continue
+                    try:
+                        fields = stored_author_fields(item.update.dict(exclude_unset=True))
+                    except ValidationError as e:
+                        add_result(report, index, "error", id=item.id, error=validation_message(e))
+                        continue
+                    if not ObjectId.is_valid(item.id):
+                        add_result(report, index, "error", id=item.id, error="Invalid book ID")
+                    elif any(fields.get(field) is not None for field in UPDATE_CONTROL_FIELDS):
+                        add_result(report, index, "error", id=item.id,
+                                   error="stock_delta and expected_version are only supported on PUT /books/{book_id}")
+                    elif not fields:
+                        add_result(report, index, "error", id=item.id, error="No fields to update")
+                    else:
+                        updates.append((index, item.id, fields))
+                await self._apply_bulk_updates(updates, report)
+        except Exception as e:
+            logger.error("Error while bulk updating books: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to update books due to an internal error: {e}")
+        report.results.sort(key=lambda result: result.index)
+        logger.info("Bulk updated %s books, %s failed", report.succeeded, report.failed)
+        return report
+
+    async def _apply_bulk_updates(self, updates: List[Tuple[int, str, dict]], report: BulkResultSchema):
+        if not updates:
+            return
+        ids = [ObjectId(book_id) for _, book_id, _ in updates]
+        existing = {str(book["_id"]): book
+                    async for book in self.collection.find({"_id": {"$in": ids}}, FACET_PROJECTION)}
+        operations, applied = [], []
+        now = utc_now()
+        for index, book_id, fields in updates:
+            if book_id not in existing:
+                add_result(report, index, "not_found", id=book_id, error="Book not found")
+                continue
+            operations.append(UpdateOne({"_id": ObjectId(book_id)},
+                                        {"$set": {**fields, **search_terms_update(fields), "updated_at": now},
+                                         "$inc": {"version": 1}}))
+            applied.append((index, book_id, fields))
+        if not operations:
+            return
+        write_errors = {}
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {err["index"]: err["errmsg"] for err in e.details.get("writeErrors", [])}
+        facet_changes = []
+        for position, (index, book_id, fields) in enumerate(applied):
+            if position in write_errors:
+                add_result(report, index, "error", id=book_id, error=write_errors[position])
+                continue
+            add_result(report, index, "updated", id=book_id)
+            before = existing[book_id]
+            facet_changes.append((before, {**before, **{f: fields[f] for f in FACET_FIELDS if f in fields}}))
+            if self.cache:
+                title_keys = [("title", fields["title"])] if fields.get("title") else []
+                await self.cache.invalidate(book_id, *title_keys)
+        if self.facets:
+            await self.facets.apply_many(facet_changes)
+
+    async def bulk_delete_books(self, book_ids: List[str], chunk_size: int = 1000) -> BulkResultSchema:
+        report = BulkResultSchema()
+        try:
+            for start in range(0, len(book_ids), chunk_size):
+                chunk = list(enumerate(book_ids[start:start + chunk_size], start))
+                valid, seen = [], set()
+                for index, book_id in chunk:
+                    if not ObjectId.is_valid(book_id):
+                        add_result(report, index, "error", id=book_id, error="Invalid book ID")
+                    elif book_id in seen:
+                        add_result(report, index, "error", id=book_id, error="Duplicate book ID")
+                    else:
+                        seen.add(book_id)
+                        valid.append((index, book_id))
+                ids = [ObjectId(book_id) for _, book_id in valid]
+                existing = {str(book["_id"]): book
+                            async for book in self.collection.find({"_id": {"$in": ids}}, FACET_PROJECTION)}
+                if existing:
+                    await self.collection.delete_many({"_id": {"$in": [ObjectId(book_id) for book_id in existing]}})
+                    if self.facets:
+                        await self.facets.apply_many((book, None) for book in existing.values())
+                for index, book_id in valid:
+                    if book_id not in existing:
+                        add_result(report, index, "not_found", id=book_id, error="Book not found")
+                        continue
+                    add_result(report, index, "deleted", id=book_id)
+                    if self.cache:
+                        await self.cache.invalidate(book_id)
+        except Exception as e:
+            logger.error("Error while bulk deleting books: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to delete books due to an internal error: {e}")
+        report.results.sort(key=lambda result: result.index)
+        logger.info("Bulk deleted %s books, %s failed", report.succeeded, report.failed)
+        return report
+
     async def get_book(self, book_id: str) -> Optional[BookResponseSchema]:
         try:
-            book = await self.collection.find_one({"_id": PyObjectId(book_id)})
+            stamp = None
+            if self.cache:
+                cached, stamp = await self.cache.lookup("id", book_id)
+                if cached:
+                    return BookResponseSchema.from_dict(cached)
+            book = await self._find_one(self.collection, {"_id": PyObjectId(book_id)})
             if book:
-                logger.info(f"Book found with ID: {book_id}")
-                return BookResponseSchema.from_mongo(book)
-            logger.warning(f"Book not found with ID: {book_id}")
+                read_logger.info("Book found with ID: %s", book_id)
+                book = BookResponseSchema.from_mongo(book)
+                if self.cache:
+                    await self.cache.store("id", book_id, book.model_dump(mode="json", warnings=False), stamp)
+                return book
+            logger.warning("Book not found with ID: %s", book_id)
             return None
         except Exception as e:
-            logger.error(f"Error while getting book with ID {book_id}: {e}")
+            logger.error("Error while getting book with ID %s: %s", book_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to retrieve book due to an internal error: {e}")
 
-    async def list_books(self, skip: int = 0, limit: int = 10) -> Optional[List[BookResponseSchema]]:
+    async def get_book_validators(self, book_id: str) -> Optional[Tuple[str, Optional[int], Any]]:
+        return await self._get_validators("id", book_id, {"_id": PyObjectId(book_id)})
+
+    async def get_book_validators_by_title(self, title: str) -> Optional[Tuple[str, Optional[int], Any]]:
+        return await self._get_validators("title", title, {"title": title})
+
+    async def _get_validators(self, key: str, value: str, query: dict) -> Optional[Tuple[str, Optional[int], Any]]:
+        """(id, version, updated_at) for answering conditional GETs without loading the whole document."""
         try:
-            cursor = self.collection.find().skip(skip).limit(limit)
+            if self.cache:
+                cached, _ = await self.cache.lookup(key, value)
+                if cached:
+                    return cached["id"], cached.get("version"), cached.get("updated_at")
+            book = await self._find_one(self.collection, query, {"version": 1, "updated_at": 1})
+            return (str(book["_id"]), book.get("version"), book.get("updated_at")) if book else None
+        except Exception as e:
+            logger.error("Error while getting validators for book %s %s: %s", key, value, e)
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve book due to an internal error: {e}")
+
+    async def list_books(self, skip: int = 0, limit: int = 10,
+                         fields: Optional[Tuple[str, ...]] = None) -> Optional[List[BookReadSchema]]:
+        try:
+            cursor = self.read_collection.find({}, book_projection(fields)).sort("_id", 1).skip(skip).limit(limit)
             books_list = await cursor.to_list(length=limit)
             if not books_list:
-                logger.warning(f"Books not found")
+                logger.warning("Books not found")
                 raise HTTPException(status_code=404, detail="No books found")
-            return [BookResponseSchema.from_mongo(book) for book in books_list]
+            schema = read_schema(fields)
+            return [schema.from_mongo(book) for book in books_list]
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"ERROR: while listing books: {e}")
+            logger.error("ERROR: while listing books: %s", e)
             raise HTTPException(status_code=500, detail=f"Failed to list books due to an internal error: {e}")
 
+    async def list_books_page(self, limit: int = 10, cursor: Optional[str] = None,
+                              sort_by: BookSortEnum = BookSortEnum.ID, include_total: bool = False) -> ListBooksSchema:
+        return await self.query_books(BookQuery(sort_by=sort_by, limit=limit, cursor=cursor), include_total=include_total)
+
+    async def query_books(self, query: BookQuery, fields: Optional[Tuple[str, ...]] = None,
+                          include_total: bool = False) -> ListBooksSchema:
+        try:
+            try:
+                filter_query, sort = query.compile()
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            projection = book_projection(fields)
+            if projection:
+                # The next cursor is built from the sort key
+                projection[query.sort_field] = 1
+            # Fetch one extra document to know whether another page exists
+            books = await self._find(self.read_collection, filter_query, projection,
+                                     query.limit + 1 if query.limit else None, sort, query.allow_disk_use)
+            total = None
+            if include_total:
+                conditions = query.filter.to_query()
+                total = await self.read_collection.count_documents(conditions) if conditions \
+                    else await self.read_collection.estimated_document_count()
+            schema = read_schema(fields)
+            return ListBooksSchema.model_construct(
+                books=[schema.from_mongo(book) for book in books[:query.limit]],
+                total=total,
+                next_cursor=next_cursor(query.sort_by.value, books, query.limit, query.direction) if query.limit else None,
+            )
+        except HTTPException:
+            raise
+        except OperationFailure as e:
+            if e.code == SORT_MEMORY_LIMIT_EXCEEDED:
+                raise HTTPException(status_code=400, detail="Sort exceeds the server's memory limit; narrow the filter, "
+                                                            "sort by an indexed field or pass allow_disk_use=true")
+            logger.error("ERROR: while querying books: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to query books due to an internal error: {e}")
+        except Exception as e:
+            logger.error("ERROR: while querying books: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to query books due to an internal error: {e}")
+
+    async def iter_books(self, query: BookQuery, batch_size: int = 500,
+                         fields: Optional[Tuple[str, ...]] = None) -> AsyncIterator[dict]:
+        filter_query, sort = query.compile()
+        cursor = self.read_collection.find(filter_query, book_projection(fields)).sort(sort).batch_size(batch_size)
+        if query.limit:
+            cursor = cursor.limit(query.limit)
+        if query.allow_disk_use:
+            cursor = cursor.allow_disk_use(True)
+        async for book in cursor:
+            yield book
+
+    async def search_books(self, q: str, mode: SearchMode = SearchMode.TEXT, skip: int = 0, limit: int = 20,
+                           fields: Optional[Tuple[str, ...]] = None) -> BookSearchSchema:
+        try:
+            schema = read_schema(fields)
+            if mode == SearchMode.TEXT:
+                projection = {**(book_projection(fields) or {}), "score": {"$meta": "textScore"}}
+                cursor = self.read_collection.find({"$text": {"$search": q}}, projection) \
+                    .sort([("score", {"$meta": "textScore"})]).skip(skip).limit(limit + 1)
+                books = await cursor.to_list(length=limit + 1)
+                next_skip = skip + limit if len(books) > limit else None
+                return BookSearchSchema.model_construct(books=[schema.from_mongo(book) for book in books[:limit]],
+                                                        next_skip=next_skip)
+
+            tiers = prefix_tiers(q)
+            if not tiers:
+                raise HTTPException(status_code=400, detail="Prefix search needs at least 2 characters")
+            # One past the page tells whether there is a next one; nothing is served past PREFIX_MAX_RESULTS
+            size = max(0, min(skip + limit, PREFIX_MAX_RESULTS) - skip)
+            page, offset, wanted = [], skip, size + 1 if size else 0
+            for tier in tiers:
+                if wanted <= 0:
+                    break
+                if offset:
+                    # Tiers wholly before the page are only counted
+                    before = await self.read_collection.count_documents(tier, limit=offset)
+                    if before < offset:
+                        offset -= before
+                        continue
+                books = await self.read_collection.find(tier, book_projection(fields)) \
+                    .sort([("title", 1), ("_id", 1)]).skip(offset).limit(wanted).to_list(length=wanted)
+                page.extend(books)
+                offset, wanted = 0, wanted - len(books)
+            next_skip = skip + size if len(page) > size and skip + size < PREFIX_MAX_RESULTS else None
+            page = page[:size]
+            return BookSearchSchema.model_construct(books=[schema.from_mongo(book) for book in page], next_skip=next_skip)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while searching books for %r: %s", q, e)
+            raise HTTPException(status_code=500, detail=f"Failed to search books due to an internal error: {e}")
+
+    async def warm_cache(self, limit: int) -> int:
+        """Load the most-rated books into the cache by id, so a fresh worker does not start cold."""
+        if not self.cache or limit <= 0:
+            return 0
+        ids = [book["_id"] async for book in
+               self.collection.find({}, {"_id": 1}).sort("rating_count", -1).limit(limit)]
+        # Stamps are read before the documents, as in get_book, so a write racing with the warm-up still wins
+        stamps = await self.cache.stamps([str(book_id) for book_id in ids])
+        warmed = 0
+        async for book in self.collection.find({"_id": {"$in": ids}}):
+            data = BookResponseSchema.from_mongo(book).model_dump(mode="json", warnings=False)
+            await self.cache.store("id", data["id"], data, stamps[data["id"]])
+            warmed += 1
+        return warmed
+
+    async def backfill_search_terms(self, batch_size: int = 1000) -> int:
+        updated, operations = 0, []
+        async for book in self.collection.find({"title_terms": {"$exists": False}}, {"title": 1, "author_ids": 1}):
+            operations.append(UpdateOne({"_id": book["_id"]}, {"$set": search_terms_update(book)}))
+            if len(operations) >= batch_size:
+                await self.collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+                operations = []
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+        return updated
+
+    async def propagate_author_name(self, author_id: str, name: str, batch_size: int = 500) -> int:
+        """Rewrite embedded copies of a renamed author in bounded batches; safe to rerun after a failure."""
+        oid = ObjectId(author_id)
+        stale = {"author_ids": {"$elemMatch": {"_id": oid, "name": {"$ne": name}}}}
+        updated = 0
+        try:
+            while True:
+                books = await self.collection.find(stale, {"author_ids": 1}).limit(batch_size).to_list(length=batch_size)
+                if not books:
+                    break
+                operations = []
+                now = utc_now()
+                for book in books:
+                    renamed = [{**author, "name": name} if author.get("_id") == oid else author
+                               for author in book["author_ids"]]
+                    # The filter re-checks staleness, so a book rewritten since the read is left alone.
+                    # `$` is the entry matched by $elemMatch; a duplicated entry is caught by the next batch
+                    operations.append(UpdateOne({"_id": book["_id"], **stale},
+                                                {"$set": {"author_ids.$.name": name,
+                                                          "author_terms": author_terms(renamed), "updated_at": now},
+                                                 "$inc": {"version": 1}}))
+                result = await self.collection.bulk_write(operations, ordered=False)
+                if not result.modified_count:
+                    break
+                updated += result.modified_count
+                if self.cache:
+                    for book in books:
+                        await self.cache.invalidate(str(book["_id"]))
+        except Exception as e:
+            logger.error("Error while propagating the name of author %s after %s books: %s", author_id, updated, e)
+            return updated
+        logger.info("Propagated the name of author %s to %s books", author_id, updated)
+        return updated
+
     async def update_book(self, book_id: str, update_data: UpdateBookSchema) -> Optional[BookResponseSchema]:
         try:
-            update_dict = update_data.dict()
-            result = await self.collection.update_one({"_id": PyObjectId(book_id)}, {"$set": update_dict})
-            if result.modified_count > 0:
-                updated_book = await self.get_book(book_id)
-                logger.info(f"Book with ID {book_id} updated successfully")
-                return updated_book
-            logger.warning(f"No updates applied for book with ID: {book_id}")
-            raise HTTPException(status_code=304, detail=f"No updates were applied to book with ID {book_id}.")
+            try:
+                set_fields = stored_author_fields(update_data.dict(exclude_unset=True,
+                                                                   exclude=set(UPDATE_CONTROL_FIELDS)))
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=validation_message(e))
+            inc_fields = {"version": 1}
+            query = {"_id": PyObjectId(book_id)}
+            if update_data.expected_version is not None:
+                query["version"] = update_data.expected_version
+            if update_data.stock_delta:
+                inc_fields["stock"] = update_data.stock_delta
+                if update_data.stock_delta < 0:
+                    query["stock"] = {"$gte": -update_data.stock_delta}
+            if not set_fields and len(inc_fields) == 1:
+                raise HTTPException(status_code=400, detail="No fields to update")
+            set_fields.update(search_terms_update(set_fields))
+            set_fields["updated_at"] = utc_now()
+
+            update = {"$set": set_fields, "$inc": inc_fields}
+            # Facet buckets need the pre-image; otherwise return the updated document directly
+            needs_before = self.facets is not None and any(field in set_fields for field in FACET_FIELDS)
+            book = await self.collection.find_one_and_update(
+                query, update, return_document=ReturnDocument.BEFORE if needs_before else ReturnDocument.AFTER)
+            if book is None:
+                await self._raise_update_conflict(book_id, update_data)
+                logger.warning("Book not found for update with ID: %s", book_id)
+                return None
+            if needs_before:
+                before = book
+                book = {**before, **set_fields, **{field: (before.get(field) or 0) + delta
+                                                   for field, delta in inc_fields.items()}}
+                await self.facets.apply(before, book)
+            if self.cache:
+                title_keys = [("title", set_fields["title"])] if set_fields.get("title") else []
+                await self.cache.invalidate(book_id, *title_keys)
+            logger.info("Book with ID %s updated successfully", book_id)
+            return BookResponseSchema.from_mongo(book)
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error while updating book with ID {book_id}: {e}")
+            logger.error("Error while updating book with ID %s: %s", book_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to update book due to an internal error: {e}")
 
+    async def _raise_update_conflict(self, book_id: str, update_data: UpdateBookSchema):
+        # Only runs when a conditional update matched nothing, to tell a missing book from a failed condition
+        if update_data.expected_version is None and (update_data.stock_delta or 0) >= 0:
+            return
+        current = await self.collection.find_one({"_id": PyObjectId(book_id)}, {"version": 1, "stock": 1})
+        if current is None:
+            return
+        if update_data.expected_version is not None and current.get("version") != update_data.expected_version:
+            raise HTTPException(status_code=409, detail=f"Version conflict: book is at version {current.get('version')}")
+        if update_data.stock_delta and (current.get("stock") or 0) + update_data.stock_delta < 0:
+            raise HTTPException(status_code=409, detail=f"Insufficient stock: {current.get('stock')} available")
+        # The guards hold on this re-read, so the book changed between the update and it
+        raise HTTPException(status_code=409, detail="Concurrent update, retry")
+
+    async def rate_book(self, book_id: str, rating: float) -> Optional[BookResponseSchema]:
+        try:
+            # Pipeline update: the new average is computed from the stored counters in the same atomic write
+            now = utc_now()
+            before = await self.collection.find_one_and_update({"_id": PyObjectId(book_id)}, [
+                {"$set": {"rating_count": {"$add": [{"$ifNull": ["$rating_count", 0]}, 1]},
+                          "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, rating]},
+                          "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                          "updated_at": {"$literal": now}}},
+                {"$set": {"average_rating": {"$divide": ["$rating_sum", "$rating_count"]}}},
+            ], return_document=ReturnDocument.BEFORE)
+            if before is None:
+                logger.warning("Book not found for rating with ID: %s", book_id)
+                return None
+            rating_count = (before.get("rating_count") or 0) + 1
+            rating_sum = (before.get("rating_sum") or 0) + rating
+            book = {**before, "rating_count": rating_count, "rating_sum": rating_sum,
+                    "average_rating": rating_sum / rating_count, "version": (before.get("version") or 0) + 1,
+                    "updated_at": now}
+            if self.facets:
+                await self.facets.apply(before, book)
+            if self.cache:
+                await self.cache.invalidate(book_id)
+            return BookResponseSchema.from_mongo(book)
+        except Exception as e:
+            logger.error("Error while rating book with ID %s: %s", book_id, e)
+            raise HTTPException(status_code=500, detail=f"Failed to rate book due to an internal error: {e}")
+
     async def delete_book(self, book_id: str) -> bool:
         try:
-            result = await self.collection.delete_one({"_id": PyObjectId(book_id)})
-            if result.deleted_count > 0:
-                logger.info(f"Book with ID {book_id} deleted successfully")
+            deleted = await self.collection.find_one_and_delete({"_id": PyObjectId(book_id)}, projection=FACET_PROJECTION)
+            if deleted is not None:
+                if self.facets:
+                    await self.facets.apply(deleted, None)
+                if self.cache:
+                    await self.cache.invalidate(book_id)
+                logger.info("Book with ID %s deleted successfully", book_id)
                 return True
-            logger.warning(f"Book with ID {book_id} not found for deletion")
+            logger.warning("Book with ID %s not found for deletion", book_id)
             raise HTTPException(status_code=404, detail=f"Book with ID {book_id} not found for deletion.")
         except Exception as e:
-            logger.error(f"Error while deleting book with ID {book_id}: {e}")
+            logger.error("Error while deleting book with ID %s: %s", book_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to delete book due to an internal error: {e}")
 
     async def get_book_by_title(self, title: str) -> Optional[BookResponseSchema]:
         try:
-            book = await self.collection.find_one({"title": title})
+            if self.cache:
+                cached, _ = await self.cache.lookup("title", title)
+                if cached:
+                    return BookResponseSchema.from_dict(cached)
+            stamp, book = None, None
+            if self.cache:
+                # As in get_book, the stamp must be read before the document, so resolve the id first
+                found = await self._find_one(self.collection, {"title": title}, {"_id": 1})
+                if found:
+                    stamp = await self.cache.stamp(str(found["_id"]))
+                    book = await self._find_one(self.collection, {"_id": found["_id"], "title": title})
+            if book is None:
+                # No cache, or the book was renamed or deleted in between: read without caching
+                stamp, book = None, await self._find_one(self.collection, {"title": title})
             if book:
-                logger.info(f"Book found with title: {title}")
-                return BookResponseSchema.from_mongo(book)
-            logger.warning(f"Book not found with title: {title}")
+                read_logger.info("Book found with title: %s", title)
+                book = BookResponseSchema.from_mongo(book)
+                if stamp is not None:
+                    await self.cache.store("title", title, book.model_dump(mode="json", warnings=False), stamp)
+                return book
+            logger.warning("Book not found with title: %s", title)
             return None
         except Exception as e:
-            logger.error(f"Error while getting book with title {title}: {e}")
+            logger.error("Error while getting book with title %s: %s", title, e)
             raise HTTPException(status_code=500, detail=f"Failed to retrieve book due to an internal error: {e}")
 
-    async def get_books_by_book_type_genre_rating(self, book_type: str, genre: str, min_rating: float, max_rating: float) -> List[BookResponseSchema]:
-        try:
-            query = {
-                "book_type": book_type,
-                "genre": genre,
-                "average_rating": {"$gte": min_rating, "$lte": max_rating}
-            }
-            books = await self.collection.find(query).to_list(length=None)
-            if books:
-                logger.info(f"Books found for book_type: {book_type}, genre: {genre}, rating: {min_rating} - {max_rating}")
-                return [BookResponseSchema.from_mongo(book) for book in books]
-            logger.warning(f"No books found for book_type: {book_type}, genre: {genre}, rating: {min_rating} - {max_rating}")
-            return []
-        except Exception as e:
-            logger.error(f"Error while getting books with book_type {book_type}, genre {genre}, rating {min_rating} - {max_rating}: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to retrieve books due to an internal error: {e}")
+    @staticmethod
+    def _type_genre_rating_query(book_type: str, genre: str, min_rating: float, max_rating: float) -> BookQuery:
+        return BookQuery(BookFilter(min_rating=min_rating, max_rating=max_rating, book_types=(BookTypeEnum(book_type),),
+                                    genres=(Genre(genre),)), sort_by=BookSortEnum.RATING)
 
-    async def get_books_sorted_by_price(self) -> List[BookResponseSchema]:
-        try:
-            books = await self.collection.find().sort("price", 1).to_list(length=None)
-            if books:
-                logger.info("Books retrieved and sorted by price.")
-                return [BookResponseSchema.from_mongo(book) for book in books]
-
-            logger.warning("No books found.")
-            return []
-        except Exception as e:
-            logger.error(f"Error while getting books sorted by price: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to retrieve books due to an internal error: {e}")
-
-    async def get_books_by_price_range(self, min_price: float, max_price: float) -> List[BookResponseSchema]:
-        try:
-            books = await self.collection.find({"price": {"$gte": min_price, "$lte": max_price}}).to_list(length=100)
-            logger.info(f"Retrieved {len(books)} books with price between {min_price} and {max_price}.")
-            return [BookResponseSchema.from_mongo(book) for book in books]
-        except Exception as e:
-            logger.error(f"Error while retrieving books by price range: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to retrieve books due to an internal error: {e}")
+    async def get_books_by_book_type_genre_rating(self, book_type: str, genre: str, min_rating: float, max_rating: float,
+                                                  fields: Optional[Tuple[str, ...]] = None) -> List[BookReadSchema]:
+        query = self._type_genre_rating_query(book_type, genre, min_rating, max_rating)
+        books = (await self.query_books(query, fields)).books
+        if books:
+            read_logger.info("Books found for book_type: %s, genre: %s, rating: %s - %s",
+                             book_type, genre, min_rating, max_rating)
+        else:
+            logger.warning("No books found for book_type: %s, genre: %s, rating: %s - %s",
+                           book_type, genre, min_rating, max_rating)
+        return books
 
+    async def iter_books_by_book_type_genre_rating(self, book_type: str, genre: str, min_rating: float, max_rating: float,
+                                                   batch_size: int = 500,
+                                                   fields: Optional[Tuple[str, ...]] = None) -> AsyncIterator[dict]:
+        query = self._type_genre_rating_query(book_type, genre, min_rating, max_rating)
+        async for book in self.iter_books(query, batch_size, fields):
+            yield book
 
+    async def get_books_sorted_by_price(self, fields: Optional[Tuple[str, ...]] = None) -> List[BookReadSchema]:
+        books = (await self.query_books(BookQuery(sort_by=BookSortEnum.PRICE), fields)).books
+        if books:
+            read_logger.info("Books retrieved and sorted by price.")
+        else:
+            logger.warning("No books found.")
+        return books
 
+    async def iter_books_sorted_by_price(self, batch_size: int = 500,
+                                         fields: Optional[Tuple[str, ...]] = None) -> AsyncIterator[dict]:
+        async for book in self.iter_books(BookQuery(sort_by=BookSortEnum.PRICE), batch_size, fields):
+            yield book
 
+    async def get_books_by_price_range(self, min_price: float, max_price: float, fields: Optional[Tuple[str, ...]] = None,
+                                       limit: int = 100) -> List[BookReadSchema]:
+        query = BookQuery(BookFilter(min_price=min_price, max_price=max_price), sort_by=BookSortEnum.PRICE, limit=limit)
+        books = (await self.query_books(query, fields)).books
+        read_logger.info("Retrieved %s books with price between %s and %s.", len(books), min_price, max_price)
+        return books
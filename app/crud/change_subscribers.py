@@ -0,0 +1,110 @@
+import time
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from app.cache.read_through import EntityCache
+from app.crud.books_crud import BookCRUD
+from app.crud.facets_crud import BookFacetsCRUD
+from app.utils.change_streams import ChangeSubscriber
+from app.utils.lease import Lease
+from app.utils.logger import logger
+from app.utils.search import search_terms_update
+
+DOCUMENT_EVENTS = ("insert", "update", "replace")
+
+
+def _latest_documents(events: List[dict], collection: str) -> dict:
+    """Last full document per id in the batch; updateLookup returns the current state, so earlier ones are stale."""
+    documents = {}
+    for event in events:
+        if event["ns"]["coll"] == collection and event["operationType"] in DOCUMENT_EVENTS \
+                and event.get("fullDocument"):
+            documents[event["documentKey"]["_id"]] = event["fullDocument"]
+    return documents
+
+
+class CacheInvalidationSubscriber(ChangeSubscriber):
+    """Invalidates cached books and authors written by anyone, including other processes and batch jobs."""
+
+    def __init__(self, book_cache: Optional[EntityCache], author_cache: Optional[EntityCache]):
+        self.caches = {"books": book_cache, "authors": author_cache}
+
+    async def handle(self, events: List[dict]):
+        # Bumping the id stamp also retires entries cached under other keys (e.g. an old title)
+        touched = {(event["ns"]["coll"], str(event["documentKey"]["_id"])) for event in events}
+        for collection, entity_id in touched:
+            cache = self.caches.get(collection)
+            if cache is not None:
+                await cache.invalidate(entity_id)
+
+
+class SearchTermsSubscriber(ChangeSubscriber):
+    """Recomputes title_terms / author_terms for books written without them."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def handle(self, events: List[dict]):
+        operations = []
+        for book_id, book in _latest_documents(events, "books").items():
+            terms = search_terms_update({field: book[field] for field in ("title", "author_ids") if field in book})
+            if any(book.get(field) != value for field, value in terms.items()):
+                # Conditional on the title read, so a newer write is left to its own event
+                operations.append(UpdateOne({"_id": book_id, "title": book.get("title")}, {"$set": terms}))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+            logger.info("Recomputed search terms for %s books from the change stream", len(operations))
+
+    async def resync(self):
+        await BookCRUD(self.collection).backfill_search_terms()
+
+
+class AuthorRenameSubscriber(ChangeSubscriber):
+    """Propagates author renames to the names embedded in books, whoever renamed the author."""
+
+    def __init__(self, books: BookCRUD):
+        self.books = books
+
+    async def handle(self, events: List[dict]):
+        renamed = {}
+        for event in events:
+            if event["ns"]["coll"] != "authors" or event["operationType"] not in ("update", "replace"):
+                continue
+            updated_fields = event.get("updateDescription", {}).get("updatedFields", {})
+            name = (event.get("fullDocument") or {}).get("name")
+            if name and (event["operationType"] == "replace" or "name" in updated_fields):
+                renamed[str(event["documentKey"]["_id"])] = name
+        # A no-op when PUT /authors already propagated the rename: no book still has the old name
+        for author_id, name in renamed.items():
+            await self.books.propagate_author_name(author_id, name)
+
+
+class FacetsSubscriber(ChangeSubscriber):
+    """
+    Rebuilds the facet summary after book writes once the stream goes quiet, at most every `min_interval`
+    seconds. App writes keep it exact already; this corrects drift from writers that bypass BookCRUD.
+    Every worker sees every event, so with a `lease` only the worker holding it rebuilds: a rebuild drops
+    deltas applied while it runs, and one per interval is all the drift it should add.
+    """
+
+    def __init__(self, facets: BookFacetsCRUD, min_interval: float = 600, lease: Optional[Lease] = None):
+        self.facets = facets
+        self.min_interval = min_interval
+        self.lease = lease
+        self.dirty = False
+        self.rebuilt_at = time.monotonic()
+
+    async def handle(self, events: List[dict]):
+        self.dirty = self.dirty or any(event["ns"]["coll"] == "books" for event in events)
+
+    async def idle(self):
+        if self.dirty and time.monotonic() - self.rebuilt_at >= self.min_interval:
+            self.dirty = False
+            self.rebuilt_at = time.monotonic()
+            if self.lease is None or await self.lease.acquire():
+                await self.facets.rebuild()
+
+    async def resync(self):
+        self.dirty = True
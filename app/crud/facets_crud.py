@@ -0,0 +1,88 @@
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne, UpdateOne
+
+from app.schemas.facets_schema import BookFacetsSchema
+from app.utils.facets import facet_counts_from_aggregation, facet_deltas, facet_pipeline
+from app.utils.logger import logger
+
+
+def _facets_schema(counts: Counter) -> BookFacetsSchema:
+    facets = BookFacetsSchema()
+    for (facet, value), count in sorted(counts.items()):
+        if count > 0:
+            getattr(facets, facet)[value] = count
+    return facets
+
+
+class BookFacetsCRUD:
+    """
+    Keeps per-facet book counts in a summary collection (one document per facet value), so facet reads
+    cost O(buckets). Book writes apply count deltas; `rebuild` recomputes everything from the catalog.
+    """
+
+    def __init__(self, summary_collection: AsyncIOMotorCollection, books_collection: AsyncIOMotorCollection):
+        self.summary_collection = summary_collection
+        self.books_collection = books_collection
+
+    async def apply(self, before: Optional[dict], after: Optional[dict]):
+        await self.apply_many([(before, after)])
+
+    async def apply_many(self, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+        deltas = facet_deltas(changes)
+        if not deltas:
+            return
+        operations = [
+            UpdateOne({"_id": f"{facet}:{value}"},
+                      {"$inc": {"count": delta}, "$setOnInsert": {"facet": facet, "value": value}}, upsert=True)
+            for (facet, value), delta in deltas.items()
+        ]
+        try:
+            await self.summary_collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The book write already succeeded; a drifted summary is repaired by a rebuild
+            logger.error("Failed to update book facets, rebuild to repair: %s", e)
+
+    async def get_facets(self) -> BookFacetsSchema:
+        try:
+            counts = Counter()
+            async for doc in self.summary_collection.find({"count": {"$gt": 0}}):
+                counts[(doc["facet"], doc["value"])] = doc["count"]
+            return _facets_schema(counts)
+        except Exception as e:
+            logger.error("Error while reading book facets: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve facets due to an internal error: {e}")
+
+    async def _aggregate(self) -> Counter:
+        results = await self.books_collection.aggregate(facet_pipeline()).to_list(length=1)
+        return facet_counts_from_aggregation(results[0] if results else {})
+
+    async def compute_facets(self) -> BookFacetsSchema:
+        try:
+            return _facets_schema(await self._aggregate())
+        except Exception as e:
+            logger.error("Error while aggregating book facets: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to aggregate facets due to an internal error: {e}")
+
+    async def rebuild(self) -> BookFacetsSchema:
+        # Deltas applied between the aggregation and the replace are lost; run when writes are quiet
+        try:
+            counts = await self._aggregate()
+            keys = [f"{facet}:{value}" for facet, value in counts]
+            if counts:
+                await self.summary_collection.bulk_write([
+                    ReplaceOne({"_id": f"{facet}:{value}"}, {"facet": facet, "value": value, "count": count}, upsert=True)
+                    for (facet, value), count in counts.items()
+                ], ordered=False)
+            await self.summary_collection.delete_many({"_id": {"$nin": keys}})
+            logger.info("Rebuilt book facets: %s values", len(keys))
+            return _facets_schema(counts)
+        except Exception as e:
+            logger.error("Error while rebuilding book facets: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to rebuild facets due to an internal error: {e}")
+
+    async def is_empty(self) -> bool:
+        return await self.summary_collection.find_one({}, {"_id": 1}) is None
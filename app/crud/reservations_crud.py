@@ -0,0 +1,246 @@
+import asyncio
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
+
+from app.cache.read_through import EntityCache
+from app.models.books_model import utc_now
+from app.schemas.reservations_schema import CreateReservationSchema, ReservationItemSchema, ReservationResponseSchema
+from app.utils.book_enum import ReservationStatus
+from app.utils.logger import logger
+
+HELD = ReservationStatus.HELD.value
+
+
+def _object_id(value: str, label: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {label} ID: {value}")
+
+
+def _quantities(items: Iterable[ReservationItemSchema]) -> Dict[ObjectId, int]:
+    quantities = Counter()
+    for item in items:
+        quantities[_object_id(item.book_id, "book")] += item.quantity
+    return dict(quantities)
+
+
+class ReservationCRUD:
+    """
+    Stock reservations. Every book in a cart is taken with a guarded $inc that only matches while
+    stock >= quantity, so concurrent reservations can never take stock below zero; if any book falls short,
+    the others are put back and the reservation fails as a whole. The reservation is recorded in the holds
+    collection after its stock is taken: a held one returns its stock when released or, once `expires_at`
+    passes, through `release_expired`. Finished holds are purged by a TTL index on `purge_at`.
+    A crash between taking stock and recording the hold leaks that stock (undersells) but never oversells.
+    """
+
+    def __init__(self, books_collection: AsyncIOMotorCollection, holds_collection: AsyncIOMotorCollection,
+                 cache: Optional[EntityCache] = None, hold_seconds: int = 900, retention_seconds: int = 86400):
+        self.books_collection = books_collection
+        self.holds_collection = holds_collection
+        self.cache = cache
+        self.hold_seconds = hold_seconds
+        self.retention_seconds = retention_seconds
+
+    async def reserve(self, data: CreateReservationSchema) -> ReservationResponseSchema:
+        try:
+            quantities = _quantities(data.items)
+            # Built before any stock is taken, so nothing can fail between taking it and recording the hold
+            hold = self._new_hold(quantities, self.hold_seconds if data.hold_seconds is None else data.hold_seconds)
+            await self._take(quantities)
+            try:
+                await self.holds_collection.insert_one(hold)
+            except Exception:
+                await self._restore([quantities])
+                raise
+            logger.info("Reserved %s books under hold %s", len(quantities), hold["_id"])
+            return ReservationResponseSchema.from_mongo(hold)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while reserving stock: %s", e)
+            raise HTTPException(status_code=500, detail=f"Failed to reserve stock due to an internal error: {e}")
+
+    def _new_hold(self, quantities: Dict[ObjectId, int], hold_seconds: int) -> dict:
+        now = utc_now()
+        hold = {
+            "_id": ObjectId(),
+            "items": [{"book_id": book_id, "quantity": quantity} for book_id, quantity in quantities.items()],
+            "created_at": now,
+        }
+        if hold_seconds:
+            expires_at = now + timedelta(seconds=hold_seconds)
+            hold.update(status=HELD, expires_at=expires_at,
+                        purge_at=expires_at + timedelta(seconds=self.retention_seconds))
+        else:
+            hold.update(status=ReservationStatus.CONFIRMED.value, confirmed_at=now,
+                        purge_at=now + timedelta(seconds=self.retention_seconds))
+        return hold
+
+    async def get_reservation(self, reservation_id: str) -> Optional[ReservationResponseSchema]:
+        try:
+            hold = await self.holds_collection.find_one({"_id": _object_id(reservation_id, "reservation")})
+            return ReservationResponseSchema.from_mongo(hold) if hold else None
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while retrieving reservation %s: %s", reservation_id, e)
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve reservation due to an internal error: {e}")
+
+    async def confirm(self, reservation_id: str) -> ReservationResponseSchema:
+        try:
+            hold_id = _object_id(reservation_id, "reservation")
+            now = utc_now()
+            # Conditional on the hold still running, so a confirm and the reaper never both act on it
+            hold = await self.holds_collection.find_one_and_update(
+                {"_id": hold_id, "status": HELD, "expires_at": {"$gt": now}},
+                {"$set": {"status": ReservationStatus.CONFIRMED.value, "confirmed_at": now,
+                          "purge_at": now + timedelta(seconds=self.retention_seconds)}},
+                return_document=ReturnDocument.AFTER)
+            if hold is None:
+                await self._raise_not_held(hold_id)
+            return ReservationResponseSchema.from_mongo(hold)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while confirming reservation %s: %s", reservation_id, e)
+            raise HTTPException(status_code=500, detail=f"Failed to confirm reservation due to an internal error: {e}")
+
+    async def release(self, reservation_id: str) -> ReservationResponseSchema:
+        try:
+            hold_id = _object_id(reservation_id, "reservation")
+            now = utc_now()
+            hold = await self.holds_collection.find_one_and_update(
+                {"_id": hold_id, "status": HELD},
+                {"$set": {"status": ReservationStatus.RELEASED.value, "released_at": now,
+                          "purge_at": now + timedelta(seconds=self.retention_seconds)}},
+                return_document=ReturnDocument.AFTER)
+            if hold is None:
+                await self._raise_not_held(hold_id)
+            await self._restore([{item["book_id"]: item["quantity"] for item in hold["items"]}])
+            logger.info("Released hold %s", hold_id)
+            return ReservationResponseSchema.from_mongo(hold)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error while releasing reservation %s: %s", reservation_id, e)
+            raise HTTPException(status_code=500, detail=f"Failed to release reservation due to an internal error: {e}")
+
+    async def release_expired(self, limit: int = 500) -> int:
+        """Return the stock of up to `limit` holds past `expires_at`; safe to run in every worker at once."""
+        now = utc_now()
+        candidates = [hold["_id"] async for hold in self.holds_collection.find(
+            {"status": HELD, "expires_at": {"$lte": now}}, {"_id": 1}).limit(limit)]
+        if not candidates:
+            return 0
+        # Claimed under a fresh token: holds another worker claimed first (or a client released) are skipped
+        claim = ObjectId()
+        await self.holds_collection.update_many(
+            {"_id": {"$in": candidates}, "status": HELD},
+            {"$set": {"status": ReservationStatus.EXPIRED.value, "released_at": now, "claim": claim,
+                      "purge_at": now + timedelta(seconds=self.retention_seconds)}})
+        holds = await self.holds_collection.find({"_id": {"$in": candidates}, "claim": claim},
+                                                 {"items": 1}).to_list(length=None)
+        await self._restore([{item["book_id"]: item["quantity"] for item in hold["items"]} for hold in holds])
+        if holds:
+            logger.info("Released %s expired holds", len(holds))
+        return len(holds)
+
+    async def _take(self, quantities: Dict[ObjectId, int]):
+        # One guarded update per book, sent concurrently: bulk_write only reports a total match count,
+        # which cannot tell which book of a cart fell short and which were taken and must be put back
+        now = utc_now()
+        results = await asyncio.gather(*[
+            self.books_collection.find_one_and_update(
+                {"_id": book_id, "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity, "version": 1}, "$set": {"updated_at": now}},
+                projection={"_id": 1})
+            for book_id, quantity in quantities.items()
+        ], return_exceptions=True)
+        taken = {book_id: quantity for (book_id, quantity), result in zip(quantities.items(), results)
+                 if result is not None and not isinstance(result, BaseException)}
+        await self._invalidate(taken)
+        if len(taken) == len(quantities):
+            return
+
+        await self._restore([taken])
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        short = [book_id for book_id in quantities if book_id not in taken]
+        stock = {book["_id"]: book.get("stock") or 0
+                 async for book in self.books_collection.find({"_id": {"$in": short}}, {"stock": 1})}
+        missing = [str(book_id) for book_id in short if book_id not in stock]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Books not found: {', '.join(missing)}")
+        raise HTTPException(status_code=409, detail="Insufficient stock: " + ", ".join(
+            f"{book_id} has {stock[book_id]}, {quantities[book_id]} requested" for book_id in short))
+
+    async def _restore(self, carts: List[Dict[ObjectId, int]]):
+        quantities = Counter()
+        for cart in carts:
+            quantities.update(cart)
+        if not quantities:
+            return
+        now = utc_now()
+        await self.books_collection.bulk_write([
+            UpdateOne({"_id": book_id}, {"$inc": {"stock": quantity, "version": 1}, "$set": {"updated_at": now}})
+            for book_id, quantity in quantities.items()
+        ], ordered=False)
+        await self._invalidate(quantities)
+
+    async def _invalidate(self, book_ids: Iterable[ObjectId]):
+        if self.cache:
+            for book_id in book_ids:
+                await self.cache.invalidate(str(book_id))
+
+    async def _raise_not_held(self, hold_id: ObjectId):
+        hold = await self.holds_collection.find_one({"_id": hold_id}, {"status": 1})
+        if hold is None:
+            raise HTTPException(status_code=404, detail=f"Reservation {hold_id} not found")
+        if hold["status"] == HELD:
+            raise HTTPException(status_code=409, detail=f"Reservation {hold_id} has expired")
+        raise HTTPException(status_code=409, detail=f"Reservation {hold_id} is already {hold['status']}")
+
+
+class HoldReaper:
+    """Periodically returns the stock of expired holds."""
+
+    def __init__(self, reservations: ReservationCRUD, interval: float, batch_size: int = 500):
+        self.reservations = reservations
+        self.interval = interval
+        self.batch_size = batch_size
+        self.runs = 0
+        self.released = 0
+        self.errors = 0
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "released": self.released, "errors": self.errors}
+
+    async def run(self):
+        while True:
+            try:
+                while True:
+                    released = await self.reservations.release_expired(self.batch_size)
+                    self.released += released
+                    if released < self.batch_size:
+                        break
+                self.runs += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error("Failed to release expired holds: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+def create_hold_reaper(reservations: ReservationCRUD, interval: float) -> Optional[HoldReaper]:
+    if not interval or interval <= 0:
+        return None
+    return HoldReaper(reservations, interval)
@@ -1,6 +1,14 @@
+from typing import Optional
+
 from fastapi import Request
 from motor.motor_asyncio import AsyncIOMotorCollection
 
+from app.cache.read_through import EntityCache
+from app.crud.facets_crud import BookFacetsCRUD
+from app.crud.reservations_crud import ReservationCRUD
+from app.utils.http_cache import HttpCache
+from app.utils.single_flight import SingleFlight
+
 
 async def get_book_collection(request: Request) -> AsyncIOMotorCollection:
     container = request.app.state.container
@@ -8,15 +16,42 @@ async def get_book_collection(request: Request) -> AsyncIOMotorCollection:
     return book_collection
 
 
+async def get_book_read_collection(request: Request) -> AsyncIOMotorCollection:
+    container = request.app.state.container
+    return container.book_read_collection()
+
+
+async def get_book_facets(request: Request) -> BookFacetsCRUD:
+    container = request.app.state.container
+    return container.book_facets()
+
+
 async def get_author_collection(request: Request) -> AsyncIOMotorCollection:
     container = request.app.state.container
     author_collection = container.author_collection()
     return author_collection
 
 
-async def create_book_indexes(book_collection: AsyncIOMotorCollection):
-    await book_collection.create_index([("title", 1)], unique=True)
-    await book_collection.create_index([("price", 1)], unique=True)
-    print("Book's indexes created successfully")
+async def get_book_cache(request: Request) -> Optional[EntityCache]:
+    container = request.app.state.container
+    return container.book_cache()
 
 
+async def get_author_cache(request: Request) -> Optional[EntityCache]:
+    container = request.app.state.container
+    return container.author_cache()
+
+
+async def get_single_flight(request: Request) -> Optional[SingleFlight]:
+    container = request.app.state.container
+    return container.single_flight()
+
+
+async def get_http_cache(request: Request) -> HttpCache:
+    container = request.app.state.container
+    return container.http_cache()
+
+
+async def get_reservations(request: Request) -> ReservationCRUD:
+    container = request.app.state.container
+    return container.reservations()
@@ -1,25 +1,30 @@
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import os
 
-
-BUCKET_NAME = "book-store-logs"
+BUCKET_NAME = os.getenv("S3_LOG_BUCKET", "book-store-logs")
+# Point at a local S3 stand-in (moto server, MinIO, ...) when set
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
 s3_client = None
 
 
 def get_s3_client():
     global s3_client
     if s3_client is None:
+        # Imported on first upload rather than at startup: boto3 is slow to import and uploads are infrequent
+        import boto3
+        from botocore.exceptions import NoCredentialsError, PartialCredentialsError
         try:
-            s3_client = boto3.client('s3')
+            s3_client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
         except (NoCredentialsError, PartialCredentialsError) as e:
             print(f"Error with AWS credentials: {e}")
     return s3_client
 
 
-def upload_log_to_s3(log_file: str, s3_key: str):
+def upload_log_to_s3(log_file: str, s3_key: str) -> bool:
     s3 = get_s3_client()
     try:
         s3.upload_file(log_file, BUCKET_NAME, s3_key)
         print(f"Successfully uploaded {log_file} to s3://{BUCKET_NAME}/{s3_key}")
+        return True
     except Exception as e:
         print(f"Failed to upload log to S3 service: {e}")
+        return False
@@ -1,42 +1,267 @@
-import os
+import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import Response
 from motor.motor_asyncio import AsyncIOMotorClient
 
-from app.container import Container
-from app.routers import books_router, authors_router
+from app.container import Container, load_config
+from app.crud.books_crud import BookCRUD
+from app.crud.change_subscribers import AuthorRenameSubscriber, CacheInvalidationSubscriber, FacetsSubscriber, \
+    SearchTermsSubscriber
+from app.middlewares.compression_middleware import CompressionMiddleware
+from app.middlewares.load_shedding_middleware import LoadSheddingMiddleware
+from app.middlewares.metrics_middleware import MetricsMiddleware
+from app.middlewares.request_id_middleware import RequestIdMiddleware
+from app.routers import books_router, authors_router, ops_router, reservations_router
+from app.utils.indexes import reconcile_all_indexes
+from app.utils.lease import Lease
+from app.utils.logger import log_queue_handler, logger, start_logging, stop_logging
+from app.utils.metrics import REGISTRY
+from app.utils.readiness import Readiness
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker process: the log threads and the Motor client are created here, the client on the
+    # worker's own event loop, never at import time where a forking server would share its sockets and threads
+    owns_logging = start_logging()
+    db_client: AsyncIOMotorClient = container.db_client()
+    # Startup runs in the background so /healthz answers at once; /readyz reports when the steps are done
+    app.state.readiness = Readiness(["mongodb", "indexes", "cache"])
+    tasks = [asyncio.create_task(start_up(app.state.readiness))]
+    app.state.startup_tasks = tasks
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if owns_logging:
+        # Ships the last segment while boto3 can still run; the atexit hook is only a fallback
+        await asyncio.to_thread(stop_logging)
+    cache_backend = container.cache_backend()
+    if cache_backend is not None:
+        await cache_backend.close()
+    rate_limiter = container.rate_limiter()
+    if rate_limiter is not None:
+        await rate_limiter.close()
+    db_client.close()
+    container.db_client.reset()
+    container.change_consumer.reset()
+    container.hold_reaper.reset()
+
 
 app = FastAPI(
     title="BookStore API",
     description="API for managing books and authors",
     version="1.0.0",
+    lifespan=lifespan,
 )
 # Database
 container = Container()
-container.config.mongodb.url.from_value(os.getenv("MONGODB_URL"))
+load_config(container)
 app.state.container = container
+app.state.index_reports = {}
 
-app.include_router(books_router.router)
-app.include_router(authors_router.router)
+routers = [books_router.router, authors_router.router, reservations_router.router, ops_router.router]
 
+# Innermost: the adaptive limit sees handler latency only, and rejected requests are still counted by the metrics
+app.add_middleware(
+    LoadSheddingMiddleware,
+    # The routers are included without prefixes, so their own routes match request paths as they are
+    routes=[route for router in routers for route in router.routes],
+    rate_limiter=container.rate_limiter(),
+    limiter=container.concurrency_limiter(),
+    route_limiters=container.route_concurrency_limiters(),
+    pool_waiting=container.pool_monitor().waiting,
+    max_pool_waiting=container.config.load_shedding.max_pool_waiting(),
+    exempt_paths=container.config.load_shedding.exempt_paths(),
+    client_header=container.config.rate_limit.client_header(),
+)
 
-@app.on_event("startup")
-async def startup_event():
-    db_client: AsyncIOMotorClient = container.db_client()
+# Added before MetricsMiddleware so it runs inside it: metrics then record compressed sizes and include compression time
+if container.config.compression.enabled():
+    app.add_middleware(
+        CompressionMiddleware,
+        encodings=container.config.compression.encodings(),
+        levels=container.config.compression.levels(),
+        minimum_size=container.config.compression.minimum_size(),
+        offload_size=container.config.compression.offload_size(),
+    )
+
+app.add_middleware(
+    MetricsMiddleware,
+    profiling_enabled=container.config.metrics.profiling_enabled(),
+    profile_dir=container.config.metrics.profile_dir(),
+)
+# Outermost, so that logs from every other middleware carry the request id
+app.add_middleware(RequestIdMiddleware)
+
+for router in routers:
+    app.include_router(router)
+
+
+def collect_pool_metrics():
+    stats = container.pool_monitor().stats()
+    for name, key in (("mongodb_pool_connections", "connections"), ("mongodb_pool_in_use", "in_use"),
+                      ("mongodb_pool_waiting", "waiting")):
+        yield name, "gauge", f"Pool {key.replace('_', ' ')} per server", \
+            [({"server": server}, values[key]) for server, values in stats.items()]
+
+
+def collect_cache_metrics():
+    caches = [cache for cache in (container.book_cache(), container.author_cache()) if cache is not None]
+    for key in ("hits", "misses", "stale"):
+        yield f"cache_{key}_total", "counter", f"Read-through cache {key}", \
+            [({"namespace": cache.namespace}, getattr(cache, key)) for cache in caches]
+
+
+def collect_single_flight_metrics():
+    single_flight = container.single_flight()
+    if single_flight is None:
+        return
+    stats = single_flight.stats()
+    yield "single_flight_in_flight", "gauge", "Book reads currently in flight", [({}, stats["in_flight"])]
+    for key in ("calls", "coalesced", "errors", "cancelled"):
+        yield f"single_flight_{key}_total", "counter", f"Single-flight {key}", [({}, stats[key])]
+
+
+def collect_change_stream_metrics():
+    consumer = container.change_consumer()
+    if consumer is None:
+        return
+    stats = consumer.stats()
+    yield "change_stream_lag_seconds", "gauge", "Age of the last handled change event", [({}, stats["lag_seconds"])]
+    for key in ("events", "batches", "errors", "subscriber_errors", "resyncs"):
+        yield f"change_stream_{key}_total", "counter", f"Change stream {key.replace('_', ' ')}", [({}, stats[key])]
+
+
+def collect_hold_reaper_metrics():
+    reaper = container.hold_reaper()
+    if reaper is None:
+        return
+    yield "reservation_holds_expired_total", "counter", "Expired holds whose stock was returned", \
+        [({}, reaper.released)]
+    yield "reservation_reaper_errors_total", "counter", "Failed expired-hold sweeps", [({}, reaper.errors)]
+
+
+def collect_logging_metrics():
+    queue_handler = log_queue_handler()
+    if queue_handler is None:
+        return
+    yield "log_queue_depth", "gauge", "Log records waiting for the listener thread", [({}, queue_handler.queue.qsize())]
+    yield "log_records_dropped_total", "counter", "Log records dropped on a full queue", [({}, queue_handler.dropped)]
+
+
+def collect_load_shedding_metrics():
+    limiters = [("*", container.concurrency_limiter())] + list(container.route_concurrency_limiters().items())
+    limiters = [(route, limiter) for route, limiter in limiters if limiter is not None]
+    for name, key, documentation in (("concurrency_limit", "limit", "Current concurrency limit"),
+                                     ("concurrency_in_flight", "in_flight", "Requests holding a concurrency slot"),
+                                     ("concurrency_queue_depth", "queue_depth", "Requests waiting for a slot")):
+        yield name, "gauge", documentation, [({"route": route}, limiter.stats()[key]) for route, limiter in limiters]
+    rate_limiter = container.rate_limiter()
+    if rate_limiter is not None:
+        yield "rate_limit_errors_total", "counter", "Rate limit checks that failed open", [({}, rate_limiter.errors)]
+
+
+REGISTRY.add_collector(collect_pool_metrics)
+REGISTRY.add_collector(collect_cache_metrics)
+REGISTRY.add_collector(collect_single_flight_metrics)
+REGISTRY.add_collector(collect_change_stream_metrics)
+REGISTRY.add_collector(collect_hold_reaper_metrics)
+REGISTRY.add_collector(collect_logging_metrics)
+REGISTRY.add_collector(collect_load_shedding_metrics)
+
+
+def subscribe_change_consumer(consumer):
+    book_collection = container.book_collection()
+    consumer.subscribe(CacheInvalidationSubscriber(container.book_cache(), container.author_cache()))
+    consumer.subscribe(SearchTermsSubscriber(book_collection))
+    consumer.subscribe(AuthorRenameSubscriber(BookCRUD(book_collection, container.book_cache())))
+    rebuild_seconds = container.config.change_stream.facets_rebuild_seconds()
+    if rebuild_seconds:
+        # Held across two intervals, so the worker that rebuilds keeps renewing it ahead of the others
+        lease = Lease(container.leases_collection(), "facets_rebuild", 2 * rebuild_seconds)
+        consumer.subscribe(FacetsSubscriber(container.book_facets(), rebuild_seconds, lease))
+
+
+async def start_up(readiness: Readiness):
+    await wait_for_mongodb(readiness)
+    tasks = app.state.startup_tasks
+    tasks += [asyncio.create_task(backfill_facets()), asyncio.create_task(backfill_search_terms())]
+    consumer = container.change_consumer()
+    if consumer is not None:
+        subscribe_change_consumer(consumer)
+        tasks.append(asyncio.create_task(consumer.run()))
+    reaper = container.hold_reaper()
+    if reaper is not None:
+        tasks.append(asyncio.create_task(reaper.run()))
+    await asyncio.gather(build_indexes(readiness), warm_up(readiness))
+
+
+async def wait_for_mongodb(readiness: Readiness):
+    # A worker that starts before MongoDB keeps retrying instead of exiting; it stays unready meanwhile
+    delay = 0.5
+    while True:
+        try:
+            await container.db_client().admin.command('ping')
+            logger.info("MongoDB connection successful.")
+            readiness.passed("mongodb")
+            return
+        except Exception as e:
+            logger.warning("Failed to connect to MongoDB, retrying in %ss: %s", delay, e)
+            readiness.failed("mongodb", e)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 10)
+
+
+async def build_indexes(readiness: Readiness):
+    while container.config.mongodb.reconcile_indexes():
+        app.state.index_reports = await reconcile_all_indexes(container.database())
+        errors = [f"{name}: {report.error}" for name, report in app.state.index_reports.items() if report.error]
+        if not errors:
+            break
+        readiness.failed("indexes", Exception("; ".join(errors)))
+        await asyncio.sleep(5)
+    readiness.passed("indexes")
+
+
+async def warm_up(readiness: Readiness):
+    # Best effort: a worker that could not warm up still serves, just slower for its first requests
+    try:
+        db_client = container.db_client()
+        connections = min(container.config.startup.warm_connections(), container.config.mongodb.max_pool_size())
+        # Concurrent pings make the pool open that many connections now rather than on the first requests
+        await asyncio.gather(*[db_client.admin.command('ping') for _ in range(connections)])
+        warmed = await BookCRUD(container.book_collection(), container.book_cache()).warm_cache(
+            container.config.startup.warm_books())
+        if warmed:
+            logger.info("Warmed the cache with %d books.", warmed)
+    except Exception as e:
+        logger.warning("Failed to warm up: %s", e)
+        readiness.degraded("cache", e)
+    else:
+        readiness.passed("cache")
+
+
+async def backfill_facets():
+    facets = container.book_facets()
     try:
-        await db_client.admin.command('ping')
-        print("MongoDB connection successful.")
-        # book_collection = container.book_collection()
-        # await create_book_indexes(book_collection)
+        if await facets.is_empty():
+            await facets.rebuild()
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        raise e
+        logger.exception("Failed to backfill book facets: %s", e)
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    await container.db_client().close()
+async def backfill_search_terms():
+    # Books written before search existed have no term fields and are invisible to prefix search
+    try:
+        updated = await BookCRUD(container.book_collection()).backfill_search_terms()
+        if updated:
+            logger.info("Backfilled search terms for %d books.", updated)
+    except Exception as e:
+        logger.exception("Failed to backfill search terms: %s", e)
 
 
 @app.get("/")
@@ -50,5 +275,6 @@ async def favicon():
 
 
 if __name__ == "__main__":
+    # Single process for development; production runs `python -m app.server`
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,99 @@
+from typing import Dict, Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.utils.compression import COMPRESSORS, DEFAULT_LEVELS, negotiate
+from app.utils.metrics import HTTP_COMPRESSION_INPUT_BYTES, HTTP_COMPRESSION_OUTPUT_BYTES
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionMiddleware:
+    """
+    Negotiates zstd, br or gzip (whichever are installed) from Accept-Encoding. Complete bodies under
+    `minimum_size` are sent as-is; streamed bodies are compressed chunk by chunk, flushing after each one so
+    NDJSON consumers still see records as they are produced. Chunks of `offload_size` bytes or more are
+    compressed in the thread pool instead of on the event loop.
+    """
+
+    def __init__(self, app, encodings: Sequence[str] = ("zstd", "br", "gzip"), levels: Optional[Dict[str, int]] = None,
+                 minimum_size: int = 1024, offload_size: int = 64 * 1024):
+        self.app = app
+        self.encodings = [encoding for encoding in encodings if encoding in COMPRESSORS]
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+        input_bytes = output_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough, input_bytes, output_bytes
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not self._compressible(start_message["status"], headers) or \
+                        (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = COMPRESSORS[encoding](self.levels[encoding])
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("accept-encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The encoded bytes differ from what a strong validator promises; weak comparison still matches
+                    headers["etag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    data = await self._compress(compressor, body, final=True)
+                    input_bytes, output_bytes = len(body), len(data)
+                    headers["content-length"] = str(len(data))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send(start_message)
+
+            data = await self._compress(compressor, body, final=not more_body)
+            input_bytes += len(body)
+            output_bytes += len(data)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+        if compressor is not None:
+            HTTP_COMPRESSION_INPUT_BYTES.inc((encoding,), input_bytes)
+            HTTP_COMPRESSION_OUTPUT_BYTES.inc((encoding,), output_bytes)
+
+    @staticmethod
+    def _compressible(status: int, headers: MutableHeaders) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers or "content-range" in headers:
+            return False
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, compressor, body: bytes, final: bool) -> bytes:
+        def run():
+            return compressor.compress(body) + (compressor.finish() if final else compressor.flush())
+
+        return await run_in_threadpool(run) if len(body) >= self.offload_size else run()
@@ -0,0 +1,97 @@
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from app.utils.concurrency_limit import ConcurrencyLimiter
+from app.utils.metrics import HTTP_REQUESTS_SHED
+from app.utils.rate_limit import RateLimiter, retry_after
+
+
+class LoadSheddingMiddleware:
+    """
+    Turns requests away before they reach MongoDB when a client or the worker is over its budget:
+    429 when the client's token bucket for the route is empty, 503 when MongoDB's pool already has more than
+    `max_pool_waiting` checkouts waiting, or when the route's concurrency cap or the worker's (adaptive)
+    concurrency limit is reached and the request cannot get a slot within the queue timeout.
+    Both carry Retry-After. Limits are looked up by route name, as for Cache-Control policies.
+    """
+
+    def __init__(self, app, routes: list, rate_limiter: Optional[RateLimiter] = None,
+                 limiter: Optional[ConcurrencyLimiter] = None,
+                 route_limiters: Optional[Dict[str, ConcurrencyLimiter]] = None,
+                 pool_waiting: Optional[Callable[[], int]] = None, max_pool_waiting: Optional[int] = None,
+                 exempt_paths: Iterable[str] = (), client_header: Optional[str] = None):
+        self.app = app
+        self.routes = routes
+        self.rate_limiter = rate_limiter
+        self.limiter = limiter
+        self.route_limiters = route_limiters or {}
+        self.pool_waiting = pool_waiting
+        self.max_pool_waiting = max_pool_waiting
+        self.exempt_paths = set(exempt_paths)
+        self.client_header = client_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        # Set ahead of the router so that rejected requests are still recorded under their route
+        scope["route"] = route
+
+        if self.rate_limiter is not None:
+            wait = await self.rate_limiter.check(self._client(scope), route.name)
+            if wait:
+                await self._reject(scope, receive, send, 429, "Rate limit exceeded", wait, "rate_limit")
+                return
+
+        if self.pool_waiting is not None and self.max_pool_waiting is not None \
+                and self.pool_waiting() > self.max_pool_waiting:
+            await self._reject(scope, receive, send, 503, "Database connection pool is saturated", 1, "pool")
+            return
+
+        limiters = [(reason, limiter) for reason, limiter in (
+            ("route_concurrency", self.route_limiters.get(route.name)), ("concurrency", self.limiter))
+            if limiter is not None]
+        acquired = []
+        # Stays None for failed or cancelled requests, which say nothing reliable about latency
+        latency = None
+        try:
+            for reason, limiter in limiters:
+                if not await limiter.acquire():
+                    await self._reject(scope, receive, send, 503, "Server is busy", limiter.queue_timeout, reason)
+                    return
+                acquired.append(limiter)
+            start = time.perf_counter()
+            await self.app(scope, receive, send)
+            latency = time.perf_counter() - start
+        finally:
+            for limiter in acquired:
+                limiter.release(latency)
+
+    def _match(self, scope):
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    def _client(self, scope) -> str:
+        if self.client_header:
+            client = Headers(scope=scope).get(self.client_header)
+            if client:
+                return client
+        return scope["client"][0] if scope.get("client") else "unknown"
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str, wait: float, reason: str):
+        HTTP_REQUESTS_SHED.inc((scope["method"], scope["route"].path, reason))
+        response = JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": retry_after(wait)})
+        await response(scope, receive, send)
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from app.utils.metrics import HTTP_LATENCY, HTTP_REQUESTS, HTTP_RESPONSE_BYTES
+from app.utils.profiling import StackSampler, profile_path
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and response bytes per route template (never the raw path, to bound label cardinality).
+    When profiling is enabled, a request sent with an `X-Profile` header is sampled and its folded stacks
+    are written under `profile_dir`; the file name is returned in the `X-Profile-File` response header.
+    """
+
+    def __init__(self, app, profiling_enabled: bool = False, profile_dir: str = "logs/profiles"):
+        self.app = app
+        self.profiling_enabled = profiling_enabled
+        self.profile_dir = profile_dir
+        self._profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+        sampler = self._start_profile(scope)
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if sampler:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-file", sampler.output_path.encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if sampler:
+                sampler.stop()
+                self._profiling = False
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - start, (method, path))
+            HTTP_REQUESTS.inc((method, path, str(status)))
+            HTTP_RESPONSE_BYTES.inc((method, path), size)
+
+    def _start_profile(self, scope):
+        if not self.profiling_enabled or self._profiling:
+            return None
+        if not any(name == b"x-profile" for name, _ in scope.get("headers", [])):
+            return None
+        # One profiled request at a time; concurrent requests share the same loop thread anyway
+        self._profiling = True
+        sampler = StackSampler(threading.get_ident(), profile_path(self.profile_dir, scope["path"]))
+        sampler.start()
+        return sampler
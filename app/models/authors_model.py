@@ -4,20 +4,25 @@ from pydantic import BaseModel, Field, constr
 
 from app.models.py_object_id import PyObjectId
 
+AuthorName = constr(
+    min_length=1,
+    max_length=100,
+    strip_whitespace=True,
+    pattern=r'^[\w\s.,-]+$'
+)
+
 
 class AuthorReference(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     name: str
 
+    class Config:
+        populate_by_name = True
+
 
 class AuthorModel(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId)
-    name: constr(
-        min_length=1,
-        max_length=100,
-        strip_whitespace=True,
-        pattern=r'^[\w\s.,-]+$'
-    )
+    name: AuthorName
     bio: Optional[str] = None
 
     class Config:
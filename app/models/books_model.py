@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from typing import List, Optional
 
 from pydantic import BaseModel, Field
@@ -8,6 +9,12 @@ from app.utils.book_enum import BookTypeEnum
 from app.utils.book_enum import Genre
 
 
+def utc_now() -> datetime:
+    # Naive UTC at millisecond precision, as BSON dates are read back
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
 class BookModel(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId)
     title: str
@@ -17,7 +24,9 @@ class BookModel(BaseModel):
     price: Optional[float] = 0
     stock: Optional[int] = 0
     average_rating: Optional[float] = 5
-    version: Optional[int] = 1  # Schema versioning
+    rating_count: Optional[int] = 0
+    version: Optional[int] = 1  # Bumped on every update; PUT can require it via expected_version
+    updated_at: Optional[datetime] = Field(default_factory=utc_now)  # Last-Modified on reads
 
     # Specific fields for Ebook
     file_format: Optional[str] = None
@@ -1,23 +1,23 @@
 from bson import ObjectId
 from pydantic import GetJsonSchemaHandler
+from pydantic_core import core_schema
 
 
 class PyObjectId(ObjectId):
 
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source, handler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(cls.validate)
 
     @classmethod
     def validate(cls, v):
         if not ObjectId.is_valid(v):
             raise ValueError("Invalid object ID")
-        return v
+        return ObjectId(v)
 
     @classmethod
-    def __get_pydantic_json_schema__(cls, schema: dict, handler: GetJsonSchemaHandler) -> dict:
-        schema.update(type="string")
-        return schema
+    def __get_pydantic_json_schema__(cls, schema, handler: GetJsonSchemaHandler) -> dict:
+        return {"type": "string"}
 
     def __str__(self):
-        return str(self)
+        return super().__str__()
@@ -1,28 +1,75 @@
-import logging
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query, Request
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.crud.authors_crud import AuthorCRUD
-from app.dependencies import get_author_collection
-from app.schemas.authors_schema import AuthorResponse, AuthorCreate
+from app.crud.books_crud import BookCRUD
+from app.cache.read_through import EntityCache
+from app.dependencies import get_author_collection, get_author_cache, get_http_cache
+from app.routers.books_router import get_book_crud
+from app.schemas.authors_schema import AuthorResponse, AuthorCreate, AuthorUpdate
+from app.schemas.bulk_schema import BulkResultSchema
+from app.utils.bulk import iter_chunks, iter_ndjson_chunks
+from app.utils.http_cache import HttpCache
+from app.utils.responses import MongoJSONResponse
 
 router = APIRouter()
-logging.basicConfig(level=logging.INFO)
 
 
-def get_author_crud(collection: AsyncIOMotorCollection = Depends(get_author_collection)) -> AuthorCRUD:
-    return AuthorCRUD(collection)
+def get_author_crud(
+        collection: AsyncIOMotorCollection = Depends(get_author_collection),
+        cache: Optional[EntityCache] = Depends(get_author_cache),
+) -> AuthorCRUD:
+    return AuthorCRUD(collection, cache)
 
 
 @router.post("/authors/", response_model=AuthorResponse, status_code=201, tags=["Authors"])
 async def create_author(author_data: AuthorCreate, crud: AuthorCRUD = Depends(get_author_crud)):
-    return await crud.create_author(author_data)
+    return MongoJSONResponse(await crud.create_author(author_data), status_code=201)
+
+
+@router.post("/authors/bulk", response_model=BulkResultSchema, tags=["Authors"])
+async def bulk_create_authors(
+        items: List[Any] = Body(...),
+        chunk_size: int = Query(1000, ge=1, le=10000),
+        crud: AuthorCRUD = Depends(get_author_crud),
+):
+    return await crud.bulk_create_authors(iter_chunks(items, chunk_size))
+
+
+@router.post("/authors/bulk/ndjson", response_model=BulkResultSchema, tags=["Authors"])
+async def bulk_create_authors_ndjson(
+        request: Request,
+        chunk_size: int = Query(1000, ge=1, le=10000),
+        crud: AuthorCRUD = Depends(get_author_crud),
+):
+    report = BulkResultSchema()
+    return await crud.bulk_create_authors(iter_ndjson_chunks(request.stream(), chunk_size, report), report)
 
 
 @router.get("/authors/{author_id}", response_model=AuthorResponse, tags=["Authors"])
-async def get_author(author_id: str, crud: AuthorCRUD = Depends(get_author_crud)):
+async def get_author(author_id: str, request: Request, crud: AuthorCRUD = Depends(get_author_crud),
+                     http_cache: HttpCache = Depends(get_http_cache)):
     author = await crud.get_author(author_id)
     if author is None:
         raise HTTPException(status_code=404, detail="Author not found")
-    return author
+    # Authors carry no version; the ETag hashes the body, which is small and usually served from the cache
+    return http_cache.respond(request, author)
+
+
+@router.put("/authors/{author_id}", response_model=AuthorResponse, tags=["Authors"])
+async def update_author(
+        author_id: str,
+        author_data: AuthorUpdate,
+        background_tasks: BackgroundTasks,
+        crud: AuthorCRUD = Depends(get_author_crud),
+        book_crud: BookCRUD = Depends(get_book_crud),
+):
+    author, renamed = await crud.update_author(author_id, author_data)
+    if author is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    if renamed:
+        # Embedded copies in books catch up after the response; ?resolve_authors=true reads are exact meanwhile
+        background_tasks.add_task(book_crud.propagate_author_name, author_id, author.name)
+    return MongoJSONResponse(author)
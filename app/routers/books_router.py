@@ -1,19 +1,93 @@
-import logging
-from typing import List
+from collections import Counter
+from typing import Any, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from bson import ObjectId
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response
 from motor.motor_asyncio import AsyncIOMotorCollection
 
+from app.crud.author_loader import AuthorLoader, resolve_author_names, resolve_streamed_author_names
 from app.crud.books_crud import BookCRUD
-from app.dependencies import get_book_collection
-from app.schemas.books_schema import CreateBookSchema, UpdateBookSchema, BookResponseSchema, ListBooksSchema
+from app.crud.facets_crud import BookFacetsCRUD
+from app.cache.read_through import EntityCache
+from app.dependencies import get_author_collection, get_book_collection, get_book_cache, get_book_facets, \
+    get_book_read_collection, get_http_cache, get_single_flight
+from app.schemas.books_schema import CreateBookSchema, UpdateBookSchema, BookResponseSchema, ListBooksSchema, \
+    BookSearchSchema, RateBookSchema, parse_book_fields, read_schema
+from app.schemas.bulk_schema import BulkResultSchema
+from app.schemas.facets_schema import BookFacetsSchema
+from app.utils.book_enum import BookSortEnum, BookTypeEnum, Genre, GenreMatch, SortOrder
+from app.utils.book_query import BookFilter, BookQuery
+from app.utils.bulk import iter_chunks, iter_ndjson_chunks
+from app.utils.http_cache import HttpCache, book_validators
+from app.utils.responses import MongoJSONResponse
+from app.utils.search import SearchMode
+from app.utils.single_flight import SingleFlight
+from app.utils.streaming import StreamFormat, stream_documents
 
 router = APIRouter()
-logging.basicConfig(level=logging.INFO)
 
 
-def get_book_crud(collection: AsyncIOMotorCollection = Depends(get_book_collection)) -> BookCRUD:
-    return BookCRUD(collection)
+def get_book_crud(
+        collection: AsyncIOMotorCollection = Depends(get_book_collection),
+        cache: Optional[EntityCache] = Depends(get_book_cache),
+        read_collection: AsyncIOMotorCollection = Depends(get_book_read_collection),
+        single_flight: Optional[SingleFlight] = Depends(get_single_flight),
+        facets: BookFacetsCRUD = Depends(get_book_facets),
+) -> BookCRUD:
+    return BookCRUD(collection, cache, read_collection, single_flight, facets)
+
+
+def get_author_loader(
+        resolve_authors: bool = Query(False, description="Replace embedded author names with the current ones"),
+        collection: AsyncIOMotorCollection = Depends(get_author_collection),
+) -> Optional[AuthorLoader]:
+    return AuthorLoader(collection) if resolve_authors else None
+
+
+def get_book_fields(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,price"),
+) -> Optional[Tuple[str, ...]]:
+    try:
+        return parse_book_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def get_book_filter(
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        min_rating: Optional[float] = Query(None, ge=0, le=5),
+        max_rating: Optional[float] = Query(None, ge=0, le=5),
+        book_type: Optional[List[BookTypeEnum]] = Query(None, description="Repeat to match any of several types"),
+        genre: Optional[List[Genre]] = Query(None, description="Repeat to match several genres"),
+        genre_match: GenreMatch = Query(GenreMatch.ANY, description="any: at least one genre; all: every genre"),
+        in_stock: bool = False,
+        author_id: Optional[str] = None,
+) -> BookFilter:
+    if author_id is not None and not ObjectId.is_valid(author_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid author ID: {author_id}")
+    return BookFilter(
+        min_price=min_price, max_price=max_price, min_rating=min_rating, max_rating=max_rating,
+        book_types=tuple(book_type or ()), genres=tuple(genre or ()), genre_match=genre_match, in_stock=in_stock,
+        author_id=ObjectId(author_id) if author_id else None,
+    )
+
+
+def _not_modified(request: Request, validators: tuple, http_cache: HttpCache) -> Optional[Response]:
+    etag, last_modified = book_validators(*validators)
+    if http_cache.is_fresh(request, etag, last_modified):
+        return http_cache.not_modified(request, etag, last_modified)
+    return None
+
+
+async def _book_response(request: Request, book: BookResponseSchema, authors: Optional[AuthorLoader],
+                         http_cache: HttpCache) -> Response:
+    if authors is not None:
+        # Resolved names are not covered by the book's version, so the ETag is a hash of the body instead
+        await resolve_author_names([book], authors)
+        return http_cache.respond(request, book)
+    return http_cache.respond(request, book, *book_validators(book.id, book.version, book.updated_at))
 
 
 @router.post("/books/", response_model=str, status_code=status.HTTP_201_CREATED, tags=["Books"])
@@ -21,33 +95,206 @@ async def create_book(book_data: CreateBookSchema, crud: BookCRUD = Depends(get_
     return await crud.create_book(book_data)
 
 
+@router.post("/books/bulk", response_model=BulkResultSchema, tags=["Books"])
+async def bulk_create_books(
+        items: List[Any] = Body(...),
+        chunk_size: int = Query(1000, ge=1, le=10000),
+        crud: BookCRUD = Depends(get_book_crud),
+):
+    return await crud.bulk_create_books(iter_chunks(items, chunk_size))
+
+
+@router.post("/books/bulk/ndjson", response_model=BulkResultSchema, tags=["Books"])
+async def bulk_create_books_ndjson(
+        request: Request,
+        chunk_size: int = Query(1000, ge=1, le=10000),
+        crud: BookCRUD = Depends(get_book_crud),
+):
+    report = BulkResultSchema()
+    return await crud.bulk_create_books(iter_ndjson_chunks(request.stream(), chunk_size, report), report)
+
+
+@router.patch("/books/bulk", response_model=BulkResultSchema, tags=["Books"])
+async def bulk_update_books(
+        items: List[Any] = Body(...),
+        chunk_size: int = Query(1000, ge=1, le=10000),
+        crud: BookCRUD = Depends(get_book_crud),
+):
+    # Facet deltas are computed per book from one snapshot, so a second update of the same book would skew them
+    ids = Counter(item.get("id") for item in items if isinstance(item, dict) and isinstance(item.get("id"), str))
+    duplicates = sorted(book_id for book_id, count in ids.items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=422, detail=f"Duplicate book IDs: {', '.join(duplicates)}")
+    return await crud.bulk_update_books(iter_chunks(items, chunk_size))
+
+
+@router.post("/books/bulk/delete", response_model=BulkResultSchema, tags=["Books"])
+async def bulk_delete_books(book_ids: List[str] = Body(...), crud: BookCRUD = Depends(get_book_crud)):
+    return await crud.bulk_delete_books(book_ids)
+
+
+@router.get("/books/search/", response_model=BookSearchSchema, tags=["Books"])
+async def search_books(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=200),
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = Query(0, ge=0, le=1000),
+        limit: int = Query(20, ge=1, le=100),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    result = await crud.search_books(q, mode=mode, skip=skip, limit=limit, fields=fields)
+    await resolve_author_names(result.books, authors)
+    return http_cache.respond(request, result)
+
+
+@router.get("/books/query/", response_model=ListBooksSchema, tags=["Books"])
+async def query_books(
+        request: Request,
+        book_filter: BookFilter = Depends(get_book_filter),
+        sort_by: BookSortEnum = BookSortEnum.ID,
+        order: SortOrder = SortOrder.ASC,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        allow_disk_use: bool = Query(False, description="Allow sorts no index covers to spill to disk"),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    query = BookQuery(book_filter, sort_by, order, limit, cursor, allow_disk_use)
+    page = await crud.query_books(query, fields=fields, include_total=include_total)
+    await resolve_author_names(page.books, authors)
+    return http_cache.respond(request, page)
+
+
+@router.get("/books/facets/", response_model=BookFacetsSchema, tags=["Books"])
+async def get_book_facets_counts(request: Request, live: bool = False,
+                                 facets: BookFacetsCRUD = Depends(get_book_facets),
+                                 http_cache: HttpCache = Depends(get_http_cache)):
+    # live=true aggregates the whole catalog, e.g. to check the summary for drift
+    return http_cache.respond(request, await facets.compute_facets() if live else await facets.get_facets())
+
+
+@router.post("/books/facets/rebuild", response_model=BookFacetsSchema, tags=["Books"])
+async def rebuild_book_facets(facets: BookFacetsCRUD = Depends(get_book_facets)):
+    return await facets.rebuild()
+
+
 @router.get("/books/{book_id}", response_model=BookResponseSchema, tags=["Books"])
-async def get_book(book_id: str, crud: BookCRUD = Depends(get_book_crud)):
+async def get_book(book_id: str, request: Request, crud: BookCRUD = Depends(get_book_crud),
+                   authors: Optional[AuthorLoader] = Depends(get_author_loader),
+                   http_cache: HttpCache = Depends(get_http_cache)):
+    # Revalidations are answered from the cache or a version-only projection, without loading the book
+    if authors is None and http_cache.has_preconditions(request):
+        validators = await crud.get_book_validators(book_id)
+        if validators is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        not_modified = _not_modified(request, validators, http_cache)
+        if not_modified:
+            return not_modified
     book = await crud.get_book(book_id)
     if not book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
-    return book
+    return await _book_response(request, book, authors, http_cache)
 
 
 @router.get("/books/title/{title}", response_model=BookResponseSchema, tags=["Books"])
-async def get_book_by_title(title: str, crud: BookCRUD = Depends(get_book_crud)):
+async def get_book_by_title(title: str, request: Request, crud: BookCRUD = Depends(get_book_crud),
+                            authors: Optional[AuthorLoader] = Depends(get_author_loader),
+                            http_cache: HttpCache = Depends(get_http_cache)):
+    if authors is None and http_cache.has_preconditions(request):
+        validators = await crud.get_book_validators_by_title(title)
+        if validators is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        not_modified = _not_modified(request, validators, http_cache)
+        if not_modified:
+            return not_modified
     book = await crud.get_book_by_title(title)
     if not book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
-    return book
+    return await _book_response(request, book, authors, http_cache)
 
 
 @router.get("/books/sorted-by-price/", response_model=List[BookResponseSchema], tags=["Books"])
-async def get_books_sorted_by_price(crud: BookCRUD = Depends(get_book_crud)):
-    books = await crud.get_books_sorted_by_price()
+async def get_books_sorted_by_price(
+        request: Request,
+        stream: Optional[StreamFormat] = None,
+        batch_size: int = Query(500, ge=1, le=10000),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    if stream:
+        docs = crud.iter_books_sorted_by_price(batch_size=batch_size, fields=fields)
+        docs = resolve_streamed_author_names(docs, authors, batch_size)
+        return stream_documents(docs, stream, read_schema(fields).json_from_mongo, batch_size)
+    books = await crud.get_books_sorted_by_price(fields=fields)
+    if not books:
+        raise HTTPException(status_code=404, detail="No books found.")
+    await resolve_author_names(books, authors)
+    return http_cache.respond(request, books)
+
+
+@router.get("/books/by-type-genre-rating/", response_model=List[BookResponseSchema], tags=["Books"])
+async def get_books_by_book_type_genre_rating(
+        request: Request,
+        book_type: BookTypeEnum,
+        genre: Genre,
+        min_rating: float = 0,
+        max_rating: float = 5,
+        stream: Optional[StreamFormat] = None,
+        batch_size: int = Query(500, ge=1, le=10000),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    if stream:
+        docs = crud.iter_books_by_book_type_genre_rating(book_type, genre, min_rating, max_rating,
+                                                         batch_size=batch_size, fields=fields)
+        docs = resolve_streamed_author_names(docs, authors, batch_size)
+        return stream_documents(docs, stream, read_schema(fields).json_from_mongo, batch_size)
+    books = await crud.get_books_by_book_type_genre_rating(book_type, genre, min_rating, max_rating, fields=fields)
     if not books:
         raise HTTPException(status_code=404, detail="No books found.")
-    return books
+    await resolve_author_names(books, authors)
+    return http_cache.respond(request, books)
 
 
 @router.get("/books/", response_model=List[BookResponseSchema], tags=["Books"])
-async def list_books(skip: int = 0, limit: int = 10, crud: BookCRUD = Depends(get_book_crud)):
-    return await crud.list_books(skip=skip, limit=limit)
+async def list_books(
+        request: Request,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(10, ge=1, le=100),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    books = await crud.list_books(skip=skip, limit=limit, fields=fields)
+    await resolve_author_names(books, authors)
+    return http_cache.respond(request, books)
+
+
+@router.get("/books/page/", response_model=ListBooksSchema, tags=["Books"])
+async def list_books_page(
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: int = Query(10, ge=1, le=100),
+        sort_by: BookSortEnum = BookSortEnum.ID,
+        include_total: bool = False,
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    page = await crud.list_books_page(limit=limit, cursor=cursor, sort_by=sort_by, include_total=include_total)
+    await resolve_author_names(page.books, authors)
+    return http_cache.respond(request, page)
 
 
 @router.put("/books/{book_id}", response_model=BookResponseSchema, tags=["Books"])
@@ -55,7 +302,15 @@ async def update_book(book_id: str, book_data: UpdateBookSchema, crud: BookCRUD
     updated_book = await crud.update_book(book_id, book_data)
     if not updated_book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found or not updated")
-    return updated_book
+    return MongoJSONResponse(updated_book)
+
+
+@router.post("/books/{book_id}/ratings", response_model=BookResponseSchema, tags=["Books"])
+async def rate_book(book_id: str, rating: RateBookSchema, crud: BookCRUD = Depends(get_book_crud)):
+    book = await crud.rate_book(book_id, rating.rating)
+    if not book:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+    return MongoJSONResponse(book)
 
 
 @router.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Books"])
@@ -67,8 +322,18 @@ async def delete_book(book_id: str, crud: BookCRUD = Depends(get_book_crud)):
 
 
 @router.get("/books/price-range/", response_model=List[BookResponseSchema], tags=["Books"])
-async def get_books_by_price_range(min_price: float, max_price: float, crud: BookCRUD = Depends(get_book_crud)):
-    books = await crud.get_books_by_price_range(min_price, max_price)
+async def get_books_by_price_range(
+        request: Request,
+        min_price: float,
+        max_price: float,
+        limit: int = Query(100, ge=1, le=1000),
+        fields: Optional[Tuple[str, ...]] = Depends(get_book_fields),
+        crud: BookCRUD = Depends(get_book_crud),
+        authors: Optional[AuthorLoader] = Depends(get_author_loader),
+        http_cache: HttpCache = Depends(get_http_cache),
+):
+    books = await crud.get_books_by_price_range(min_price, max_price, fields=fields, limit=limit)
     if not books:
         raise HTTPException(status_code=404, detail="No books found in the specified price range.")
-    return books
+    await resolve_author_names(books, authors)
+    return http_cache.respond(request, books)
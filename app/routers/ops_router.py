@@ -0,0 +1,82 @@
+import asyncio
+from dataclasses import asdict
+
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.utils.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/healthz", tags=["Ops"])
+async def healthz():
+    # Liveness only: answers while the worker's event loop runs, whatever the state of its dependencies
+    return {"status": "ok"}
+
+
+@router.get("/readyz", tags=["Ops"])
+async def readyz(request: Request):
+    report = request.app.state.readiness.report()
+    try:
+        await asyncio.wait_for(request.app.state.container.db_client().admin.command('ping'), 2)
+        report["mongodb_reachable"] = True
+    except Exception as e:
+        report.update(mongodb_reachable=False, mongodb_error=str(e) or type(e).__name__)
+    ready = report["ready"] and report["mongodb_reachable"]
+    return JSONResponse(report, status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@router.get("/cache/stats", tags=["Ops"])
+async def cache_stats(request: Request):
+    container = request.app.state.container
+    stats = {}
+    for name, cache in (("book", container.book_cache()), ("author", container.author_cache())):
+        if cache is not None:
+            stats[name] = await cache.stats()
+    return stats
+
+
+@router.get("/pool/stats", tags=["Ops"])
+async def pool_stats(request: Request):
+    return request.app.state.container.pool_monitor().stats()
+
+
+@router.get("/single-flight/stats", tags=["Ops"])
+async def single_flight_stats(request: Request):
+    single_flight = request.app.state.container.single_flight()
+    return single_flight.stats() if single_flight is not None else {}
+
+
+@router.get("/change-stream/stats", tags=["Ops"])
+async def change_stream_stats(request: Request):
+    consumer = request.app.state.container.change_consumer()
+    return consumer.stats() if consumer is not None else {}
+
+
+@router.get("/hold-reaper/stats", tags=["Ops"])
+async def hold_reaper_stats(request: Request):
+    reaper = request.app.state.container.hold_reaper()
+    return reaper.stats() if reaper is not None else {}
+
+
+@router.get("/load-shedding/stats", tags=["Ops"])
+async def load_shedding_stats(request: Request):
+    container = request.app.state.container
+    limiter = container.concurrency_limiter()
+    rate_limiter = container.rate_limiter()
+    return {
+        "concurrency": limiter.stats() if limiter is not None else None,
+        "routes": {route: limiter.stats() for route, limiter in container.route_concurrency_limiters().items()},
+        "rate_limit_errors": rate_limiter.errors if rate_limiter is not None else None,
+    }
+
+
+@router.get("/indexes/report", tags=["Ops"])
+async def index_report(request: Request):
+    return {name: asdict(report) | {"ok": report.ok} for name, report in request.app.state.index_reports.items()}
+
+
+@router.get("/metrics", response_class=PlainTextResponse, tags=["Ops"])
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
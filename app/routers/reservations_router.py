@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.crud.reservations_crud import ReservationCRUD
+from app.dependencies import get_reservations
+from app.schemas.reservations_schema import CreateReservationSchema, ReservationResponseSchema
+from app.utils.responses import MongoJSONResponse
+
+router = APIRouter()
+
+
+@router.post("/reservations/", response_model=ReservationResponseSchema, status_code=status.HTTP_201_CREATED,
+             tags=["Reservations"])
+async def create_reservation(data: CreateReservationSchema, crud: ReservationCRUD = Depends(get_reservations)):
+    return MongoJSONResponse(await crud.reserve(data), status_code=status.HTTP_201_CREATED)
+
+
+@router.get("/reservations/{reservation_id}", response_model=ReservationResponseSchema, tags=["Reservations"])
+async def get_reservation(reservation_id: str, crud: ReservationCRUD = Depends(get_reservations)):
+    reservation = await crud.get_reservation(reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+    return MongoJSONResponse(reservation)
+
+
+@router.post("/reservations/{reservation_id}/confirm", response_model=ReservationResponseSchema,
+             tags=["Reservations"])
+async def confirm_reservation(reservation_id: str, crud: ReservationCRUD = Depends(get_reservations)):
+    return MongoJSONResponse(await crud.confirm(reservation_id))
+
+
+@router.delete("/reservations/{reservation_id}", response_model=ReservationResponseSchema, tags=["Reservations"])
+async def release_reservation(reservation_id: str, crud: ReservationCRUD = Depends(get_reservations)):
+    return MongoJSONResponse(await crud.release(reservation_id))
@@ -2,12 +2,19 @@ from bson import ObjectId
 from pydantic import BaseModel, root_validator, validator
 from typing import Optional
 
+from app.models.authors_model import AuthorName
+
 
 class AuthorCreate(BaseModel):
     name: str
     bio: Optional[str] = None
 
 
+class AuthorUpdate(BaseModel):
+    name: Optional[AuthorName] = None
+    bio: Optional[str] = None
+
+
 class AuthorReferenceResponse(BaseModel):
     id: str
     name: str
@@ -24,6 +31,10 @@ class AuthorResponse(BaseModel):
             values['id'] = str(values['id'])
         return values
 
+    @classmethod
+    def from_mongo(cls, author_data):
+        return cls.model_construct(id=str(author_data['_id']), name=author_data['name'], bio=author_data.get('bio'))
+
     class Config:
         orm_mode = True
 
@@ -1,7 +1,10 @@
-from typing import List, Optional
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, Type
 
+import orjson
 from bson import ObjectId
-from pydantic import BaseModel, root_validator, Field
+from pydantic import BaseModel, root_validator, Field, create_model
 
 from app.schemas.authors_schema import AuthorReferenceResponse
 from app.utils.book_enum import BookTypeEnum
@@ -45,8 +48,73 @@ class UpdateBookSchema(BaseModel):
     weight: Optional[float] = None
     dimensions: Optional[str] = None
 
+    # Applied atomically with $inc; a negative delta fails instead of taking stock below zero
+    stock_delta: Optional[int] = None
+    # Optimistic concurrency: the update only applies if the stored version still matches
+    expected_version: Optional[int] = None
 
-class BookResponseSchema(BaseModel):
+    @root_validator(skip_on_failure=True)
+    def check_stock_update(cls, values):
+        if values.get('stock') is not None and values.get('stock_delta') is not None:
+            raise ValueError("Set either stock or stock_delta, not both")
+        return values
+
+
+UPDATE_CONTROL_FIELDS = ("stock_delta", "expected_version")
+
+
+class RateBookSchema(BaseModel):
+    rating: float = Field(..., ge=0, le=5)
+
+
+class BulkUpdateBookSchema(BaseModel):
+    id: str
+    update: UpdateBookSchema
+
+
+@lru_cache(maxsize=None)
+def _field_defaults(schema: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((name, None if field.is_required() else field.get_default(call_default_factory=True))
+                 for name, field in schema.model_fields.items())
+
+
+class BookReadSchema(BaseModel):
+    # Documents are written through BookModel, so reads trust them instead of re-validating every field
+
+    @classmethod
+    def dict_from_mongo(cls, book_data) -> dict:
+        data = {}
+        for name, default in _field_defaults(cls):
+            if name == 'id':
+                data['id'] = str(book_data['_id'])
+            elif name == 'author_ids':
+                data['author_ids'] = [
+                    {'id': str(author['_id']) if '_id' in author else author['id'], 'name': author['name']}
+                    for author in book_data.get('author_ids', [])
+                ]
+            else:
+                data[name] = book_data.get(name, default)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if 'author_ids' in data:
+            data = {**data, 'author_ids': [AuthorReferenceResponse.model_construct(**author) for author in data['author_ids']]}
+        return cls.model_construct(**data)
+
+    @classmethod
+    def from_mongo(cls, book_data):
+        return cls.from_dict(cls.dict_from_mongo(book_data))
+
+    @classmethod
+    def json_from_mongo(cls, book_data) -> bytes:
+        return orjson.dumps(cls.dict_from_mongo(book_data))
+
+    class Config:
+        orm_mode = True
+
+
+class BookResponseSchema(BookReadSchema):
     id: str
     title: str
     author_ids: List[AuthorReferenceResponse]
@@ -55,7 +123,9 @@ class BookResponseSchema(BaseModel):
     price: float
     stock: int
     average_rating: float
+    rating_count: int = 0
     version: int
+    updated_at: Optional[datetime] = None
 
     file_format: Optional[str] = None
     file_size: Optional[float] = None
@@ -66,22 +136,44 @@ class BookResponseSchema(BaseModel):
     weight: Optional[float] = None
     dimensions: Optional[str] = None
 
-    @classmethod
-    def from_mongo(cls, book_data):
-        book_data['id'] = str(book_data['_id'])
-        book_data['author_ids'] = [
-            AuthorReferenceResponse(
-                id=str(author['_id']) if '_id' in author else author['id'],
-                name=author['name']
-            )
-            for author in book_data.get('author_ids', [])
-        ]
-        return cls(**book_data)
 
-    class Config:
-        orm_mode = True
+BOOK_RESPONSE_FIELDS = tuple(BookResponseSchema.model_fields)
+
+
+def parse_book_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(BOOK_RESPONSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    # Canonical order keeps the schema cache small regardless of how the client orders fields
+    return tuple(field for field in BOOK_RESPONSE_FIELDS if field in requested or field == "id")
+
+
+def book_projection(fields: Optional[Tuple[str, ...]]) -> Optional[dict]:
+    if not fields:
+        return None
+    return {field: 1 for field in fields if field != "id"}
+
+
+@lru_cache(maxsize=256)
+def partial_book_schema(fields: Tuple[str, ...]) -> Type[BookReadSchema]:
+    definitions = {field: (BookResponseSchema.model_fields[field].annotation, BookResponseSchema.model_fields[field])
+                   for field in fields}
+    return create_model("PartialBookResponseSchema", __base__=BookReadSchema, **definitions)
+
+
+def read_schema(fields: Optional[Tuple[str, ...]]) -> Type[BookReadSchema]:
+    return partial_book_schema(fields) if fields else BookResponseSchema
 
 
 class ListBooksSchema(BaseModel):
     books: List[BookResponseSchema]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
+class BookSearchSchema(BaseModel):
+    books: List[BookResponseSchema]
+    next_skip: Optional[int] = None
@@ -0,0 +1,16 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+
+class BulkResultSchema(BaseModel):
+    succeeded: int = 0
+    failed: int = 0
+    results: List[BulkItemResult] = []
@@ -0,0 +1,10 @@
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class BookFacetsSchema(BaseModel):
+    genre: Dict[str, int] = {}
+    book_type: Dict[str, int] = {}
+    price: Dict[str, int] = {}
+    rating: Dict[str, int] = {}
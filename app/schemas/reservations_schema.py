@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.utils.book_enum import ReservationStatus
+
+MAX_HOLD_SECONDS = 7 * 24 * 3600
+
+
+class ReservationItemSchema(BaseModel):
+    book_id: str
+    quantity: int = Field(1, gt=0)
+
+
+class CreateReservationSchema(BaseModel):
+    items: List[ReservationItemSchema] = Field(..., min_length=1, max_length=100)
+    # Seconds to hold the stock before it returns automatically; 0 takes it for good (no confirmation step).
+    # Defaults to RESERVATION_HOLD_SECONDS.
+    hold_seconds: Optional[int] = Field(None, ge=0, le=MAX_HOLD_SECONDS)
+
+
+class ReservationResponseSchema(BaseModel):
+    id: str
+    status: ReservationStatus
+    items: List[ReservationItemSchema]
+    created_at: datetime
+    expires_at: Optional[datetime] = None
+
+    @classmethod
+    def from_mongo(cls, hold: dict):
+        return cls.model_construct(
+            id=str(hold["_id"]),
+            status=hold["status"],
+            items=[ReservationItemSchema.model_construct(book_id=str(item["book_id"]), quantity=item["quantity"])
+                   for item in hold["items"]],
+            created_at=hold["created_at"],
+            expires_at=hold.get("expires_at"),
+        )
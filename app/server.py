@@ -0,0 +1,39 @@
+"""
+Production entry point: N uvicorn worker processes sharing one listening socket.
+
+    python -m app.server --workers 4 --host 0.0.0.0 --port 8000
+
+Each worker imports the app itself and creates its own MongoDB client in the lifespan handler. With gunicorn,
+use `gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w 4` without --preload, and export
+WEB_CONCURRENCY so the pool budget is split the same way.
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action="store_true", help="Log every request (costs throughput)")
+    args = parser.parse_args()
+
+    # Workers are spawned, not forked, and read this in load_config to size their connection pools
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        proxy_headers=True,
+        access_log=args.access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
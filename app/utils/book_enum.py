@@ -17,3 +17,27 @@ class Genre(str, Enum):
     THRILLER = "Thriller"
     ROMANCE = "Romance"
     OTHER = "Other"
+
+
+class BookSortEnum(str, Enum):
+    ID = 'id'
+    PRICE = 'price'
+    TITLE = 'title'
+    RATING = 'rating'
+
+
+class SortOrder(str, Enum):
+    ASC = 'asc'
+    DESC = 'desc'
+
+
+class GenreMatch(str, Enum):
+    ANY = 'any'
+    ALL = 'all'
+
+
+class ReservationStatus(str, Enum):
+    HELD = 'held'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
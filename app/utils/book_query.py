@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.utils.book_enum import BookSortEnum, BookTypeEnum, Genre, GenreMatch, SortOrder
+from app.utils.pagination import SORT_FIELDS, cursor_key, decode_cursor, keyset_filter, sort_spec
+
+
+def _range(query: dict, field_name: str, low: Optional[float], high: Optional[float]):
+    bounds = {}
+    if low is not None:
+        bounds["$gte"] = low
+    if high is not None:
+        bounds["$lte"] = high
+    if bounds:
+        query[field_name] = bounds
+
+
+@dataclass(frozen=True)
+class BookFilter:
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+    book_types: Tuple[BookTypeEnum, ...] = ()
+    genres: Tuple[Genre, ...] = ()
+    # any: books in at least one of the genres; all: books in every one of them
+    genre_match: GenreMatch = GenreMatch.ANY
+    in_stock: bool = False
+    author_id: Optional[ObjectId] = None
+
+    def to_query(self) -> dict:
+        # Equality conditions first, then ranges, in the order the ESR indexes list their keys
+        query = {}
+        if self.book_types:
+            types = [book_type.value for book_type in self.book_types]
+            query["book_type"] = types[0] if len(types) == 1 else {"$in": types}
+        if self.genres:
+            genres = [genre.value for genre in self.genres]
+            if len(genres) == 1:
+                # genre is an array: equality matches books that list it among others
+                query["genre"] = genres[0]
+            else:
+                query["genre"] = {"$all" if self.genre_match == GenreMatch.ALL else "$in": genres}
+        if self.author_id is not None:
+            query["author_ids._id"] = self.author_id
+        _range(query, "price", self.min_price, self.max_price)
+        _range(query, "average_rating", self.min_rating, self.max_rating)
+        if self.in_stock:
+            query["stock"] = {"$gt": 0}
+        return query
+
+
+@dataclass(frozen=True)
+class BookQuery:
+    """
+    A filtered, sorted catalog read. Compiles to a single find whose sort always ends in _id, so keyset cursors
+    continue exactly where the previous page stopped. `limit=None` reads every match (legacy list endpoints).
+    """
+    filter: BookFilter = field(default_factory=BookFilter)
+    sort_by: BookSortEnum = BookSortEnum.ID
+    order: SortOrder = SortOrder.ASC
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    # Lets MongoDB spill a sort no index covers to disk instead of failing past its memory limit
+    allow_disk_use: bool = False
+
+    @property
+    def direction(self) -> int:
+        return 1 if self.order == SortOrder.ASC else -1
+
+    @property
+    def sort_field(self) -> str:
+        return SORT_FIELDS[self.sort_by.value]
+
+    def compile(self) -> Tuple[dict, List[Tuple[str, int]]]:
+        """Return (filter, sort); raises ValueError for a cursor that is malformed or was issued for another sort."""
+        query = self.filter.to_query()
+        if self.cursor:
+            issued_for, value, last_id = decode_cursor(self.cursor)
+            if issued_for != cursor_key(self.sort_by.value, self.direction):
+                raise ValueError(f"Cursor was issued for sort_by={issued_for}")
+            # The filter never uses $or, so the keyset condition can sit next to it
+            query.update(keyset_filter(self.sort_by.value, value, last_id, self.direction))
+        return query, sort_spec(self.sort_by.value, self.direction)
+
+
+def example_book_queries() -> Dict[str, BookQuery]:
+    """Representative /books/query/ shapes, for index checks and benchmarks."""
+    return {
+        "price_range[price]": BookQuery(BookFilter(min_price=10, max_price=20), BookSortEnum.PRICE, limit=20),
+        "genre_any[price]": BookQuery(BookFilter(genres=(Genre.FICTION, Genre.MYSTERY)), BookSortEnum.PRICE, limit=20),
+        "genre_all_price_range[price]": BookQuery(
+            BookFilter(min_price=10, max_price=60, genres=(Genre.FICTION, Genre.MYSTERY), genre_match=GenreMatch.ALL),
+            BookSortEnum.PRICE, limit=20),
+        "rating_range[-rating]": BookQuery(BookFilter(min_rating=4), BookSortEnum.RATING, SortOrder.DESC, limit=20),
+        "type_genre_rating[rating]": BookQuery(
+            BookFilter(min_rating=3, max_rating=5, book_types=(BookTypeEnum.EBOOK,), genres=(Genre.FICTION,)),
+            BookSortEnum.RATING, limit=20),
+        "in_stock_price_range[price]": BookQuery(BookFilter(min_price=5, max_price=50, in_stock=True),
+                                                 BookSortEnum.PRICE, limit=20),
+        "author[id]": BookQuery(BookFilter(author_id=ObjectId()), limit=20),
+        "title[title]": BookQuery(BookFilter(), BookSortEnum.TITLE, limit=20),
+    }
@@ -0,0 +1,86 @@
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.schemas.bulk_schema import BulkItemResult, BulkResultSchema
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+
+def add_result(report: BulkResultSchema, index: int, status: str, id: str = None, error: str = None):
+    report.results.append(BulkItemResult(index=index, id=id, status=status, error=error))
+    if error is None:
+        report.succeeded += 1
+    else:
+        report.failed += 1
+
+
+async def insert_chunk(collection: AsyncIOMotorCollection, items: List[Tuple[int, Any]],
+                       build_document: Callable[[Any], dict], report: BulkResultSchema) -> List[dict]:
+    documents, indexes = [], []
+    for index, item in items:
+        try:
+            document = build_document(item)
+        except ValidationError as e:
+            add_result(report, index, "error", error=validation_message(e))
+            continue
+        except (TypeError, ValueError) as e:
+            add_result(report, index, "error", error=str(e))
+            continue
+        # Assign ids up front so every item can be reported even when the batch partially fails
+        document["_id"] = ObjectId()
+        documents.append(document)
+        indexes.append(index)
+    if not documents:
+        return []
+
+    write_errors: Dict[int, str] = {}
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        write_errors = {err["index"]: err["errmsg"] for err in e.details.get("writeErrors", [])}
+    inserted = []
+    for position, (index, document) in enumerate(zip(indexes, documents)):
+        if position in write_errors:
+            add_result(report, index, "error", error=write_errors[position])
+        else:
+            add_result(report, index, "created", id=str(document["_id"]))
+            inserted.append(document)
+    return inserted
+
+
+async def iter_chunks(items: List[Any], chunk_size: int) -> AsyncIterator[List[Tuple[int, Any]]]:
+    for start in range(0, len(items), chunk_size):
+        yield list(enumerate(items[start:start + chunk_size], start))
+
+
+async def iter_ndjson_chunks(stream: AsyncIterator[bytes], chunk_size: int,
+                             report: BulkResultSchema) -> AsyncIterator[List[Tuple[int, Any]]]:
+    chunk, index, pending = [], 0, b""
+    async for data in stream:
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                chunk.append((index, json.loads(line)))
+            except ValueError as e:
+                add_result(report, index, "error", error=f"Invalid JSON: {e}")
+            index += 1
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if pending.strip():
+        try:
+            chunk.append((index, json.loads(pending)))
+        except ValueError as e:
+            add_result(report, index, "error", error=f"Invalid JSON: {e}")
+    if chunk:
+        yield chunk
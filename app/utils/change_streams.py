@@ -0,0 +1,233 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+
+from bson import Timestamp
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+
+from app.utils.logger import logger
+
+# ChangeStreamHistoryLost / ChangeStreamFatalError: the resume token fell off the oplog
+HISTORY_LOST_CODES = (280, 286)
+
+# Only what the subscribers read; full documents can be large
+EVENT_PROJECTION = {
+    "operationType": 1, "ns": 1, "documentKey": 1, "clusterTime": 1, "updateDescription.updatedFields": 1,
+    "fullDocument._id": 1, "fullDocument.title": 1, "fullDocument.author_ids": 1, "fullDocument.title_terms": 1,
+    "fullDocument.author_terms": 1, "fullDocument.name": 1,
+}
+
+
+class ChangeHistoryLost(Exception):
+    pass
+
+
+class MongoChangeStreamSource:
+    """Database-level change stream over the given collections. Needs a replica set (a single-node one will do)."""
+
+    def __init__(self, database: AsyncIOMotorDatabase, collections: Sequence[str], max_await_ms: int = 200):
+        self.database = database
+        self.collections = list(collections)
+        self.max_await_ms = max_await_ms
+
+    async def events(self, resume_after: Any) -> AsyncIterator[Tuple[Optional[dict], Any]]:
+        """Yield (event, resume token); the event is None when nothing arrived within max_await_ms."""
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collections}}}, {"$project": EVENT_PROJECTION}]
+        try:
+            async with self.database.watch(pipeline, full_document="updateLookup", resume_after=resume_after,
+                                           max_await_time_ms=self.max_await_ms) as stream:
+                while stream.alive:
+                    event = await stream.try_next()
+                    yield event, stream.resume_token
+        except OperationFailure as e:
+            if e.code in HISTORY_LOST_CODES:
+                raise ChangeHistoryLost(str(e)) from e
+            raise
+
+
+class InProcessChangeSource:
+    """
+    Stand-in for a change stream when there is no replica set (local runs, scripts simulating another writer):
+    events passed to publish() are delivered in order, with the log position as resume token.
+    """
+
+    def __init__(self, history: int = 10000, max_await_ms: int = 200):
+        self.max_await_ms = max_await_ms
+        self._log: deque = deque(maxlen=history)
+        self._next_token = 1
+        self._published = asyncio.Event()
+
+    def publish(self, operation_type: str, collection: str, document_id: Any, full_document: Optional[dict] = None,
+                updated_fields: Optional[dict] = None):
+        event = {
+            "_id": self._next_token,
+            "operationType": operation_type,
+            "ns": {"coll": collection},
+            "documentKey": {"_id": document_id},
+            "clusterTime": Timestamp(int(time.time()), self._next_token % 2 ** 31),
+        }
+        if full_document is not None:
+            event["fullDocument"] = full_document
+        if updated_fields is not None:
+            event["updateDescription"] = {"updatedFields": updated_fields}
+        self._log.append(event)
+        self._next_token += 1
+        self._published.set()
+
+    async def events(self, resume_after: Any) -> AsyncIterator[Tuple[Optional[dict], Any]]:
+        # Like a change stream without a token, start from now
+        position = resume_after if resume_after is not None else self._next_token - 1
+        while True:
+            if self._log and position + 1 < self._log[0]["_id"]:
+                raise ChangeHistoryLost(f"Token {position} is older than the retained history")
+            pending = [event for event in self._log if event["_id"] > position]
+            for event in pending:
+                position = event["_id"]
+                yield event, position
+            if not pending:
+                self._published.clear()
+                try:
+                    await asyncio.wait_for(self._published.wait(), self.max_await_ms / 1000)
+                except asyncio.TimeoutError:
+                    yield None, position
+
+
+class ResumeTokenStore:
+    def __init__(self, collection: AsyncIOMotorCollection, name: str):
+        self.collection = collection
+        self.name = name
+
+    async def load(self) -> Any:
+        document = await self.collection.find_one({"_id": self.name})
+        return document.get("token") if document else None
+
+    async def save(self, token: Any):
+        await self.collection.update_one({"_id": self.name},
+                                         {"$set": {"token": token, "updated_at": datetime.now(timezone.utc)}}, upsert=True)
+
+
+class ChangeSubscriber:
+    async def handle(self, events: List[dict]):
+        raise NotImplementedError
+
+    async def idle(self):
+        """Called when the stream has no pending events."""
+
+    async def resync(self):
+        """Called after events were lost (the resume token expired); reconcile from the collections."""
+
+
+class ChangeStreamConsumer:
+    """
+    Reads change events in batches (up to `batch_size`, or whatever arrived within `batch_interval_ms`) and hands
+    each batch to every subscriber. The resume token is saved after a batch is handled, so events are delivered
+    at least once and subscribers must be idempotent. Every worker process runs its own consumer; they may share
+    the saved token, since resuming from any recent point is safe for idempotent subscribers.
+    """
+
+    def __init__(self, source, token_store: ResumeTokenStore, batch_size: int = 500, batch_interval_ms: int = 200,
+                 retry_delay: float = 1.0, token_save_interval: float = 10.0):
+        self.source = source
+        self.token_store = token_store
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval_ms / 1000
+        self.retry_delay = retry_delay
+        self.token_save_interval = token_save_interval
+        self.subscribers: List[ChangeSubscriber] = []
+        self.events = 0
+        self.batches = 0
+        self.errors = 0
+        self.subscriber_errors = 0
+        self.resyncs = 0
+        self.lag_seconds = 0.0
+        self.running = False
+
+    def subscribe(self, subscriber: ChangeSubscriber):
+        self.subscribers.append(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "events": self.events,
+            "batches": self.batches,
+            "errors": self.errors,
+            "subscriber_errors": self.subscriber_errors,
+            "resyncs": self.resyncs,
+            "lag_seconds": self.lag_seconds,
+        }
+
+    async def run(self):
+        self.running = True
+        delay = self.retry_delay
+        try:
+            token = await self.token_store.load()
+            while True:
+                try:
+                    async for token in self._consume(token):
+                        delay = self.retry_delay
+                except ChangeHistoryLost as e:
+                    logger.warning("Change stream history lost, resyncing subscribers: %s", e)
+                    self.resyncs += 1
+                    token = None
+                    await self.token_store.save(None)
+                    for subscriber in self.subscribers:
+                        await self._call(subscriber.resync())
+                except Exception as e:
+                    self.errors += 1
+                    logger.error("Change stream failed, resuming in %.1fs: %s", delay, e)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+        finally:
+            self.running = False
+
+    async def _consume(self, token: Any) -> AsyncIterator[Any]:
+        """Yield the resume token after each handled batch."""
+        loop = asyncio.get_running_loop()
+        batch, deadline = [], None
+        saved_token, saved_at = token, loop.time()
+        async for event, current_token in self.source.events(token):
+            if event is not None:
+                batch.append(event)
+                deadline = deadline or loop.time() + self.batch_interval
+            if batch and (event is None or len(batch) >= self.batch_size or loop.time() >= deadline):
+                await self._dispatch(batch)
+                token = batch[-1]["_id"]
+                await self.token_store.save(token)
+                saved_token, saved_at = token, loop.time()
+                batch, deadline = [], None
+                yield token
+            elif event is None:
+                for subscriber in self.subscribers:
+                    await self._call(subscriber.idle())
+                # An idle stream still advances its token; keep it fresh so it doesn't fall off the oplog
+                if current_token != saved_token and loop.time() - saved_at >= self.token_save_interval:
+                    await self.token_store.save(current_token)
+                    saved_token, saved_at = current_token, loop.time()
+                    yield current_token
+
+    async def _dispatch(self, batch: List[dict]):
+        for subscriber in self.subscribers:
+            await self._call(subscriber.handle(batch))
+        self.events += len(batch)
+        self.batches += 1
+        cluster_time = batch[-1].get("clusterTime")
+        if cluster_time is not None:
+            self.lag_seconds = max(0.0, time.time() - cluster_time.time)
+
+    async def _call(self, awaitable):
+        # One failing subscriber must not stop the others or the stream; it can catch up on resync
+        try:
+            await awaitable
+        except Exception as e:
+            self.subscriber_errors += 1
+            logger.error("Change subscriber failed: %s", e)
+
+
+def create_change_consumer(source, token_store: ResumeTokenStore, batch_size: int,
+                           batch_interval_ms: int) -> Optional[ChangeStreamConsumer]:
+    if source is None:
+        return None
+    return ChangeStreamConsumer(source, token_store, batch_size, batch_interval_ms)
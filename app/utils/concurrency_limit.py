@@ -0,0 +1,149 @@
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.utils.http_cache import parse_route_policies
+
+
+class ConcurrencyLimiter:
+    """
+    Caps requests in flight in this worker. Past the cap, up to `queue_size` requests wait in arrival order
+    for at most `queue_timeout` seconds; the rest, and those that time out, are turned away.
+    """
+
+    def __init__(self, limit: int, queue_size: int = 0, queue_timeout: float = 0.0):
+        self.limit = float(limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self) -> bool:
+        if self._has_slot() and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            # asyncio.wait leaves the waiter alone on timeout, so a slot granted at the last moment is not lost
+            await asyncio.wait([waiter], timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        if waiter.done():
+            return True
+        self._abandon(waiter)
+        self.timed_out += 1
+        return False
+
+    def release(self, latency: Optional[float] = None):
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _observe(self, latency: float):
+        pass
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            # Granted a slot it will not use
+            self.release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _wake(self):
+        while self._waiters and self._has_slot():
+            self.in_flight += 1
+            self._waiters.popleft().set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdaptiveConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    A concurrency limit that follows latency (a gradient limiter): a slow-moving average of request latency
+    is the baseline, and while recent requests run slower than `tolerance` times it, the limit shrinks
+    towards the concurrency the backend sustains; while they keep up, it grows by about sqrt(limit).
+    Requests here are dominated by MongoDB round trips and pool checkouts, so this backs off when MongoDB
+    or the pool slows down, before requests pile up in the pool's wait queue.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, queue_size: int = 0,
+                 queue_timeout: float = 0.0, tolerance: float = 2.0, smoothing: float = 0.2,
+                 long_window: int = 600, short_window: int = 10):
+        super().__init__(initial_limit, queue_size, queue_timeout)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.short_window = short_window
+        self.long_latency: Optional[float] = None
+        self.short_latency: Optional[float] = None
+
+    def _observe(self, latency: float):
+        if self.long_latency is None:
+            self.long_latency = self.short_latency = latency
+            return
+        self.short_latency += (latency - self.short_latency) / self.short_window
+        self.long_latency += (self.short_latency - self.long_latency) / self.long_window
+        if self.long_latency > 2 * self.short_latency:
+            # Latency dropped for good (e.g. after an index build); let the baseline catch up quickly
+            self.long_latency *= 0.95
+        # An idle worker tells nothing about what more concurrency would cost
+        if self.in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / max(self.short_latency, 1e-6)))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "long_latency_ms": round((self.long_latency or 0.0) * 1000, 3),
+            "short_latency_ms": round((self.short_latency or 0.0) * 1000, 3),
+        }
+
+
+def create_concurrency_limiter(settings: dict) -> Optional[ConcurrencyLimiter]:
+    if not settings.get("enabled"):
+        return None
+    queue_size, queue_timeout = settings["queue_size"], settings["queue_timeout_ms"] / 1000
+    if not settings.get("adaptive"):
+        return ConcurrencyLimiter(settings["max_limit"], queue_size, queue_timeout)
+    return AdaptiveConcurrencyLimiter(settings["initial_limit"], settings["min_limit"], settings["max_limit"],
+                                      queue_size, queue_timeout, settings["tolerance"])
+
+
+def create_route_limiters(caps: Optional[str], queue_size: int,
+                          queue_timeout_ms: int) -> Dict[str, ConcurrencyLimiter]:
+    """Fixed caps from `route=limit` pairs separated by `;`, keyed by route name."""
+    return {route: ConcurrencyLimiter(int(limit), queue_size, queue_timeout_ms / 1000)
+            for route, limit in parse_route_policies(caps).items()}
@@ -0,0 +1,76 @@
+from collections import Counter
+from enum import Enum
+from typing import Iterable, List, Optional, Tuple
+
+# (lower bound, label); a value falls in the last band whose lower bound it reaches
+PRICE_BANDS = [(0, "0-10"), (10, "10-20"), (20, "20-50"), (50, "50-100"), (100, "100+")]
+RATING_BANDS = [(0, "0-1"), (1, "1-2"), (2, "2-3"), (3, "3-4"), (4, "4-5")]
+OTHER_BAND = "other"
+
+FACET_FIELDS = ("genre", "book_type", "price", "average_rating")
+FACET_PROJECTION = {field: 1 for field in FACET_FIELDS}
+
+
+def _value(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def band_label(bands: List[Tuple[float, str]], value) -> str:
+    if not isinstance(value, (int, float)) or value < bands[0][0]:
+        return OTHER_BAND
+    label = bands[0][1]
+    for lower, band in bands:
+        if value >= lower:
+            label = band
+    return label
+
+
+def facet_values(book: dict) -> List[Tuple[str, str]]:
+    values = [("genre", genre) for genre in sorted({_value(genre) for genre in book.get("genre") or []})]
+    if book.get("book_type") is not None:
+        values.append(("book_type", _value(book["book_type"])))
+    values.append(("price", band_label(PRICE_BANDS, book.get("price"))))
+    values.append(("rating", band_label(RATING_BANDS, book.get("average_rating"))))
+    return values
+
+
+def facet_deltas(changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> Counter:
+    """Net count change per (facet, value) for a batch of (before, after) documents; None means absent."""
+    deltas = Counter()
+    for before, after in changes:
+        if before is not None:
+            deltas.subtract(facet_values(before))
+        if after is not None:
+            deltas.update(facet_values(after))
+    return Counter({key: delta for key, delta in deltas.items() if delta})
+
+
+def _bucket_stage(field: str, bands: List[Tuple[float, str]]) -> dict:
+    return {"$bucket": {"groupBy": f"${field}", "boundaries": [lower for lower, _ in bands] + [float("inf")],
+                        "default": OTHER_BAND}}
+
+
+def facet_pipeline() -> List[dict]:
+    return [{"$facet": {
+        "genre": [
+            # A genre listed twice on one book still counts that book once
+            {"$project": {"genre": {"$setUnion": [{"$ifNull": ["$genre", []]}, []]}}},
+            {"$unwind": "$genre"},
+            {"$group": {"_id": "$genre", "count": {"$sum": 1}}},
+        ],
+        "book_type": [{"$match": {"book_type": {"$ne": None}}}, {"$group": {"_id": "$book_type", "count": {"$sum": 1}}}],
+        "price": [_bucket_stage("price", PRICE_BANDS)],
+        "rating": [_bucket_stage("average_rating", RATING_BANDS)],
+    }}]
+
+
+def facet_counts_from_aggregation(result: dict) -> Counter:
+    labels = {"price": dict(PRICE_BANDS), "rating": dict(RATING_BANDS)}
+    counts = Counter()
+    for facet, buckets in result.items():
+        for bucket in buckets:
+            value = bucket["_id"]
+            if facet in labels:
+                value = labels[facet].get(value, OTHER_BAND)
+            counts[(facet, value)] += bucket["count"]
+    return counts
@@ -0,0 +1,96 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.utils.responses import MongoJSONResponse
+
+
+def parse_route_policies(value: Optional[str]) -> Dict[str, str]:
+    """Parse `route=policy` pairs separated by `;`, e.g. `get_book=public, max-age=60;list_books=no-store`."""
+    policies = {}
+    for item in (value or "").split(";"):
+        route, separator, policy = item.partition("=")
+        if separator and route.strip():
+            policies[route.strip()] = policy.strip()
+    return policies
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def book_validators(book_id: Any, version: Optional[int], updated_at: Any) -> Tuple[str, Optional[datetime]]:
+    """ETag from id + version (bumped by every write), Last-Modified from updated_at when the document has one."""
+    if isinstance(updated_at, str):
+        # Cache backends keep the JSON form
+        updated_at = datetime.fromisoformat(updated_at)
+    if updated_at is not None and updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return f'"{book_id}-{version}"', updated_at
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+class HttpCache:
+    """Validators and Cache-Control for GET routes. Policies are looked up by route name (the endpoint function)."""
+
+    def __init__(self, default_policy: Optional[str] = "no-cache", route_policies: Optional[Dict[str, str]] = None):
+        self.default_policy = default_policy
+        self.route_policies = route_policies or {}
+
+    def cache_control(self, request: Request) -> Optional[str]:
+        route = request.scope.get("route")
+        return self.route_policies.get(getattr(route, "name", None), self.default_policy) or None
+
+    @staticmethod
+    def has_preconditions(request: Request) -> bool:
+        return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+    @staticmethod
+    def is_fresh(request: Request, etag: Optional[str], last_modified: Optional[datetime] = None) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag is not None and _etag_matches(if_none_match, etag)
+        if_modified_since = request.headers.get("if-modified-since")
+        if not if_modified_since or last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    def _headers(self, request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> dict:
+        headers = {}
+        if etag:
+            headers["etag"] = etag
+        if last_modified:
+            headers["last-modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+        cache_control = self.cache_control(request)
+        if cache_control:
+            headers["cache-control"] = cache_control
+        return headers
+
+    def not_modified(self, request: Request, etag: Optional[str], last_modified: Optional[datetime] = None) -> Response:
+        return Response(status_code=304, headers=self._headers(request, etag, last_modified))
+
+    def respond(self, request: Request, content: Any, etag: Optional[str] = None,
+                last_modified: Optional[datetime] = None) -> Response:
+        """Render content; without an explicit ETag one is derived from the body, which still saves the transfer."""
+        response = MongoJSONResponse(content)
+        etag = etag or content_etag(response.body)
+        if self.is_fresh(request, etag, last_modified):
+            return self.not_modified(request, etag, last_modified)
+        response.headers.update(self._headers(request, etag, last_modified))
+        return response
@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel
+
+from app.utils.book_enum import BookSortEnum, BookTypeEnum, Genre
+from app.utils.book_query import BookFilter, BookQuery, example_book_queries
+from app.utils.logger import logger
+from app.utils.pagination import keyset_filter, sort_spec
+from app.utils.search import prefix_query
+
+# Options that make two indexes on the same keys behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights")
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    name: str
+    keys: List[Tuple[str, Any]]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def to_index_model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, **self.options)
+
+    @property
+    def is_text(self) -> bool:
+        return any(direction == "text" for _, direction in self.keys)
+
+    def diff(self, existing: dict) -> Optional[str]:
+        existing_keys = list(existing["key"].items())
+        if self.is_text:
+            # Text indexes are stored as _fts/_ftsx keys; the indexed fields show up in weights instead
+            if "_fts" not in existing["key"]:
+                return f"keys {existing_keys} are not a text index"
+        elif existing_keys != [tuple(k) for k in self.keys]:
+            return f"keys {existing_keys} != {self.keys}"
+        for option in COMPARED_OPTIONS:
+            if option == "weights" and "weights" not in self.options:
+                continue
+            if existing.get(option, False) != self.options.get(option, False):
+                return f"{option}={existing.get(option)} != {self.options.get(option)}"
+        return None
+
+
+# Equality first, then sort, then range (ESR); _id is appended where a keyset sort needs a total order
+BOOK_INDEXES = [
+    IndexSpec("title_1__id_1", [("title", 1), ("_id", 1)]),
+    IndexSpec("price_1__id_1", [("price", 1), ("_id", 1)]),
+    IndexSpec("average_rating_1__id_1", [("average_rating", 1), ("_id", 1)]),
+    IndexSpec("book_type_1_genre_1_average_rating_1__id_1",
+              [("book_type", 1), ("genre", 1), ("average_rating", 1), ("_id", 1)]),
+    # Genre browsing sorted by price; $in over several genres merges one sorted range per genre
+    IndexSpec("genre_1_price_1__id_1", [("genre", 1), ("price", 1), ("_id", 1)]),
+    # GET /books/search/: ranked full-text search, and anchored prefix scans over lowercased word terms
+    IndexSpec("search_text", [("title", "text"), ("author_ids.name", "text")],
+              {"weights": {"title": 10, "author_ids.name": 3}}),
+    # Startup cache warm-up reads the most-rated books
+    IndexSpec("rating_count_-1", [("rating_count", -1)]),
+    # Author rename fan-out
+    IndexSpec("author_ids._id_1", [("author_ids._id", 1)]),
+    IndexSpec("title_terms_1", [("title_terms", 1)]),
+    IndexSpec("author_terms_1", [("author_terms", 1)]),
+]
+
+AUTHOR_INDEXES = [
+    IndexSpec("name_1", [("name", 1)]),
+]
+
+HOLD_INDEXES = [
+    # Finished holds are deleted once purge_at passes; held ones get purge_at well after expires_at,
+    # so the reaper returns their stock first
+    IndexSpec("purge_at_ttl", [("purge_at", 1)], {"expireAfterSeconds": 0}),
+    IndexSpec("status_1_expires_at_1", [("status", 1), ("expires_at", 1)]),
+]
+
+INDEX_REGISTRY = {
+    "books": BOOK_INDEXES,
+    "authors": AUTHOR_INDEXES,
+    "book_holds": HOLD_INDEXES,
+}
+
+
+@dataclass
+class IndexReport:
+    collection: str
+    created: List[str] = field(default_factory=list)
+    mismatched: Dict[str, str] = field(default_factory=dict)
+    unknown: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatched and self.error is None
+
+
+async def reconcile_indexes(collection: AsyncIOMotorCollection, specs: List[IndexSpec]) -> IndexReport:
+    report = IndexReport(collection=collection.name)
+    try:
+        existing = {index["name"]: index async for index in collection.list_indexes()}
+        by_keys = {tuple(index["key"].items()): name for name, index in existing.items()}
+        missing = []
+        for spec in specs:
+            if spec.name in existing:
+                reason = spec.diff(existing[spec.name])
+                if reason:
+                    report.mismatched[spec.name] = reason
+            elif tuple(tuple(k) for k in spec.keys) in by_keys:
+                # Same keys under another name: creating it would fail with IndexOptionsConflict
+                report.mismatched[spec.name] = f"exists as {by_keys[tuple(tuple(k) for k in spec.keys)]}"
+            else:
+                missing.append(spec)
+
+        known = {spec.name for spec in specs} | {"_id_"}
+        report.unknown = [name for name in existing if name not in known]
+
+        if missing:
+            # Builds do not block reads or writes on MongoDB >= 4.2
+            await collection.create_indexes([spec.to_index_model() for spec in missing])
+            report.created = [spec.name for spec in missing]
+    except Exception as e:
+        report.error = str(e)
+
+    if report.created:
+        logger.info("Created indexes on %s: %s", report.collection, report.created)
+    for name, reason in report.mismatched.items():
+        logger.warning("Index %s on %s does not match the registry: %s", name, report.collection, reason)
+    if report.unknown:
+        logger.warning("Indexes on %s not in the registry: %s", report.collection, report.unknown)
+    if report.error:
+        logger.error("Failed to reconcile indexes on %s: %s", report.collection, report.error)
+    return report
+
+
+async def reconcile_all_indexes(database) -> Dict[str, IndexReport]:
+    return {name: await reconcile_indexes(database[name], specs) for name, specs in INDEX_REGISTRY.items()}
+
+
+def book_query_shapes() -> Dict[str, Tuple[dict, Optional[List[Tuple[str, int]]]]]:
+    """Every (filter, sort) shape BookCRUD sends to the books collection."""
+    oid = ObjectId()
+    return {
+        "get_book": ({"_id": oid}, None),
+        "get_book_by_title": ({"title": "title"}, None),
+        "list_books": ({}, [("_id", 1)]),
+        "list_books_page[id]": (keyset_filter("id", None, oid), sort_spec("id")),
+        "list_books_page[price]": (keyset_filter("price", 10.0, oid), sort_spec("price")),
+        "list_books_page[title]": (keyset_filter("title", "title", oid), sort_spec("title")),
+        "list_books_page[rating]": (keyset_filter("rating", 4.0, oid), sort_spec("rating")),
+        # The legacy list endpoints delegate to BookCRUD.query_books
+        "get_books_by_book_type_genre_rating": BookQuery(
+            BookFilter(min_rating=1, max_rating=5, book_types=(BookTypeEnum.EBOOK,), genres=(Genre.FICTION,)),
+            BookSortEnum.RATING).compile(),
+        "get_books_sorted_by_price": BookQuery(sort_by=BookSortEnum.PRICE).compile(),
+        "get_books_by_price_range": BookQuery(BookFilter(min_price=10, max_price=20), BookSortEnum.PRICE).compile(),
+        "search_books[prefix]": (prefix_query("shadow riv"), None),
+        **{f"query_books[{name}]": query.compile() for name, query in example_book_queries().items()},
+    }
+
+
+def find_stages(plan: Any, stage: str) -> int:
+    if isinstance(plan, dict):
+        return (plan.get("stage") == stage) + sum(find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return sum(find_stages(value, stage) for value in plan)
+    return 0
+
+
+async def explain_query_shapes(collection: AsyncIOMotorCollection, shapes: Dict[str, Tuple[dict, Optional[list]]]) -> List[dict]:
+    results = []
+    for name, (query, sort) in shapes.items():
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stats = explain.get("executionStats", {})
+        results.append({
+            "shape": name,
+            "collscan": find_stages(explain.get("queryPlanner", {}).get("winningPlan"), "COLLSCAN") > 0,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "time_ms": stats.get("executionTimeMillis"),
+        })
+    return results
@@ -0,0 +1,32 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError
+
+
+class Lease:
+    """
+    A named lease kept in MongoDB, for periodic jobs that must run in one worker at a time. `acquire` takes
+    the lease when it is free or expired and renews it when this process already holds it; a holder that
+    stops renewing loses it after `ttl` seconds.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, name: str, ttl: float):
+        self.collection = collection
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # The upsert only inserts when no lease exists; a live lease held by another owner fails on _id
+            await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}}, upsert=True)
+            return True
+        except DuplicateKeyError:
+            return False
@@ -1,59 +1,437 @@
+import atexit
 import logging
 import os
-from datetime import datetime
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, List, Optional
+
+import orjson
 
 from app.external_services.aws_s3 import upload_log_to_s3
 
 
+class RingBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items = deque()
+        lock = threading.Lock()
+        self._not_full = threading.Condition(lock)
+        self._not_empty = threading.Condition(lock)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, timeout: float = 0) -> bool:
+        with self._not_full:
+            if len(self._items) >= self.capacity:
+                if timeout <= 0 or not self._not_full.wait_for(
+                        lambda: len(self._items) < self.capacity, timeout):
+                    return False
+            self._items.append(item)
+            self._not_empty.notify()
+            return True
+
+    def drain(self, max_items: int, timeout: float) -> List:
+        with self._not_empty:
+            if not self._items:
+                self._not_empty.wait(timeout)
+            items = []
+            while self._items and len(items) < max_items:
+                items.append(self._items.popleft())
+            if items:
+                self._not_full.notify_all()
+            return items
+
+    def wake(self):
+        with self._not_empty:
+            self._not_empty.notify_all()
+
+
 class S3LoggingHandler(logging.Handler):
-    def __init__(self, log_file_path: str, s3_key: str):
+    """
+    Queue-based handler: emit() only appends the formatted record to an in-memory ring buffer.
+    A background thread writes buffered records to size-capped segment files and ships
+    finished segments to S3 in batches, so no file or network I/O happens on the caller's thread.
+    """
+
+    def __init__(
+            self,
+            segment_dir: str,
+            s3_key: str,
+            capacity: int = 10000,
+            block_timeout: float = 0,
+            max_segment_bytes: int = 5 * 1024 * 1024,
+            max_pending_segments: int = 100,
+            upload_batch_bytes: int = 20 * 1024 * 1024,
+            upload_interval: float = 60,
+            flush_interval: float = 1,
+            uploader: Callable[[str, str], bool] = upload_log_to_s3,
+    ):
         super().__init__()
-        self.log_file_path = log_file_path
+        self.segment_dir = segment_dir
         self.s3_key = s3_key
-        self.is_uploading = False
+        self.block_timeout = block_timeout
+        self.max_segment_bytes = max_segment_bytes
+        self.max_pending_segments = max_pending_segments
+        self.upload_batch_bytes = upload_batch_bytes
+        self.upload_interval = upload_interval
+        self.flush_interval = flush_interval
+        self.uploader = uploader
+
+        self.records_emitted = 0
+        self.records_dropped = 0
+        self.records_written = 0
+        self.segments_rotated = 0
+        self.segments_uploaded = 0
+        self.segments_dropped = 0
+        self.upload_failures = 0
+
+        self._buffer = RingBuffer(capacity)
+        self._segment_file = None
+        self._segment_path: Optional[str] = None
+        self._segment_bytes = 0
+        self._segment_opened_at = 0.0
+        self._segment_seq = 0
+        self._pending: deque = deque()
+        self._last_upload = time.monotonic()
+        self._stop = threading.Event()
+
+        os.makedirs(segment_dir, exist_ok=True)
+        self._recover_segments()
 
-        log_dir = os.path.dirname(log_file_path)
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+        self._worker = threading.Thread(target=self._run, name="s3-log-shipper", daemon=True)
+        self._worker.start()
 
     def emit(self, record):
         try:
             log_entry = self.format(record)
-            with open(self.log_file_path, 'a') as log_file:
-                log_file.write(log_entry + '\n')
+        except Exception:
+            self.handleError(record)
+            return
+        if self._buffer.put(log_entry, self.block_timeout):
+            self.records_emitted += 1
+        else:
+            self.records_dropped += 1
 
-            if not self.is_uploading:
-                self.is_uploading = True
-                self.upload_log()
-                self.is_uploading = False
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "records_emitted": self.records_emitted,
+            "records_dropped": self.records_dropped,
+            "records_written": self.records_written,
+            "segments_rotated": self.segments_rotated,
+            "segments_pending": len(self._pending),
+            "segments_uploaded": self.segments_uploaded,
+            "segments_dropped": self.segments_dropped,
+            "upload_failures": self.upload_failures,
+        }
 
-        except Exception as e:
-            print(f"Failed to log and upload to S3: {e}")
+    def flush(self):
+        self._buffer.wake()
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._buffer.wake()
+            self._worker.join(timeout=30)
+        super().close()
 
-    def upload_log(self):
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._write(self._buffer.drain(1000, self.flush_interval))
+                self._maybe_rotate()
+                self._maybe_upload()
+            except Exception as e:
+                print(f"Failed to ship logs to S3: {e}")
         try:
-            upload_log_to_s3(self.log_file_path, self.s3_key)
+            while len(self._buffer):
+                self._write(self._buffer.drain(1000, 0))
+            self._rotate()
+            self._upload_pending()
         except Exception as e:
-            print(f"Failed to upload log to S3 service: {e}")
+            print(f"Failed to ship logs to S3 on shutdown: {e}")
+
+    def _write(self, entries: List[str]):
+        if not entries:
+            return
+        if self._segment_file is None:
+            self._open_segment()
+        data = "\n".join(entries) + "\n"
+        self._segment_file.write(data)
+        self._segment_file.flush()
+        self._segment_bytes += len(data)
+        self.records_written += len(entries)
+        if self._segment_bytes >= self.max_segment_bytes:
+            self._rotate()
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        name = f"app-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{self._segment_seq:06d}.log"
+        self._segment_path = os.path.join(self.segment_dir, name)
+        # In-progress segments carry a suffix so they are never picked up for upload
+        self._segment_file = open(self._segment_path + ".open", "a")
+        self._segment_bytes = 0
+        self._segment_opened_at = time.monotonic()
+
+    def _maybe_rotate(self):
+        if self._segment_file is not None and time.monotonic() - self._segment_opened_at >= self.upload_interval:
+            self._rotate()
+
+    def _rotate(self):
+        if self._segment_file is None:
+            return
+        self._segment_file.close()
+        os.replace(self._segment_path + ".open", self._segment_path)
+        self._pending.append((self._segment_path, self._segment_bytes))
+        self._segment_file = None
+        self.segments_rotated += 1
+        while len(self._pending) > self.max_pending_segments:
+            path, _ = self._pending.popleft()
+            self._remove(path)
+            self.segments_dropped += 1
+
+    def _maybe_upload(self):
+        pending_bytes = sum(size for _, size in self._pending)
+        if pending_bytes >= self.upload_batch_bytes or (
+                self._pending and time.monotonic() - self._last_upload >= self.upload_interval):
+            self._upload_pending()
+
+    def _upload_pending(self):
+        self._last_upload = time.monotonic()
+        while self._pending:
+            path, size = self._pending[0]
+            if not self.uploader(path, f"{self.s3_key}/{os.path.basename(path)}"):
+                # Keep the segment on disk and retry on the next trigger
+                self.upload_failures += 1
+                return
+            self._pending.popleft()
+            self._remove(path)
+            self.segments_uploaded += 1
+
+    def _recover_segments(self):
+        # Ship segments left behind by processes that are no longer running
+        for name in sorted(os.listdir(self.segment_dir)):
+            path = os.path.join(self.segment_dir, name)
+            if not name.startswith("app-") or self._owner_alive(name):
+                continue
+            if name.endswith(".log.open"):
+                os.replace(path, path[:-len(".open")])
+                path = path[:-len(".open")]
+            elif not name.endswith(".log"):
+                continue
+            self._pending.append((path, os.path.getsize(path)))
+
+    @staticmethod
+    def _owner_alive(name: str) -> bool:
+        try:
+            pid = int(name.split("-")[2])
+        except (IndexError, ValueError):
+            return False
+        if pid == os.getpid():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Failed to remove log segment {path}: {e}")
+
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and goes into the JSON entry
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    # Runs on the caller's thread, where the request's context is still visible
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records below WARNING per logger; the nearest configured ancestor's rate applies.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, candidate = 1.0, name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread as they are: the %-style message is only built there, by the formatter.
+    Arguments are therefore read late and must not be mutated after the call. A full queue drops the record.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_pairs(value: Optional[str]) -> Dict[str, str]:
+    """Parse `name=value` pairs separated by commas, e.g. `app.reads=0.01,pymongo=0.5`."""
+    pairs = {}
+    for item in (value or "").split(","):
+        name, separator, setting = item.partition("=")
+        if separator and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+S3_LOG_KEY = "logs/book_store"
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[LogQueueHandler] = None
+
+
+def setup_logging(level: str = "INFO", levels: Optional[Dict[str, str]] = None,
+                  sampling: Optional[Dict[str, float]] = None, fmt: str = "json", console: bool = True,
+                  queue_size: int = 10000, handlers: Optional[List[logging.Handler]] = None,
+                  segment_dir: str = "logs/segments",
+                  uploader: Callable[[str, str], bool] = upload_log_to_s3) -> LogQueueHandler:
+    """
+    Route every logger through a bounded queue to a listener thread that formats and writes the records,
+    so logging in a request costs a filter check and a queue put. Replaces any previous setup.
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    for handler in list(root.handlers):
+        if isinstance(handler, LogQueueHandler):
+            root.removeHandler(handler)
+
+    if handlers is None:
+        handlers = [S3LoggingHandler(segment_dir=segment_dir, s3_key=S3_LOG_KEY, uploader=uploader)]
+        if console:
+            handlers.append(logging.StreamHandler())
+    formatter = JsonFormatter() if fmt == "json" else \
+        logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sampling or {}))
+    queue_handler.addFilter(RequestIdFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _queue_handler = queue_handler
+    return queue_handler
 
 
-def setup_logger(s3_log_key: str):
-    log_file_path = "logs/app.log"
+def start_logging(uploader: Callable[[str, str], bool] = upload_log_to_s3) -> bool:
+    """
+    setup_logging configured by the LOG_* environment variables, unless logging is already set up.
+    Returns whether it was set up here. Called from each worker's lifespan rather than at import, so that
+    importing the app starts no threads, creates no directories and ships nothing to S3.
+    """
+    if _listener is not None:
+        return False
+    setup_logging(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        levels=parse_pairs(os.getenv("LOG_LEVELS")),
+        sampling={name: float(rate) for name, rate in parse_pairs(os.getenv("LOG_SAMPLING", "app.reads=0.01")).items()},
+        fmt=os.getenv("LOG_FORMAT", "json"),
+        console=os.getenv("LOG_CONSOLE", "true").lower() in ("1", "true", "yes", "on"),
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        segment_dir=os.getenv("LOG_SEGMENT_DIR", "logs/segments"),
+        uploader=uploader,
+    )
+    return True
 
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
 
-    if not any(isinstance(h, S3LoggingHandler) for h in logger.handlers):
-        s3_handler = S3LoggingHandler(log_file_path=log_file_path, s3_key=s3_log_key)
-        s3_handler.setLevel(logging.INFO)
+def log_queue_handler() -> Optional[LogQueueHandler]:
+    return _queue_handler
 
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        s3_handler.setFormatter(formatter)
 
-        logger.addHandler(s3_handler)
+def stop_logging():
+    """Drain the queue and close the handlers (the S3 handler ships its last segment)."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        # Later records fall back to logging's last-resort handler instead of filling a queue nobody reads
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        _queue_handler = None
 
-    return logger
 
+# Fallback for processes that exit without running the lifespan shutdown; by then boto3 may no longer upload
+atexit.register(stop_logging)
 
-S3_LOG_KEY = f"logs/book_store"
-logger = setup_logger(S3_LOG_KEY)
\ No newline at end of file
+logger = logging.getLogger("app")
+# Success logs on read paths; sampled by default (LOG_SAMPLING)
+read_logger = logging.getLogger("app.reads")
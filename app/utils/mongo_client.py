@@ -0,0 +1,43 @@
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def create_mongo_client(settings: dict, event_listeners: Optional[List] = None) -> AsyncIOMotorClient:
+    write_concern = settings.get("write_concern")
+    options = {
+        "maxPoolSize": settings.get("max_pool_size"),
+        "minPoolSize": settings.get("min_pool_size"),
+        "maxIdleTimeMS": settings.get("max_idle_time_ms"),
+        "waitQueueTimeoutMS": settings.get("wait_queue_timeout_ms"),
+        "serverSelectionTimeoutMS": settings.get("server_selection_timeout_ms"),
+        # zstd needs the zstandard package and snappy needs python-snappy; pymongo skips unavailable ones
+        "compressors": settings.get("compressors"),
+        "w": int(write_concern) if write_concern and write_concern.isdigit() else write_concern,
+    }
+    return AsyncIOMotorClient(
+        settings["url"],
+        event_listeners=event_listeners or [],
+        **{name: value for name, value in options.items() if value is not None},
+    )
+
+
+def get_collection(client: AsyncIOMotorClient, database: str, name: str, read_preference: Optional[str] = None,
+                   read_concern: Optional[str] = None) -> AsyncIOMotorCollection:
+    if read_preference and read_preference not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference: {read_preference}")
+    return client[database].get_collection(
+        name,
+        read_preference=READ_PREFERENCES[read_preference] if read_preference else None,
+        read_concern=ReadConcern(read_concern) if read_concern else None,
+    )
@@ -0,0 +1,135 @@
+import threading
+from collections import defaultdict, deque
+
+from pymongo import monitoring
+
+from app.utils.metrics import MONGO_DOCUMENTS, MONGO_FAILURES, MONGO_LATENCY
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool occupancy and checkout wait times per server, for sizing pools per worker."""
+
+    def __init__(self, sample_size: int = 1024):
+        # Listeners are called from the driver's threads
+        self._lock = threading.Lock()
+        self._connections = defaultdict(int)
+        self._in_use = defaultdict(int)
+        self._waiting = defaultdict(int)
+        self._checkouts = defaultdict(int)
+        self._failures = defaultdict(int)
+        self._wait_ms = defaultdict(lambda: deque(maxlen=sample_size))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._connections.pop(event.address, None)
+            self._in_use.pop(event.address, None)
+            self._waiting.pop(event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._connections[event.address] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._connections[event.address] = max(0, self._connections[event.address] - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._waiting[event.address] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._waiting[event.address] = max(0, self._waiting[event.address] - 1)
+            self._failures[event.address] += 1
+            if event.duration is not None:
+                self._wait_ms[event.address].append(event.duration * 1000)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._waiting[event.address] = max(0, self._waiting[event.address] - 1)
+            self._in_use[event.address] += 1
+            self._checkouts[event.address] += 1
+            if event.duration is not None:
+                self._wait_ms[event.address].append(event.duration * 1000)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._in_use[event.address] = max(0, self._in_use[event.address] - 1)
+
+    def waiting(self) -> int:
+        """Checkouts currently waiting for a connection, across servers; cheap enough to call per request."""
+        with self._lock:
+            return sum(self._waiting.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            addresses = set(self._connections) | set(self._checkouts) | set(self._failures)
+            return {
+                f"{host}:{port}": {
+                    "connections": self._connections[(host, port)],
+                    "in_use": self._in_use[(host, port)],
+                    "waiting": self._waiting[(host, port)],
+                    "checkouts": self._checkouts[(host, port)],
+                    "checkout_failures": self._failures[(host, port)],
+                    "wait_ms_p50": round(_percentile(self._wait_ms[(host, port)], 0.5), 3),
+                    "wait_ms_p95": round(_percentile(self._wait_ms[(host, port)], 0.95), 3),
+                    "wait_ms_max": round(max(self._wait_ms[(host, port)], default=0.0), 3),
+                }
+                for host, port in addresses
+            }
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds per-command latency, failures and returned document counts into the metrics registry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (connection, request id) -> collection; the name is only present on the started event
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        labels = (self._pop_collection(event), event.command_name)
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, labels)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch:
+                MONGO_DOCUMENTS.inc(labels, len(batch))
+        elif event.command_name == "findAndModify" and event.reply.get("value") is not None:
+            MONGO_DOCUMENTS.inc(labels)
+
+    def failed(self, event):
+        labels = (self._pop_collection(event), event.command_name)
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, labels)
+        MONGO_FAILURES.inc(labels)
+
+    def _pop_collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop((event.connection_id, event.request_id), "-")
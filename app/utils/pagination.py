@@ -0,0 +1,49 @@
+import base64
+from typing import Any, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import InvalidId
+
+SORT_FIELDS = {"id": "_id", "price": "price", "title": "title", "rating": "average_rating"}
+
+
+def cursor_key(sort_by: str, direction: int = 1) -> str:
+    # What a cursor was issued for; a descending order is prefixed with "-"
+    return sort_by if direction == 1 else f"-{sort_by}"
+
+
+def encode_cursor(sort_by: str, doc: dict, direction: int = 1) -> str:
+    field = SORT_FIELDS[sort_by]
+    payload = json_util.dumps({"s": cursor_key(sort_by, direction), "v": doc.get(field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, Any, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+        return payload["s"], payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def sort_spec(sort_by: str, direction: int = 1) -> List[Tuple[str, int]]:
+    field = SORT_FIELDS[sort_by]
+    if field == "_id":
+        return [("_id", direction)]
+    # _id breaks ties so that the order is total and pages never overlap
+    return [(field, direction), ("_id", direction)]
+
+
+def keyset_filter(sort_by: str, value: Any, last_id: Any, direction: int = 1) -> dict:
+    op = "$gt" if direction == 1 else "$lt"
+    field = SORT_FIELDS[sort_by]
+    if field == "_id":
+        return {"_id": {op: last_id}}
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: last_id}}]}
+
+
+def next_cursor(sort_by: str, docs: List[dict], limit: int, direction: int = 1) -> Optional[str]:
+    if len(docs) <= limit:
+        return None
+    return encode_cursor(sort_by, docs[limit - 1], direction)
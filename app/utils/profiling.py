@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval and writes the result as folded stacks
+    (flamegraph.pl / speedscope input). Sampling the event loop thread captures every coroutine it runs,
+    so a profile of one request also contains whatever ran concurrently with it.
+    """
+
+    def __init__(self, thread_id: int, output_path: str, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.output_path = output_path
+        self.interval = interval
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        # The sampler thread writes the file itself, so the caller never waits on disk I/O
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+        try:
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+            with open(self.output_path, "w") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Failed to write profile {self.output_path}: {e}")
+
+
+def profile_path(directory: str, route: str) -> str:
+    name = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    return os.path.join(directory, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{int(time.time() * 1000) % 1000:03d}-{name}.folded")
@@ -0,0 +1,171 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.http_cache import parse_route_policies
+from app.utils.logger import logger
+
+# (key, tokens per second, burst)
+Bucket = Tuple[str, float, float]
+
+
+def parse_rate(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse `rate/burst` (tokens per second / bucket size), e.g. `20/40`; a bare rate uses it as the burst too."""
+    if not value or not value.strip():
+        return None
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    burst = float(burst) if burst.strip() else max(1.0, rate)
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"Invalid rate limit: {value}")
+    return rate, burst
+
+
+def parse_route_rates(value: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """Parse `route=rate/burst` pairs separated by `;`, keyed by route name like the Cache-Control policies."""
+    return {route: parse_rate(rate) for route, rate in parse_route_policies(value).items() if parse_rate(rate)}
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+class RateLimitBackend:
+    async def take(self, buckets: List[Bucket]) -> float:
+        """
+        Take one token from every bucket if each has one; otherwise take none and return the seconds until
+        they all will. Returns 0 when the tokens were taken.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets of this worker only: with N workers a client gets up to N times the configured rate."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, buckets: List[Bucket]) -> float:
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, rate, burst in buckets:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated_at, now, rate, burst)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+            levels.append(tokens)
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            self._buckets.move_to_end(key)
+        # Forgetting the least recently seen client only lets it start again with a full bucket
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Refill and take in one step, so concurrent workers never both spend the same token. The clock is passed in:
+# TIME inside a writing script needs effects replication, which older servers and stand-ins may lack.
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil((burst - tokens) / rate * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker and host, kept in Redis (or anything serving its protocol and Lua)."""
+
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisRateLimitBackend":
+        # Imported lazily so redis is only needed when this backend is selected
+        from redis.asyncio import Redis
+        return cls(Redis.from_url(url))
+
+    async def take(self, buckets: List[Bucket]) -> float:
+        args = [time.time()]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        return float(await self._take(keys=[key for key, _, _ in buckets], args=args))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class RateLimiter:
+    """
+    Token buckets per client: one across all routes (`default_rate`) and one per client and route for routes
+    listed in `route_rates`. A request spends a token from each bucket that applies to it.
+    """
+
+    def __init__(self, backend: RateLimitBackend, default_rate: Optional[Tuple[float, float]] = None,
+                 route_rates: Optional[Dict[str, Tuple[float, float]]] = None, prefix: str = "ratelimit"):
+        self.backend = backend
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+        self.prefix = prefix
+        self.errors = 0
+
+    async def check(self, client: str, route: Optional[str]) -> float:
+        """Return 0 if the request may proceed, else the seconds after which it may be retried."""
+        buckets = []
+        if self.default_rate:
+            buckets.append((f"{self.prefix}:*:{client}", *self.default_rate))
+        if route in self.route_rates:
+            buckets.append((f"{self.prefix}:{route}:{client}", *self.route_rates[route]))
+        if not buckets:
+            return 0.0
+        try:
+            return await self.backend.take(buckets)
+        except Exception as e:
+            # Fail open: an unreachable limit store must not take the API down with it
+            self.errors += 1
+            logger.warning("Rate limit check failed, allowing request: %s", e)
+            return 0.0
+
+    async def close(self):
+        await self.backend.close()
+
+
+def create_rate_limiter(backend: Optional[RateLimitBackend], default_rate: Optional[str],
+                        route_rates: Optional[str]) -> Optional[RateLimiter]:
+    default_rate, route_rates = parse_rate(default_rate), parse_route_rates(route_rates)
+    if backend is None or not (default_rate or route_rates):
+        return None
+    return RateLimiter(backend, default_rate, route_rates)
+
+
+def retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
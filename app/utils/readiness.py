@@ -0,0 +1,36 @@
+import time
+from typing import Dict, Iterable, Optional
+
+
+class Readiness:
+    """Startup steps a worker completes before /readyz reports it ready; each records when it passed."""
+
+    def __init__(self, checks: Iterable[str]):
+        self.started = time.monotonic()
+        self.passed_after: Dict[str, Optional[float]] = {name: None for name in checks}
+        self.errors: Dict[str, str] = {}
+        self.warnings: Dict[str, str] = {}
+
+    def passed(self, name: str):
+        self.passed_after[name] = round(time.monotonic() - self.started, 3)
+        self.errors.pop(name, None)
+
+    def failed(self, name: str, error: Exception):
+        self.errors[name] = str(error)
+
+    def degraded(self, name: str, error: Exception):
+        """Passed without completing: the worker serves anyway, and the report still shows why."""
+        self.passed(name)
+        self.warnings[name] = str(error)
+
+    @property
+    def ready(self) -> bool:
+        return all(seconds is not None for seconds in self.passed_after.values())
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "checks": {name: {"ok": seconds is not None, "seconds": seconds, "error": self.errors.get(name),
+                              "warning": self.warnings.get(name)}
+                       for name, seconds in self.passed_after.items()},
+        }
@@ -0,0 +1,27 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        # Response schemas declare no aliases or custom serializers, so field values can be emitted as-is;
+        # nested models come back through this hook
+        return obj.__dict__
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class MongoJSONResponse(Response):
+    """
+    Serializes models built with model_construct (and plain BSON-derived dicts) straight to JSON bytes.
+    Routes return it directly so FastAPI does not validate and serialize the response_model a second time.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
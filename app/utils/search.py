@@ -0,0 +1,81 @@
+import re
+from enum import Enum
+from typing import Iterable, List, Optional
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Prefix results are ranked by MongoDB one tier at a time; pages end at this rank
+PREFIX_MAX_RESULTS = 1000
+MIN_PREFIX_LENGTH = 2
+
+
+class SearchMode(str, Enum):
+    TEXT = 'text'
+    PREFIX = 'prefix'
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    seen = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if token not in seen:
+            seen.append(token)
+    return seen
+
+
+def _author_name(author) -> Optional[str]:
+    return author.get("name") if isinstance(author, dict) else getattr(author, "name", None)
+
+
+def author_terms(author_ids: Optional[Iterable]) -> List[str]:
+    terms = []
+    for author in author_ids or []:
+        terms.extend(token for token in tokenize(_author_name(author)) if token not in terms)
+    return terms
+
+
+def search_terms_update(fields: dict) -> dict:
+    """Term fields to write alongside a $set of `fields`; empty when neither title nor authors change."""
+    terms = {}
+    if "title" in fields:
+        terms["title_terms"] = tokenize(fields["title"])
+    if "author_ids" in fields:
+        terms["author_terms"] = author_terms(fields["author_ids"])
+    return terms
+
+
+def with_search_terms(document: dict) -> dict:
+    document.update(search_terms_update(document))
+    return document
+
+
+def _term_match(term) -> dict:
+    return {"$or": [{"title_terms": term}, {"author_terms": term}]}
+
+
+def prefix_query(query: str) -> Optional[dict]:
+    """Every complete word must match a term exactly; the last, possibly partial, word matches as a prefix."""
+    tokens = tokenize(query)
+    if not tokens or (len(tokens) == 1 and len(tokens[0]) < MIN_PREFIX_LENGTH):
+        return None
+    *words, prefix = tokens
+    # An anchored, case-sensitive regex on lowercased terms is served as an index range scan
+    clauses = [_term_match(word) for word in words] + [_term_match({"$regex": f"^{re.escape(prefix)}"})]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def prefix_tiers(query: str) -> List[dict]:
+    """
+    prefix_query split into disjoint filters in rank order: title matches before author-only matches, whole-word
+    matches before partial ones. Each tier is sorted by title, then _id.
+    """
+    base = prefix_query(query)
+    if base is None:
+        return []
+    *words, prefix = tokenize(query)
+    in_title = {"title_terms": {"$regex": f"^{re.escape(prefix)}"}}
+    if words:
+        in_title = {"$and": [{"title_terms": {"$all": words}}, in_title]}
+    exact = _term_match(prefix)
+    not_in_title, not_exact = {"$nor": [in_title]}, {"$nor": [exact]}
+    return [{"$and": [base, *clauses]}
+            for clauses in ([in_title, exact], [in_title, not_exact], [not_in_title, exact], [not_in_title, not_exact])]
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical reads share one in-flight call. The first caller for a key starts the call,
+    later callers await the same task until it finishes; nothing is kept once it has.
+
+    Waiters are shielded from each other: a cancelled request only stops waiting, and the shared call
+    is cancelled only when its last waiter is gone. Results are shared, so callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self.cancelled += 1
+
+    def _finish(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+        }
+
+
+def query_key(collection: AsyncIOMotorCollection, operation: str, query: dict, projection: Optional[dict] = None,
+              sort: Optional[list] = None, limit: Optional[int] = None, allow_disk_use: bool = False) -> str:
+    # Collections with another read preference or concern may legitimately return different results
+    return json_util.dumps([collection.full_name, collection.read_preference.document,
+                            collection.read_concern.document, operation, query, projection, sort, limit,
+                            allow_disk_use])
+
+
+def create_single_flight(enabled: bool) -> Optional[SingleFlight]:
+    return SingleFlight() if enabled else None
@@ -0,0 +1,54 @@
+from enum import Enum
+from typing import AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+
+from app.utils.logger import logger
+
+
+class StreamFormat(str, Enum):
+    NDJSON = 'ndjson'
+    JSON = 'json'
+
+
+async def ndjson_chunks(docs: AsyncIterator[dict], serialize: Callable[[dict], bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    buffer = []
+    async for doc in docs:
+        buffer.append(serialize(doc))
+        if len(buffer) >= chunk_size:
+            yield b"\n".join(buffer) + b"\n"
+            buffer.clear()
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
+
+async def json_array_chunks(docs: AsyncIterator[dict], serialize: Callable[[dict], bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    yield b"["
+    buffer = []
+    first = True
+    async for doc in docs:
+        buffer.append(serialize(doc))
+        if len(buffer) >= chunk_size:
+            yield (b"" if first else b",") + b",".join(buffer)
+            first = False
+            buffer.clear()
+    if buffer:
+        yield (b"" if first else b",") + b",".join(buffer)
+    yield b"]"
+
+
+async def _log_errors(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        # Headers are already sent, so the client only sees a truncated body
+        logger.error("Error while streaming response: %s", e)
+        raise
+
+
+def stream_documents(docs: AsyncIterator[dict], fmt: StreamFormat, serialize: Callable[[dict], bytes],
+                     chunk_size: int) -> StreamingResponse:
+    if fmt == StreamFormat.NDJSON:
+        return StreamingResponse(_log_errors(ndjson_chunks(docs, serialize, chunk_size)), media_type="application/x-ndjson")
+    return StreamingResponse(_log_errors(json_array_chunks(docs, serialize, chunk_size)), media_type="application/json")
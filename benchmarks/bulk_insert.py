@@ -0,0 +1,61 @@
+"""
+Compare ingestion throughput (docs/sec) of single-item create_book against bulk_create_books.
+
+    python -m benchmarks.bulk_insert --size 20000 --chunk-size 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.crud.books_crud import BookCRUD
+from app.utils.bulk import iter_chunks
+from benchmarks.catalog import BENCH_DB, get_client, make_book
+
+
+async def run(size: int, chunk_size: int, concurrency: int) -> dict:
+    collection = get_client()[BENCH_DB]["bulk_books"]
+    crud = BookCRUD(collection)
+    rng = random.Random(42)
+    books = [make_book(i, rng) for i in range(size)]
+
+    await collection.delete_many({})
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(book):
+        async with semaphore:
+            await crud.create_book(book)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(book) for book in books))
+    single = size / (time.perf_counter() - start)
+
+    await collection.delete_many({})
+    items = [book.dict() for book in books]
+    start = time.perf_counter()
+    report = await crud.bulk_create_books(iter_chunks(items, chunk_size))
+    bulk = size / (time.perf_counter() - start)
+    await collection.drop()
+
+    print(f"single create_book ({concurrency} concurrent): {single:10.0f} docs/sec")
+    print(f"bulk_create_books (chunks of {chunk_size}):  {bulk:10.0f} docs/sec  ({report.failed} failed)")
+    return {"single_docs_per_sec": round(single), "bulk_docs_per_sec": round(bulk), "failed": report.failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.size, args.chunk_size, args.concurrency))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "bulk_insert", "size": args.size, "chunk_size": args.chunk_size, **results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
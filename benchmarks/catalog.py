@@ -0,0 +1,59 @@
+import os
+import random
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+from app.models.books_model import BookModel
+from app.schemas.authors_schema import AuthorCreate
+from app.schemas.books_schema import CreateBookSchema
+from app.utils.book_enum import BookTypeEnum, Genre
+from app.utils.search import with_search_terms
+
+BENCH_DB = "book_store_bench"
+WORDS = ["shadow", "river", "empire", "garden", "storm", "silent", "crown", "winter", "glass", "machine",
+         "ocean", "night", "iron", "golden", "lost", "city", "fire", "memory", "stone", "wild"]
+
+
+def get_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(os.getenv("BENCH_MONGODB_URL", "mongodb://localhost:27017"))
+
+
+def make_author(i: int, rng: random.Random) -> AuthorCreate:
+    return AuthorCreate(name=f"{rng.choice(WORDS).title()} Author {i}", bio=" ".join(rng.sample(WORDS, 8)))
+
+
+def make_book(i: int, rng: random.Random, authors: Optional[List[dict]] = None) -> CreateBookSchema:
+    book_type = list(BookTypeEnum)[i % len(BookTypeEnum)]
+    genres = list(Genre)
+    extra = {
+        BookTypeEnum.EBOOK: {"file_format": "epub", "file_size": round(rng.uniform(0.5, 20), 2)},
+        BookTypeEnum.AUDIOBOOK: {"duration": rng.randint(60, 1800), "narrator": f"Narrator {i % 97}"},
+        BookTypeEnum.PAPERBACK: {"weight": round(rng.uniform(0.1, 2), 2), "dimensions": "13x20x3"},
+    }[book_type]
+    return CreateBookSchema(
+        title=f"{' '.join(rng.sample(WORDS, 3)).title()} {i}",
+        author_ids=rng.sample(authors, min(len(authors), rng.randint(1, 2))) if authors else
+        [{"id": f"{rng.randint(1, 5000):024x}", "name": f"Author {rng.randint(1, 5000)}"}],
+        book_type=book_type,
+        genre=rng.sample(genres, rng.randint(1, 3)),
+        price=round(rng.uniform(1, 120), 2),
+        stock=rng.randint(0, 500),
+        average_rating=round(rng.uniform(1, 5), 1),
+        **extra,
+    )
+
+
+def make_book_document(i: int, rng: random.Random) -> dict:
+    # Same shape BookCRUD.create_book writes
+    return with_search_terms(BookModel(**make_book(i, rng).dict()).dict(by_alias=True))
+
+
+async def seed_books(collection: AsyncIOMotorCollection, size: int, batch_size: int = 5000, seed: int = 42):
+    if await collection.estimated_document_count() == size:
+        return
+    await collection.delete_many({})
+    rng = random.Random(seed)
+    for start in range(0, size, batch_size):
+        batch = [make_book_document(i, rng) for i in range(start, min(start + batch_size, size))]
+        await collection.insert_many(batch, ordered=False)
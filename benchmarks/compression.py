@@ -0,0 +1,81 @@
+"""
+Bytes saved vs. CPU cost of each response encoding and level on catalog pages serialized the way the API does.
+Needs no database; brotli and zstandard are measured when installed.
+
+    python -m benchmarks.compression --page-sizes 10 100 1000 --output compression.json
+"""
+import argparse
+import json
+import random
+import time
+
+import orjson
+
+from app.schemas.books_schema import BookResponseSchema
+from app.utils.compression import COMPRESSORS, DEFAULT_LEVELS, compress
+from benchmarks.catalog import make_book_document
+
+LEVELS = {"gzip": [1, 4, 6, 9], "br": [1, 4, 6, 9, 11], "zstd": [1, 3, 6, 12, 19]}
+
+
+def make_page(size: int, rng: random.Random) -> bytes:
+    documents = []
+    for i in range(size):
+        document = make_book_document(i, rng)
+        document["_id"] = document.pop("id")
+        documents.append(BookResponseSchema.dict_from_mongo(document))
+    return orjson.dumps(documents)
+
+
+def measure(encoding: str, level: int, body: bytes, min_time: float) -> dict:
+    compressed = compress(encoding, level, body)
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        compress(encoding, level, body)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+    seconds = elapsed / runs
+    return {
+        "encoding": encoding,
+        "level": level,
+        "default": DEFAULT_LEVELS[encoding] == level,
+        "bytes": len(compressed),
+        "ratio": round(len(body) / len(compressed), 2),
+        "saved_bytes": len(body) - len(compressed),
+        "compress_ms": round(seconds * 1000, 3),
+        "throughput_mb_s": round(len(body) / seconds / 1e6, 1),
+        # CPU spent per byte kept off the wire; lower is a better trade
+        "ns_per_saved_byte": round(seconds * 1e9 / max(1, len(body) - len(compressed)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--encodings", nargs="+", default=list(COMPRESSORS), choices=list(COMPRESSORS))
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to repeat each measurement for")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.page_sizes:
+        body = make_page(size, random.Random(args.seed))
+        print(f"page of {size} books: {len(body)} bytes")
+        for encoding in args.encodings:
+            for level in LEVELS[encoding]:
+                result = {"page_size": size, "raw_bytes": len(body), **measure(encoding, level, body, args.min_time)}
+                results.append(result)
+                print(f"  {encoding:>4} {level:>2}{'*' if result['default'] else ' '} {result['bytes']:>9} bytes  "
+                      f"x{result['ratio']:<6} {result['compress_ms']:>9.3f} ms  {result['throughput_mb_s']:>7.1f} MB/s  "
+                      f"{result['ns_per_saved_byte']:>6.2f} ns/saved byte")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "compression", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Noisy-neighbour test for rate limits and load shedding: one client floods GET /books/sorted-by-price/ (a full
+collection sort) while others look books up by id. Reports throughput, latency and status counts per client
+class; with limits on, lookups should keep their latency and the flood should get 429/503 with Retry-After.
+Limits come from the usual environment variables, so compare two runs:
+
+    python -m benchmarks.load_shedding --mongo mongodb://localhost:27017 --output shedding_on.json
+    CONCURRENCY_LIMIT_ENABLED=false CONCURRENCY_LIMIT_ROUTES= \\
+        python -m benchmarks.load_shedding --mongo mongodb://localhost:27017 --output shedding_off.json
+
+`--mongo memory` runs every query on the event loop, so lookups wait behind each sort whatever the limits;
+use a real mongod to see the isolation. In-process runs identify clients by the X-Client-ID header
+(RATE_LIMIT_CLIENT_HEADER); against --base-url, start the server with the same setting.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.catalog import BENCH_DB
+from benchmarks.loadtest import Context, git_commit, in_process_client, percentile, prepare_database, seed
+
+
+async def drive(client: httpx.AsyncClient, name: str, requests, concurrency: int, duration: float) -> dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    missing_retry_after = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int):
+        nonlocal missing_retry_after
+        while time.perf_counter() < deadline:
+            url, headers = requests(index)
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[str(response.status_code)] += 1
+            if response.status_code in (429, 503) and "retry-after" not in response.headers:
+                missing_retry_after += 1
+            # In-process rejections never suspend; yield as a network round trip would, or one client hogs the loop
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    return {
+        "client": name,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "statuses": dict(statuses),
+        "missing_retry_after": missing_retry_after,
+    }
+
+
+async def run(args) -> dict:
+    in_process = not args.base_url
+    if in_process:
+        os.environ.setdefault("RATE_LIMIT_CLIENT_HEADER", "X-Client-ID")
+        client = in_process_client(args.mongo, args.database)
+        await prepare_database(args.mongo, args.database)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+
+    ctx = Context()
+    async with client:
+        await seed(client, ctx, args.authors, args.books, args.seed)
+        rng = random.Random(args.seed)
+
+        def noisy(_: int):
+            return "/books/sorted-by-price/", {"X-Client-ID": "noisy"}
+
+        def lookups(index: int):
+            headers = {"X-Client-ID": f"client-{index}", "Cache-Control": "no-cache"}
+            return f"/books/{rng.choice(ctx.book_ids)}", headers
+
+        baseline = await drive(client, "lookups_alone", lookups, args.lookup_concurrency, args.duration)
+        results: Dict[str, dict] = {"lookups_alone": baseline}
+        contended = await asyncio.gather(
+            drive(client, "noisy", noisy, args.noisy_concurrency, args.duration),
+            drive(client, "lookups", lookups, args.lookup_concurrency, args.duration))
+        results.update({result["client"]: result for result in contended})
+
+    for result in results.values():
+        print(f"{result['client']:<14} {result['throughput_rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.2f}  "
+              f"p99 {result['p99_ms']:>8.2f} ms  {result['statuses']}")
+    return {
+        "benchmark": "load_shedding",
+        "commit": git_commit(),
+        "target": args.base_url or f"in-process ({'memory' if args.mongo == 'memory' else 'mongod'})",
+        "config": {"books": args.books, "duration": args.duration, "noisy_concurrency": args.noisy_concurrency,
+                   "lookup_concurrency": args.lookup_concurrency, "seed": args.seed,
+                   "limits": {name: value for name, value in os.environ.items()
+                              if name.startswith(("RATE_LIMIT_", "CONCURRENCY_LIMIT_", "LOAD_SHEDDING_"))}},
+        "results": list(results.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL (in-process runs)")
+    parser.add_argument("--database", default=BENCH_DB)
+    parser.add_argument("--base-url", help="Run against a server instead of in-process")
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per phase")
+    parser.add_argument("--noisy-concurrency", type=int, default=32, help="Concurrent requests of the flooding client")
+    parser.add_argument("--lookup-concurrency", type=int, default=32, help="Concurrent lookup clients")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Drive every books and authors route with a concurrent client and report throughput, latency percentiles and
+peak RSS per endpoint as JSON, so runs can be diffed across commits.
+
+In-process against an in-memory MongoDB stand-in (needs `pip install -r benchmarks/requirements.txt`):
+
+    python -m benchmarks.loadtest --mongo memory --books 5000 --output before.json
+
+In-process against a local mongod (uses the MONGODB_DATABASE given by --database, dropped first):
+
+    python -m benchmarks.loadtest --mongo mongodb://localhost:27017 --books 100000
+
+Against a running server (its database is seeded through the API; pass its pid to sample its RSS):
+
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --server-pid 1234
+
+The in-memory stand-in does not implement every operator (e.g. $text), so some endpoints report errors there;
+compare such runs with each other, not with mongod runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from app.utils.book_enum import BookSortEnum, BookTypeEnum, Genre
+from benchmarks.catalog import BENCH_DB, WORDS, make_author, make_book
+
+
+@dataclass
+class Context:
+    author_ids: List[str] = field(default_factory=list)
+    authors: List[dict] = field(default_factory=list)
+    book_ids: List[str] = field(default_factory=list)
+    titles: List[str] = field(default_factory=list)
+    # Books created for, and consumed by, the delete scenarios
+    disposable: List[str] = field(default_factory=list)
+    counter: int = 10 ** 9
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    route: str
+    build: Callable[[Context, random.Random], dict]
+    write: bool = False
+
+
+def _next(ctx: Context) -> int:
+    ctx.counter += 1
+    return ctx.counter
+
+
+def _book_payload(ctx: Context, rng: random.Random) -> dict:
+    return make_book(_next(ctx), rng, ctx.authors).model_dump(mode="json")
+
+
+def _fields(rng: random.Random) -> dict:
+    return {"fields": "id,title,price"} if rng.random() < 0.5 else {}
+
+
+SCENARIOS = [
+    # Reads
+    Scenario("get_book", "GET", "/books/{book_id}", lambda ctx, rng: {"url": f"/books/{rng.choice(ctx.book_ids)}"}),
+    Scenario("get_book_resolved", "GET", "/books/{book_id}?resolve_authors=true",
+             lambda ctx, rng: {"url": f"/books/{rng.choice(ctx.book_ids)}", "params": {"resolve_authors": "true"}}),
+    Scenario("get_book_by_title", "GET", "/books/title/{title}",
+             lambda ctx, rng: {"url": f"/books/title/{rng.choice(ctx.titles)}"}),
+    Scenario("list_books", "GET", "/books/",
+             lambda ctx, rng: {"url": "/books/", "params": {"skip": rng.randint(0, 500), "limit": 20, **_fields(rng)}}),
+    Scenario("list_books_page", "GET", "/books/page/",
+             lambda ctx, rng: {"url": "/books/page/",
+                               "params": {"limit": 20, "sort_by": rng.choice(list(BookSortEnum)).value}}),
+    Scenario("books_by_type_genre_rating", "GET", "/books/by-type-genre-rating/",
+             lambda ctx, rng: {"url": "/books/by-type-genre-rating/",
+                               "params": {"book_type": rng.choice(list(BookTypeEnum)).value,
+                                          "genre": rng.choice(list(Genre)).value, "min_rating": 4.5,
+                                          "fields": "id,title,average_rating"}}),
+    Scenario("books_sorted_by_price_ndjson", "GET", "/books/sorted-by-price/?stream=ndjson",
+             lambda ctx, rng: {"url": "/books/sorted-by-price/", "params": {"stream": "ndjson", "fields": "id,price"}}),
+    Scenario("books_price_range", "GET", "/books/price-range/",
+             lambda ctx, rng: {"url": "/books/price-range/",
+                               "params": (lambda low: {"min_price": low, "max_price": low + 5, **_fields(rng)})(
+                                   rng.randint(1, 110))}),
+    Scenario("query_books", "GET", "/books/query/",
+             lambda ctx, rng: {"url": "/books/query/",
+                               "params": {"genre": rng.sample([genre.value for genre in Genre], 2),
+                                          "min_price": 10, "max_price": 60, "in_stock": "true", "limit": 20,
+                                          "sort_by": rng.choice(list(BookSortEnum)).value, **_fields(rng)}}),
+    Scenario("search_text", "GET", "/books/search/?mode=text",
+             lambda ctx, rng: {"url": "/books/search/", "params": {"q": " ".join(rng.sample(WORDS, 2))}}),
+    Scenario("search_prefix", "GET", "/books/search/?mode=prefix",
+             lambda ctx, rng: {"url": "/books/search/",
+                               "params": {"q": rng.choice(WORDS)[:rng.randint(2, 4)], "mode": "prefix"}}),
+    Scenario("book_facets", "GET", "/books/facets/", lambda ctx, rng: {"url": "/books/facets/"}),
+    Scenario("get_author", "GET", "/authors/{author_id}",
+             lambda ctx, rng: {"url": f"/authors/{rng.choice(ctx.author_ids)}"}),
+    # Writes
+    Scenario("create_book", "POST", "/books/", lambda ctx, rng: {"url": "/books/", "json": _book_payload(ctx, rng)},
+             write=True),
+    Scenario("update_book", "PUT", "/books/{book_id}",
+             lambda ctx, rng: {"url": f"/books/{rng.choice(ctx.book_ids)}",
+                               "json": {"price": round(rng.uniform(1, 120), 2), "stock_delta": 1}}, write=True),
+    Scenario("rate_book", "POST", "/books/{book_id}/ratings",
+             lambda ctx, rng: {"url": f"/books/{rng.choice(ctx.book_ids)}/ratings",
+                               "json": {"rating": rng.randint(1, 5)}}, write=True),
+    Scenario("bulk_create_books", "POST", "/books/bulk",
+             lambda ctx, rng: {"url": "/books/bulk", "json": [_book_payload(ctx, rng) for _ in range(50)]}, write=True),
+    Scenario("bulk_create_books_ndjson", "POST", "/books/bulk/ndjson",
+             lambda ctx, rng: {"url": "/books/bulk/ndjson",
+                               "content": "\n".join(json.dumps(_book_payload(ctx, rng)) for _ in range(50))},
+             write=True),
+    Scenario("bulk_update_books", "PATCH", "/books/bulk",
+             lambda ctx, rng: {"url": "/books/bulk",
+                               "json": [{"id": book_id, "update": {"stock": rng.randint(0, 500)}}
+                                        for book_id in rng.sample(ctx.book_ids, 50)]}, write=True),
+    Scenario("delete_book", "DELETE", "/books/{book_id}",
+             lambda ctx, rng: {"url": f"/books/{ctx.disposable.pop()}"}, write=True),
+    Scenario("bulk_delete_books", "POST", "/books/bulk/delete",
+             lambda ctx, rng: {"url": "/books/bulk/delete",
+                               "json": [ctx.disposable.pop() for _ in range(min(20, len(ctx.disposable)))]},
+             write=True),
+    Scenario("create_author", "POST", "/authors/",
+             lambda ctx, rng: {"url": "/authors/", "json": make_author(_next(ctx), rng).model_dump()}, write=True),
+    Scenario("bulk_create_authors", "POST", "/authors/bulk",
+             lambda ctx, rng: {"url": "/authors/bulk",
+                               "json": [make_author(_next(ctx), rng).model_dump() for _ in range(50)]}, write=True),
+    Scenario("bulk_create_authors_ndjson", "POST", "/authors/bulk/ndjson",
+             lambda ctx, rng: {"url": "/authors/bulk/ndjson",
+                               "content": "\n".join(json.dumps(make_author(_next(ctx), rng).model_dump())
+                                                   for _ in range(50))}, write=True),
+    Scenario("update_author", "PUT", "/authors/{author_id}",
+             lambda ctx, rng: {"url": f"/authors/{rng.choice(ctx.author_ids)}",
+                               "json": {"bio": " ".join(rng.sample(WORDS, 8))}}, write=True),
+]
+
+
+class RssSampler:
+    """Peak resident set size of a process while a scenario runs, sampled from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _read_kb(self) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        # No /proc (e.g. macOS): lifetime peak of this process, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+    async def _run(self):
+        while True:
+            self.peak_kb = max(self.peak_kb, self._read_kb())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak_kb = self._read_kb()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> float:
+        self._task.cancel()
+        self.peak_kb = max(self.peak_kb, self._read_kb())
+        return round(self.peak_kb / 1024, 1)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def seed(client: httpx.AsyncClient, ctx: Context, authors: int, books: int, seed_value: int):
+    rng = random.Random(seed_value)
+    for start in range(0, authors, 1000):
+        batch = [make_author(i, rng).model_dump() for i in range(start, min(start + 1000, authors))]
+        response = await client.post("/authors/bulk", json=batch)
+        response.raise_for_status()
+        for item, result in zip(batch, response.json()["results"]):
+            if result["id"]:
+                ctx.author_ids.append(result["id"])
+                ctx.authors.append({"id": result["id"], "name": item["name"]})
+    for start in range(0, books, 1000):
+        batch = [make_book(i, rng, ctx.authors).model_dump(mode="json") for i in range(start, min(start + 1000, books))]
+        response = await client.post("/books/bulk", json=batch)
+        response.raise_for_status()
+        for item, result in zip(batch, response.json()["results"]):
+            if result["id"]:
+                ctx.book_ids.append(result["id"])
+                ctx.titles.append(item["title"])
+    if not ctx.book_ids or not ctx.author_ids:
+        raise RuntimeError("Seeding created no books or authors; is the database reachable?")
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ctx: Context, requests: int,
+                       concurrency: int, rng: random.Random, sampler: RssSampler) -> dict:
+    if scenario.name in ("delete_book", "bulk_delete_books"):
+        # Delete books made for the purpose, never the seeded catalog other scenarios read
+        needed = requests * (20 if scenario.name == "bulk_delete_books" else 1)
+        for start in range(0, needed, 1000):
+            batch = [_book_payload(ctx, rng) for _ in range(min(1000, needed - start))]
+            response = await client.post("/books/bulk", json=batch)
+            ctx.disposable.extend(result["id"] for result in response.json()["results"] if result["id"])
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            request = scenario.build(ctx, rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, **request)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    rss_peak_mb = await sampler.stop()
+
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        "name": scenario.name,
+        "method": scenario.method,
+        "route": scenario.route,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_counts": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies, default=0.0), 3),
+        "rss_peak_mb": rss_peak_mb,
+    }
+
+
+def in_process_client(mongo: str, database: str) -> httpx.AsyncClient:
+    os.environ["MONGODB_DATABASE"] = database
+    if mongo != "memory":
+        os.environ["MONGODB_URL"] = mongo
+    from app.main import app, container
+    from app.utils.logger import start_logging
+
+    # ASGITransport does not run the lifespan, which is where workers set up logging
+    start_logging()
+    if mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--mongo memory needs mongomock-motor: pip install -r benchmarks/requirements.txt")
+        from dependency_injector import providers
+        container.db_client.override(providers.Object(AsyncMongoMockClient()))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+
+async def prepare_database(mongo: str, database: str):
+    if mongo == "memory":
+        return
+    from app.main import container
+    from app.utils.indexes import reconcile_all_indexes
+    await container.db_client().drop_database(database)
+    await reconcile_all_indexes(container.database())
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+        pid = args.server_pid or os.getpid()
+    else:
+        client = in_process_client(args.mongo, args.database)
+        await prepare_database(args.mongo, args.database)
+        pid = os.getpid()
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if (not args.only or scenario.name in args.only) and (args.writes or not scenario.write)]
+    ctx = Context()
+    results = []
+    async with client:
+        started = time.perf_counter()
+        await seed(client, ctx, args.authors, args.books, args.seed)
+        print(f"Seeded {len(ctx.author_ids)} authors and {len(ctx.book_ids)} books "
+              f"in {time.perf_counter() - started:.1f}s")
+        sampler = RssSampler(pid)
+        for scenario in scenarios:
+            rng = random.Random(f"{args.seed}-{scenario.name}")
+            if args.warmup:
+                await run_scenario(client, scenario, ctx, args.warmup, args.concurrency, rng, sampler)
+            result = await run_scenario(client, scenario, ctx, args.requests, args.concurrency, rng, sampler)
+            results.append(result)
+            print(f"{result['name']:<30} {result['throughput_rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.2f}  "
+                  f"p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  rss {result['rss_peak_mb']:>7.1f} MB"
+                  f"  errors {result['errors']}")
+    return {
+        "benchmark": "loadtest",
+        "commit": git_commit(),
+        "target": args.base_url or f"in-process ({'memory' if args.mongo == 'memory' else 'mongod'})",
+        "config": {"authors": args.authors, "books": args.books, "requests": args.requests,
+                   "concurrency": args.concurrency, "warmup": args.warmup, "seed": args.seed, "writes": args.writes},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--server-pid", type=int, help="Pid of the --base-url server, to sample its RSS")
+    parser.add_argument("--mongo", default="memory", help="In-process only: 'memory' or a MongoDB URL")
+    parser.add_argument("--database", default=BENCH_DB, help="In-process only: database to seed (dropped first)")
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-writes", dest="writes", action="store_false", help="Only run read endpoints")
+    parser.add_argument("--only", nargs="+", help="Scenario names to run")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
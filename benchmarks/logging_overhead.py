@@ -0,0 +1,102 @@
+"""
+Request latency with logging off vs. on, for each way of wiring it: a synchronous file handler on the request path,
+the queue/listener pipeline with JSON records, and the same pipeline sampling successful reads. Records go to a
+temporary file so the console does not dominate the numbers.
+
+    python -m benchmarks.logging_overhead --mongo memory --books 2000 --output logging.json
+    python -m benchmarks.logging_overhead --mongo mongodb://localhost:27017 --only get_book update_book
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+
+from benchmarks.catalog import BENCH_DB
+from benchmarks.loadtest import SCENARIOS, Context, RssSampler, git_commit, in_process_client, prepare_database, \
+    run_scenario, seed
+
+MODES = ("off", "sync", "queue", "queue_sampled")
+
+
+def configure(mode: str, path: str, sample_rate: float):
+    from app.utils import logger as app_logger
+
+    root = logging.getLogger()
+    app_logger.stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.CRITICAL if mode == "off" else logging.NOTSET)
+    if mode == "sync":
+        handler = logging.FileHandler(path)
+        handler.setFormatter(app_logger.JsonFormatter())
+        handler.addFilter(app_logger.RequestIdFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    elif mode in ("queue", "queue_sampled"):
+        sampling = {"app.reads": sample_rate} if mode == "queue_sampled" else {}
+        app_logger.setup_logging(level="INFO", sampling=sampling, handlers=[logging.FileHandler(path)])
+
+
+async def run(args) -> dict:
+    client = in_process_client(args.mongo, args.database)
+    await prepare_database(args.mongo, args.database)
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in args.only]
+    ctx = Context()
+    results = []
+    path = os.path.join(tempfile.mkdtemp(prefix="logging-bench-"), "records.log")
+    async with client:
+        configure("off", path, args.sample_rate)
+        await seed(client, ctx, args.authors, args.books, args.seed)
+        sampler = RssSampler(os.getpid())
+        for mode in args.modes:
+            configure(mode, path, args.sample_rate)
+            for scenario in scenarios:
+                # Same request sequence in every mode
+                rng = random.Random(f"{args.seed}-{scenario.name}")
+                if args.warmup:
+                    await run_scenario(client, scenario, ctx, args.warmup, args.concurrency, rng, sampler)
+                result = {"mode": mode, **await run_scenario(client, scenario, ctx, args.requests, args.concurrency,
+                                                             rng, sampler)}
+                results.append(result)
+                print(f"{mode:<14} {result['name']:<26} {result['throughput_rps']:>8.1f} req/s  "
+                      f"p50 {result['p50_ms']:>7.2f}  p99 {result['p99_ms']:>7.2f} ms  errors {result['errors']}")
+        configure("off", path, args.sample_rate)
+    return {
+        "benchmark": "logging_overhead",
+        "commit": git_commit(),
+        "target": f"in-process ({'memory' if args.mongo == 'memory' else 'mongod'})",
+        "config": {"books": args.books, "requests": args.requests, "concurrency": args.concurrency,
+                   "sample_rate": args.sample_rate, "seed": args.seed},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL")
+    parser.add_argument("--database", default=BENCH_DB)
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario and mode")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--only", nargs="+", default=["get_book", "get_book_by_title", "books_price_range"],
+                        help="Scenario names from benchmarks.loadtest")
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="Kept fraction of successful read logs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
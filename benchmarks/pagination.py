@@ -0,0 +1,71 @@
+"""
+Compare page-N latency of skip/limit and keyset pagination.
+
+    python -m benchmarks.pagination --size 200000 --pages 1 10 100 1000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.crud.books_crud import BookCRUD
+from app.utils.book_enum import BookSortEnum
+from app.utils.pagination import encode_cursor, sort_spec
+from benchmarks.catalog import BENCH_DB, get_client, seed_books
+
+
+async def timed(coro_factory, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def run(size: int, limit: int, pages: list, repeats: int, sort_by: BookSortEnum) -> list:
+    collection = get_client()[BENCH_DB]["books"]
+    await seed_books(collection, size)
+    await collection.create_index(sort_spec(sort_by.value))
+    crud = BookCRUD(collection)
+
+    results = []
+    for page in pages:
+        skip = (page - 1) * limit
+        if skip >= size:
+            break
+        cursor = None
+        if skip:
+            # The cursor a client would hold after reading the previous page
+            boundary = await collection.find().sort(sort_spec(sort_by.value)).skip(skip - 1).limit(1).to_list(1)
+            cursor = encode_cursor(sort_by.value, boundary[0])
+        if sort_by == BookSortEnum.ID:
+            skip_ms = await timed(lambda: crud.list_books(skip=skip, limit=limit), repeats)
+        else:
+            skip_ms = await timed(
+                lambda: collection.find().sort(sort_spec(sort_by.value)).skip(skip).limit(limit).to_list(limit), repeats)
+        keyset_ms = await timed(lambda: crud.list_books_page(limit=limit, cursor=cursor, sort_by=sort_by), repeats)
+        results.append({"page": page, "skip_ms": round(skip_ms, 3), "keyset_ms": round(keyset_ms, 3)})
+        print(f"page {page:>7}: skip/limit {skip_ms:9.3f} ms   keyset {keyset_ms:9.3f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 4000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--sort-by", type=BookSortEnum, default=BookSortEnum.ID)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.size, args.limit, args.pages, args.repeats, args.sort_by))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "pagination", "size": args.size, "limit": args.limit, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Run explain() on every BookCRUD query shape and fail if any of them falls back to a COLLSCAN.
+
+    python -m benchmarks.query_plans --size 50000
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from app.utils.indexes import book_query_shapes, explain_query_shapes, reconcile_all_indexes
+from benchmarks.catalog import BENCH_DB, get_client, seed_books
+
+
+async def run(size: int) -> list:
+    database = get_client()[BENCH_DB]
+    await seed_books(database["books"], size)
+    reports = await reconcile_all_indexes(database)
+    for report in reports.values():
+        if not report.ok:
+            print(f"{report.collection}: indexes do not match the registry: {report.mismatched or report.error}")
+
+    results = await explain_query_shapes(database["books"], book_query_shapes())
+    for result in results:
+        status = "COLLSCAN" if result["collscan"] else "ok"
+        print(f"{result['shape']:<40} {status:<9} docs={result['docs_examined']} keys={result['keys_examined']} "
+              f"time={result['time_ms']}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.size))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "query_plans", "size": args.size, "results": results}, f, indent=2)
+    if any(result["collscan"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
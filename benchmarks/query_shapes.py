@@ -0,0 +1,91 @@
+"""
+Latency of each /books/query/ shape on a large synthetic catalog: the first page and a deep page reached by
+following keyset cursors, with the keys and documents the first page examined. Needs a mongod
+(BENCH_MONGODB_URL, default localhost).
+
+    python -m benchmarks.query_shapes --size 500000 --depth 50 --output query_shapes.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import replace
+from typing import List
+
+from app.crud.books_crud import BookCRUD
+from app.utils.book_query import BookQuery, example_book_queries
+from app.utils.indexes import explain_query_shapes, reconcile_all_indexes
+from benchmarks.catalog import BENCH_DB, get_client, seed_books
+from benchmarks.loadtest import percentile
+
+
+async def timed(crud: BookCRUD, query: BookQuery, repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await crud.query_books(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def run(size: int, limit: int, depth: int, repeats: int) -> list:
+    database = get_client()[BENCH_DB]
+    await seed_books(database["books"], size)
+    await reconcile_all_indexes(database)
+    collection = database["books"]
+    crud = BookCRUD(collection)
+
+    results = []
+    for name, query in example_book_queries().items():
+        query = replace(query, limit=limit)
+        if query.filter.author_id is not None:
+            # Pick an author that exists in the catalog
+            book = await collection.find_one({"author_ids._id": {"$exists": True}}, {"author_ids": 1})
+            query = replace(query, filter=replace(query.filter, author_id=book["author_ids"][0]["_id"]))
+
+        first = await timed(crud, query, repeats)
+        deep_query, pages = query, 1
+        while pages < depth:
+            cursor = (await crud.query_books(deep_query)).next_cursor
+            if cursor is None:
+                break
+            deep_query, pages = replace(query, cursor=cursor), pages + 1
+        deep = await timed(crud, deep_query, repeats)
+        plan = (await explain_query_shapes(collection, {name: query.compile()}))[0]
+
+        result = {
+            "shape": name,
+            "first_page_p50_ms": round(percentile(first, 0.5), 3),
+            "first_page_p95_ms": round(percentile(first, 0.95), 3),
+            "deep_page": pages,
+            "deep_page_p50_ms": round(percentile(deep, 0.5), 3),
+            "deep_page_p95_ms": round(percentile(deep, 0.95), 3),
+            "collscan": plan["collscan"],
+            "keys_examined": plan["keys_examined"],
+            "docs_examined": plan["docs_examined"],
+        }
+        results.append(result)
+        print(f"{name:<32} page 1 p50 {result['first_page_p50_ms']:>8.2f} ms  page {pages:>4} p50 "
+              f"{result['deep_page_p50_ms']:>8.2f} ms  keys={plan['keys_examined']} docs={plan['docs_examined']}"
+              f"{'  COLLSCAN' if plan['collscan'] else ''}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=50, help="Page reached through cursors for the deep-page timing")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.size, args.limit, args.depth, args.repeats))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "query_shapes", "size": args.size, "limit": args.limit, "results": results}, f,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
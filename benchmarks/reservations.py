@@ -0,0 +1,186 @@
+"""
+Concurrency stress test for POST /reservations/: many clients race for the stock of a few hot books with
+multi-book carts, then confirm, release or abandon (let expire) each hold. Afterwards every book's stock must
+equal its initial stock minus the confirmed quantities, and must never have gone negative; the run exits
+non-zero otherwise. Reports reservation throughput and latency (including retries of requests shed with
+429/503, which honour Retry-After).
+
+    python -m benchmarks.reservations --mongo mongodb://localhost:27017 --requests 50000 --concurrency 256
+    python -m benchmarks.reservations --base-url http://127.0.0.1:8000 --requests 50000
+
+Only a real mongod (in-process or behind --base-url) exercises the server-side guards under true concurrency;
+`--mongo memory` runs every update atomically on the event loop and only checks the bookkeeping.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.catalog import BENCH_DB, make_book
+from benchmarks.loadtest import git_commit, in_process_client, percentile, prepare_database
+
+
+async def send(client: httpx.AsyncClient, method: str, url: str, attempts: int = 30, **kwargs) -> httpx.Response:
+    # Requests shed with 429/503 never reached the handler; retry them as a well-behaved client would
+    for _ in range(attempts - 1):
+        response = await client.request(method, url, **kwargs)
+        if response.status_code not in (429, 503):
+            return response
+        await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+    return await client.request(method, url, **kwargs)
+
+
+async def seed_books(client: httpx.AsyncClient, books: int, stock: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    batch = [{**make_book(i, rng).model_dump(mode="json"), "stock": stock} for i in range(books)]
+    response = await send(client, "POST", "/books/bulk", json=batch)
+    response.raise_for_status()
+    return [result["id"] for result in response.json()["results"] if result["id"]]
+
+
+async def wait_for_expiry(client: httpx.AsyncClient, hold_ids: List[str], in_process: bool, timeout: float):
+    deadline = time.monotonic() + timeout
+    if in_process:
+        # No app lifespan in-process, so no reaper task; sweep the way it would
+        from app.main import container
+        while await container.reservations().release_expired():
+            pass
+    pending = list(hold_ids)
+    while pending and time.monotonic() < deadline:
+        statuses = await asyncio.gather(*[send(client, "GET", f"/reservations/{hold_id}") for hold_id in pending])
+        pending = [hold_id for hold_id, response in zip(pending, statuses) if response.json()["status"] == "held"]
+        if pending:
+            await asyncio.sleep(0.5)
+    return pending
+
+
+async def run(args) -> dict:
+    in_process = not args.base_url
+    if in_process:
+        client = in_process_client(args.mongo, args.database)
+        await prepare_database(args.mongo, args.database)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    confirmed: Counter = Counter()
+    abandoned: List[str] = []
+    remaining = args.requests
+
+    async with client:
+        book_ids = await seed_books(client, args.books, args.stock, args.seed)
+        rng = random.Random(args.seed)
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                cart = rng.sample(book_ids, rng.randint(1, min(args.max_cart, len(book_ids))))
+                items = [{"book_id": book_id, "quantity": rng.randint(1, args.max_quantity)} for book_id in cart]
+                action = rng.random()
+                expire = action < args.expire_fraction
+                body = {"items": items, **({"hold_seconds": args.expire_seconds} if expire else {})}
+                start = time.perf_counter()
+                try:
+                    response = await send(client, "POST", "/reservations/", json=body)
+                except httpx.HTTPError as e:
+                    outcomes[type(e).__name__] += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 201:
+                    outcomes[{409: "rejected", 404: "not_found"}.get(response.status_code, str(response.status_code))] += 1
+                    continue
+                outcomes["reserved"] += 1
+                hold_id = response.json()["id"]
+                if expire:
+                    abandoned.append(hold_id)
+                elif action < args.expire_fraction + args.release_fraction:
+                    response = await send(client, "DELETE", f"/reservations/{hold_id}")
+                    outcomes["released" if response.status_code == 200 else f"release_{response.status_code}"] += 1
+                else:
+                    response = await send(client, "POST", f"/reservations/{hold_id}/confirm")
+                    if response.status_code == 200:
+                        outcomes["confirmed"] += 1
+                        for item in items:
+                            confirmed[item["book_id"]] += item["quantity"]
+                    else:
+                        outcomes[f"confirm_{response.status_code}"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+        await asyncio.sleep(args.expire_seconds + 0.2)
+        still_held = await wait_for_expiry(client, abandoned, in_process, args.expiry_timeout)
+
+        final: Dict[str, int] = {}
+        for book_id in book_ids:
+            response = await send(client, "GET", f"/books/{book_id}", headers={"Cache-Control": "no-cache"})
+            final[book_id] = response.json()["stock"]
+
+    mismatches = {book_id: {"stock": final[book_id], "expected": args.stock - confirmed[book_id]}
+                  for book_id in book_ids if final[book_id] != args.stock - confirmed[book_id]}
+    oversold = any(stock < 0 for stock in final.values()) or any(sold > args.stock for sold in confirmed.values())
+    result = {
+        "benchmark": "reservations",
+        "commit": git_commit(),
+        "target": args.base_url or f"in-process ({'memory' if args.mongo == 'memory' else 'mongod'})",
+        "config": {"books": args.books, "stock": args.stock, "requests": args.requests,
+                   "concurrency": args.concurrency, "max_cart": args.max_cart, "max_quantity": args.max_quantity,
+                   "release_fraction": args.release_fraction, "expire_fraction": args.expire_fraction,
+                   "seed": args.seed},
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "outcomes": dict(outcomes),
+        "units_sold": sum(confirmed.values()),
+        "still_held": len(still_held),
+        "oversold": oversold,
+        "mismatches": mismatches,
+        "ok": not oversold and not mismatches and not still_held,
+    }
+    print(f"{result['throughput_rps']:.1f} reservations/s  p50 {result['p50_ms']:.2f}  p95 {result['p95_ms']:.2f}  "
+          f"p99 {result['p99_ms']:.2f} ms")
+    print(f"outcomes {result['outcomes']}  units sold {result['units_sold']} of {args.books * args.stock}")
+    print(f"oversold: {oversold}  stock mismatches: {len(mismatches)}  holds not expired: {len(still_held)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL (in-process runs)")
+    parser.add_argument("--database", default=BENCH_DB)
+    parser.add_argument("--base-url", help="Run against a server instead of in-process")
+    parser.add_argument("--books", type=int, default=10, help="Hot books every cart draws from")
+    parser.add_argument("--stock", type=int, default=500, help="Initial stock per book")
+    parser.add_argument("--requests", type=int, default=20000, help="Reservations to attempt")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--max-cart", type=int, default=3, help="Books per cart, up to")
+    parser.add_argument("--max-quantity", type=int, default=3, help="Units per book, up to")
+    parser.add_argument("--release-fraction", type=float, default=0.3, help="Holds released by the client")
+    parser.add_argument("--expire-fraction", type=float, default=0.1, help="Holds abandoned to expire")
+    parser.add_argument("--expire-seconds", type=int, default=1, help="hold_seconds of abandoned holds")
+    parser.add_argument("--expiry-timeout", type=float, default=60,
+                        help="How long to wait for a server's reaper to release abandoned holds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if not result["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
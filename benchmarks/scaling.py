@@ -0,0 +1,138 @@
+"""
+Measure how read throughput scales with the number of `app.server` worker processes. Needs a reachable mongod.
+
+    python -m benchmarks.scaling --workers 1 2 4 8 --duration 20 --only get_book list_books_page
+
+Load comes from several client processes so the client is not the bottleneck; give it cores of its own
+(e.g. taskset the server) when measuring on one machine.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.catalog import BENCH_DB, get_client, seed_books
+from benchmarks.loadtest import SCENARIOS, Context, percentile
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def _drive(base_url: str, ctx: Context, names: list, duration: float, concurrency: int, seed: int) -> tuple:
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                scenario = rng.choice(scenarios)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(scenario.method, **scenario.build(ctx, rng))
+                    errors += response.status_code >= 400
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+
+def client_process(args: tuple) -> tuple:
+    return asyncio.run(_drive(*args))
+
+
+def run_level(workers: int, args, ctx: Context) -> dict:
+    env = {**os.environ, "MONGODB_URL": args.mongodb_url, "MONGODB_DATABASE": args.database,
+           "MONGODB_RECONCILE_INDEXES": "false"}
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(args.port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(base_url, server)
+        jobs = [(base_url, ctx, args.only, args.warmup, args.concurrency, i) for i in range(args.client_processes)]
+        with multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+            pool.map(client_process, jobs)
+            jobs = [(base_url, ctx, args.only, args.duration, args.concurrency, 1000 + i)
+                    for i in range(args.client_processes)]
+            outcomes = pool.map(client_process, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = [latency for samples, _ in outcomes for latency in samples]
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in outcomes),
+        "throughput_rps": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+async def prepare(args) -> Context:
+    os.environ["BENCH_MONGODB_URL"] = args.mongodb_url
+    database = get_client()[args.database]
+    await seed_books(database["books"], args.size)
+    ctx = Context()
+    async for book in database["books"].find({}, {"title": 1}).limit(10000):
+        ctx.book_ids.append(str(book["_id"]))
+        ctx.titles.append(book["title"])
+    return ctx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--mongodb-url", default=os.getenv("BENCH_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default=BENCH_DB)
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent requests per client process")
+    parser.add_argument("--only", nargs="+", default=["get_book", "get_book_by_title", "list_books_page"],
+                        help="Read scenarios from benchmarks.loadtest to mix")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    ctx = asyncio.run(prepare(args))
+    results = []
+    for workers in sorted(set(args.workers)):
+        result = run_level(workers, args, ctx)
+        result["speedup"] = round(result["throughput_rps"] / results[0]["throughput_rps"], 2) if results else 1.0
+        results.append(result)
+        print(f"{workers:>3} workers: {result['throughput_rps']:>9.1f} req/s  x{result['speedup']:<5}  "
+              f"p50 {result['p50_ms']:>7.2f} ms  p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "scaling", "size": args.size, "scenarios": args.only, "results": results}, f,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
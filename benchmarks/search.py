@@ -0,0 +1,86 @@
+"""
+Measure GET /books/search/ latency (text and prefix modes) against a synthetic catalog and fail if p99
+exceeds the budget.
+
+    python -m benchmarks.search --size 1000000 --queries 2000 --budget-ms 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from app.crud.books_crud import BookCRUD
+from app.utils.indexes import BOOK_INDEXES, reconcile_indexes
+from app.utils.search import SearchMode
+from benchmarks.catalog import BENCH_DB, WORDS, get_client, seed_books
+
+
+def make_query(mode: SearchMode, rng: random.Random) -> str:
+    if mode == SearchMode.TEXT:
+        return " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+    # What a search box sends while typing: complete words followed by a partial one
+    words = rng.sample(WORDS, rng.randint(1, 2))
+    return " ".join(words[:-1] + [words[-1][:rng.randint(2, len(words[-1]))]])
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(size: int, queries: int, limit: int, seed: int) -> list:
+    collection = get_client()[BENCH_DB]["books"]
+    await seed_books(collection, size)
+    report = await reconcile_indexes(collection, BOOK_INDEXES)
+    if not report.ok:
+        print(f"books: indexes do not match the registry: {report.mismatched or report.error}")
+    crud = BookCRUD(collection)
+
+    results = []
+    for mode in SearchMode:
+        rng = random.Random(seed)
+        samples, hits = [], 0
+        for _ in range(queries):
+            q = make_query(mode, rng)
+            start = time.perf_counter()
+            page = await crud.search_books(q, mode=mode, limit=limit)
+            samples.append((time.perf_counter() - start) * 1000)
+            hits += bool(page.books)
+        result = {
+            "mode": mode.value,
+            "queries": queries,
+            "with_results": hits,
+            "p50_ms": round(percentile(samples, 0.5), 3),
+            "p95_ms": round(percentile(samples, 0.95), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+            "max_ms": round(max(samples), 3),
+        }
+        results.append(result)
+        print(f"{mode.value:<7} p50 {result['p50_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  "
+              f"p99 {result['p99_ms']:8.3f} ms  ({hits}/{queries} with results)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.size, args.queries, args.limit, args.seed))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "search", "size": args.size, "budget_ms": args.budget_ms, "results": results},
+                      f, indent=2)
+    if any(result["p99_ms"] > args.budget_ms for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
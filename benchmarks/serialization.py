@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the book read serialization paths for 1/100/10k-document responses. No database needed.
+
+    python -m benchmarks.serialization --sizes 1 100 10000
+"""
+import argparse
+import json
+import random
+import timeit
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.schemas.authors_schema import AuthorReferenceResponse
+from app.schemas.books_schema import BookResponseSchema
+from app.utils.responses import MongoJSONResponse
+from benchmarks.catalog import make_book_document
+
+BOOK_LIST = TypeAdapter(List[BookResponseSchema])
+
+
+def validated_from_mongo(book_data: dict) -> BookResponseSchema:
+    # The original from_mongo: normalize, then validate every field
+    book_data = dict(book_data)
+    book_data['id'] = str(book_data['_id'])
+    book_data['author_ids'] = [
+        AuthorReferenceResponse(id=str(author['_id']) if '_id' in author else author['id'], name=author['name'])
+        for author in book_data.get('author_ids', [])
+    ]
+    return BookResponseSchema(**book_data)
+
+
+def legacy_path(docs: List[dict]) -> bytes:
+    # from_mongo validation, then response_model validation + serialization, then JSONResponse rendering
+    books = [validated_from_mongo(doc) for doc in docs]
+    content = BOOK_LIST.dump_python(BOOK_LIST.validate_python(jsonable_encoder(books)), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def construct_path(docs: List[dict]) -> bytes:
+    return MongoJSONResponse([BookResponseSchema.from_mongo(doc) for doc in docs]).body
+
+
+def dict_path(docs: List[dict]) -> bytes:
+    return MongoJSONResponse([BookResponseSchema.dict_from_mongo(doc) for doc in docs]).body
+
+
+PATHS = {"legacy": legacy_path, "model_construct+orjson": construct_path, "dict+orjson": dict_path}
+
+
+def make_documents(size: int) -> List[dict]:
+    rng = random.Random(42)
+    docs = []
+    for i in range(size):
+        doc = make_book_document(i, rng)
+        doc["_id"] = ObjectId()
+        # Mongo returns plain strings, not the enums BookModel holds
+        doc["book_type"] = doc["book_type"].value
+        doc["genre"] = [genre.value for genre in doc["genre"]]
+        docs.append(doc)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        docs = make_documents(size)
+        number = max(1, 20000 // size)
+        row = {"documents": size}
+        for name, path in PATHS.items():
+            best = min(timeit.repeat(lambda: path(docs), number=number, repeat=5)) / number
+            row[f"{name}_ms"] = round(best * 1000, 4)
+        results.append(row)
+        print(f"{size:>6} docs: " + "  ".join(f"{name} {row[f'{name}_ms']:.3f} ms" for name in PATHS))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "serialization", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Time from launching `app.server` to its first 200 on /healthz (process is serving), /readyz (MongoDB reached,
+indexes built, pool and cache warmed) and a catalog read, over several cold starts. Also times a bare
+`import app.main`. Needs a reachable mongod.
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+    STARTUP_WARM_BOOKS=0 python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadtest import git_commit
+
+PROBES = [("healthz", "/healthz"), ("readyz", "/readyz"), ("first_read", "/books/page/?limit=20")]
+
+
+def time_import() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def time_start(args) -> dict:
+    env = {**os.environ, "MONGODB_URL": args.mongodb_url, "MONGODB_DATABASE": args.database}
+    base_url = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "app.server", "--workers", str(args.workers),
+                               "--port", str(args.port)], env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        deadline = time.monotonic() + args.timeout
+        for name, path in PROBES:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {server.returncode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"No 200 from {path} within {args.timeout}s")
+                try:
+                    if httpx.get(f"{base_url}{path}", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.01)
+            timings[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default=os.getenv("BENCH_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="book_store")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for each start")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    print(f"import app.main  median {statistics.median(imports):.1f} ms")
+    runs = []
+    for i in range(args.runs):
+        runs.append(time_start(args))
+        print(f"run {i + 1}: " + "  ".join(f"{name} {ms:.1f} ms" for name, ms in runs[-1].items()))
+    medians = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+    print("median: " + "  ".join(f"{name} {ms:.1f} ms" for name, ms in medians.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "startup", "commit": git_commit(), "workers": args.workers,
+                       "warm_connections": os.getenv("STARTUP_WARM_CONNECTIONS"),
+                       "warm_books": os.getenv("STARTUP_WARM_BOOKS"),
+                       "import_ms": round(statistics.median(imports), 1), "median": medians, "runs": runs}, f,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from dependency_injector import providers
+from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+from pymongo import ReplaceOne, UpdateMany
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+from app.main import app, container  # noqa: E402
+from app.utils.logger import start_logging, stop_logging  # noqa: E402
+
+
+async def _bulk_write(self, operations, ordered=True):
+    # mongomock's bulk_write does not accept the operations of current pymongo; apply them one by one
+    modified = 0
+    for operation in operations:
+        if isinstance(operation, ReplaceOne):
+            result = await self.replace_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+        else:
+            update = self.update_many if isinstance(operation, UpdateMany) else self.update_one
+            options = {"array_filters": operation._array_filters} if operation._array_filters else {}
+            result = await update(operation._filter, operation._doc, upsert=bool(operation._upsert), **options)
+        modified += result.modified_count
+    return SimpleNamespace(modified_count=modified)
+
+
+AsyncMongoMockCollection.bulk_write = _bulk_write
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_segments(tmp_path_factory):
+    # Records still go through the queue and the segment writer, but segments stay out of the tree and off S3
+    os.environ["LOG_SEGMENT_DIR"] = str(tmp_path_factory.mktemp("log-segments"))
+    start_logging(uploader=lambda path, key: True)
+    yield
+    stop_logging()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db_client():
+    client = AsyncMongoMockClient()
+    container.reset_singletons()
+    container.db_client.override(providers.Object(client))
+    yield client
+    container.db_client.reset_override()
+    container.reset_singletons()
+
+
+@pytest.fixture
+async def client(db_client):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def books(db_client):
+    return container.book_collection()
+
+
+async def create_book(client: httpx.AsyncClient, **fields) -> str:
+    book = {"title": "Dune", "author_ids": [{"id": "0" * 24, "name": "Frank Herbert"}], **fields}
+    response = await client.post("/books/", json=book)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+async def create_author(client: httpx.AsyncClient, name: str) -> str:
+    response = await client.post("/authors/", json={"name": name})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockCollection
+
+from app.crud.books_crud import BookCRUD
+from tests.conftest import create_author, create_book
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_put_stores_author_references(client, books):
+    author_id = await create_author(client, "Bob Ross")
+    book_id = await create_book(client)
+
+    response = await client.put(f"/books/{book_id}", json={"author_ids": [{"id": author_id, "name": "Bob Ross"}]})
+
+    assert response.status_code == 200
+    assert response.json()["author_ids"] == [{"id": author_id, "name": "Bob Ross"}]
+    stored = await books.find_one({"_id": ObjectId(book_id)})
+    assert stored["author_ids"] == [{"_id": ObjectId(author_id), "name": "Bob Ross"}]
+
+
+async def test_rename_reaches_books_updated_through_put(client):
+    author_id = await create_author(client, "Bob Ross")
+    book_id = await create_book(client)
+    await client.put(f"/books/{book_id}", json={"author_ids": [{"id": author_id, "name": "Bob Ross"}]})
+
+    response = await client.put(f"/authors/{author_id}", json={"name": "Robert Ross"})
+
+    assert response.status_code == 200
+    book = (await client.get(f"/books/{book_id}", headers={"Cache-Control": "no-cache"})).json()
+    assert book["author_ids"] == [{"id": author_id, "name": "Robert Ross"}]
+    found = (await client.get("/books/query/", params={"author_id": author_id})).json()
+    assert [book["id"] for book in found["books"]] == [book_id]
+
+
+async def test_bulk_patch_stores_author_references(client, books):
+    author_id = await create_author(client, "Bob Ross")
+    book_id, other_id = await create_book(client), await create_book(client, title="Emma")
+
+    response = await client.patch("/books/bulk", json=[
+        {"id": book_id, "update": {"author_ids": [{"id": author_id, "name": "Bob Ross"}]}},
+        {"id": other_id, "update": {"author_ids": [{"id": "not-an-id", "name": "Nobody"}]}},
+    ])
+
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "error"]
+    stored = await books.find_one({"_id": ObjectId(book_id)})
+    assert stored["author_ids"] == [{"_id": ObjectId(author_id), "name": "Bob Ross"}]
+
+
+async def test_bulk_patch_rejects_duplicate_ids(client, books):
+    book_id = await create_book(client, genre=["Fiction"])
+    facets = (await client.get("/books/facets/")).json()
+
+    response = await client.patch("/books/bulk", json=[
+        {"id": book_id, "update": {"genre": ["Fantasy"]}},
+        {"id": book_id, "update": {"genre": ["Mystery"]}},
+    ])
+
+    assert response.status_code == 422
+    assert book_id in response.json()["detail"]
+    assert (await books.find_one({"_id": ObjectId(book_id)}))["genre"] == ["Fiction"]
+    assert (await client.get("/books/facets/")).json() == facets
+
+
+async def test_put_rejects_invalid_author_id(client):
+    book_id = await create_book(client)
+
+    response = await client.put(f"/books/{book_id}", json={"author_ids": [{"id": "not-an-id", "name": "Nobody"}]})
+
+    assert response.status_code == 400
+
+
+async def test_title_lookup_does_not_cache_over_a_racing_write(client, monkeypatch):
+    book_id = await create_book(client, price=10)
+    find_one = BookCRUD._find_one
+    raced = False
+
+    async def racing_find_one(self, collection, query, projection=None):
+        nonlocal raced
+        book = await find_one(self, collection, query, projection)
+        if projection is None and not raced:
+            # The write lands after the document was read but before it is cached
+            raced = True
+            response = await client.put(f"/books/{book_id}", json={"price": 20})
+            assert response.status_code == 200, response.text
+        return book
+
+    monkeypatch.setattr(BookCRUD, "_find_one", racing_find_one)
+    assert (await client.get("/books/title/Dune")).json()["price"] == 10
+    monkeypatch.setattr(BookCRUD, "_find_one", find_one)
+
+    assert (await client.get("/books/title/Dune")).json()["price"] == 20
+
+
+@pytest.mark.parametrize("stream", ["ndjson", "json"])
+async def test_streamed_books_resolve_author_names(client, stream):
+    author_id = await create_author(client, "Bob Ross")
+    for price in (10, 20, 30):
+        await create_book(client, price=price, author_ids=[{"id": author_id, "name": "Old Name"}])
+
+    def names(response):
+        books = [json.loads(line) for line in response.text.splitlines()] if stream == "ndjson" else response.json()
+        return [author["name"] for book in books for author in book["author_ids"]]
+
+    params = {"stream": stream, "batch_size": 2}
+    resolved = await client.get("/books/sorted-by-price/", params={**params, "resolve_authors": "true"})
+    embedded = await client.get("/books/sorted-by-price/", params=params)
+
+    assert names(resolved) == ["Bob Ross"] * 3
+    assert names(embedded) == ["Old Name"] * 3
+
+
+async def test_expected_version_guards_updates(client, books):
+    book_id = await create_book(client, price=10)
+    version = (await client.get(f"/books/{book_id}")).json()["version"]
+
+    updated = await client.put(f"/books/{book_id}", json={"price": 12, "expected_version": version})
+    stale = await client.put(f"/books/{book_id}", json={"price": 15, "expected_version": version})
+
+    assert updated.status_code == 200
+    assert updated.json()["version"] == version + 1
+    assert stale.status_code == 409
+    stored = await books.find_one({"_id": ObjectId(book_id)})
+    assert (stored["price"], stored["version"]) == (12, version + 1)
+
+
+async def test_concurrent_updates_with_the_same_version_apply_once(client, books):
+    book_id = await create_book(client, stock=10)
+    version = (await client.get(f"/books/{book_id}")).json()["version"]
+
+    responses = await asyncio.gather(*[
+        client.put(f"/books/{book_id}", json={"stock_delta": -1, "expected_version": version}) for _ in range(5)])
+
+    assert sorted(response.status_code for response in responses) == [200, 409, 409, 409, 409]
+    assert (await books.find_one({"_id": ObjectId(book_id)}))["stock"] == 9
+
+
+async def test_stock_delta_never_takes_stock_below_zero(client, books):
+    book_id = await create_book(client, stock=3)
+
+    taken = await client.put(f"/books/{book_id}", json={"stock_delta": -2})
+    short = await client.put(f"/books/{book_id}", json={"stock_delta": -2})
+    restocked = await client.put(f"/books/{book_id}", json={"stock_delta": 5})
+
+    assert taken.json()["stock"] == 1
+    assert short.status_code == 409
+    assert "1 available" in short.json()["detail"]
+    assert restocked.json()["stock"] == 6
+    assert (await books.find_one({"_id": ObjectId(book_id)}))["stock"] == 6
+
+
+@pytest.mark.parametrize("guard", [{"stock_delta": -2}, {"expected_version": 1, "stock_delta": -2}])
+async def test_update_raced_by_another_write_asks_for_a_retry(client, books, monkeypatch, guard):
+    book_id = await create_book(client, stock=1)
+    find_one_and_update = AsyncMongoMockCollection.find_one_and_update
+
+    async def racing_find_one_and_update(self, *args, **kwargs):
+        result = await find_one_and_update(self, *args, **kwargs)
+        if result is None:
+            # Restocked after the guarded update missed, before the conflict is diagnosed
+            await books.update_one({"_id": ObjectId(book_id)}, {"$inc": {"stock": 5}})
+        return result
+
+    monkeypatch.setattr(AsyncMongoMockCollection, "find_one_and_update", racing_find_one_and_update)
+    response = await client.put(f"/books/{book_id}", json=guard)
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Concurrent update, retry"
+
+
+async def test_update_rejects_stock_with_stock_delta(client):
+    book_id = await create_book(client, stock=3)
+
+    response = await client.put(f"/books/{book_id}", json={"stock": 5, "stock_delta": 1})
+
+    assert response.status_code == 422
+
+
+async def test_conditional_update_of_a_missing_book_is_not_found(client):
+    response = await client.put(f"/books/{ObjectId()}", json={"stock_delta": -1, "expected_version": 1})
+
+    assert response.status_code == 404
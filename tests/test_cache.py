@@ -0,0 +1,29 @@
+import pytest
+
+from app.cache.backends import InMemoryCacheBackend
+from app.cache.read_through import EntityCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stamps_are_evicted_least_recently_written_first():
+    backend = InMemoryCacheBackend(max_entries=2)
+
+    await backend.incr("a", 60)
+    await backend.incr("b", 60)
+    await backend.incr("a", 60)
+    await backend.incr("c", 60)
+
+    assert await backend.get_many(["a", "b", "c"]) == [2, None, 1]
+    assert (await backend.stats())["stamps"] == 2
+
+
+async def test_evicting_a_live_stamp_cannot_revive_a_stale_entry():
+    cache = EntityCache(InMemoryCacheBackend(max_entries=2), "book", ttl=60)
+    # Cached before any write, so with stamp 0, under a key the write does not delete
+    await cache.store("title", "Dune", {"id": "1", "price": 10}, 0)
+    await cache.invalidate("1")
+    await cache.invalidate("2")
+    await cache.invalidate("3")
+
+    assert await cache.lookup("title", "Dune") == (None, None)
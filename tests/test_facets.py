@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud.change_subscribers import FacetsSubscriber
+from app.main import container
+from app.utils.lease import Lease
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingFacets:
+    def __init__(self):
+        self.rebuilds = 0
+
+    async def rebuild(self):
+        self.rebuilds += 1
+
+
+async def test_lease_is_held_by_one_owner_until_it_expires(db_client):
+    collection = container.leases_collection()
+    first, second = Lease(collection, "job", 60), Lease(collection, "job", 60)
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    assert await first.acquire()
+
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await collection.update_one({"_id": "job"}, {"$set": {"expires_at": expired}})
+    assert await second.acquire()
+    assert not await first.acquire()
+
+
+async def test_only_the_lease_holder_rebuilds_facets(db_client):
+    collection = container.leases_collection()
+    facets = [CountingFacets() for _ in range(3)]
+    subscribers = [FacetsSubscriber(counter, min_interval=0, lease=Lease(collection, "facets_rebuild", 60))
+                   for counter in facets]
+
+    for _ in range(2):
+        for subscriber in subscribers:
+            await subscriber.handle([{"ns": {"coll": "books"}}])
+            await subscriber.idle()
+
+    assert sorted(counter.rebuilds for counter in facets) == [0, 0, 2]
@@ -0,0 +1,19 @@
+import pytest
+
+from tests.conftest import create_book
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 101}, {"skip": -1}])
+async def test_list_books_bounds_skip_and_limit(client, params):
+    response = await client.get("/books/", params=params)
+
+    assert response.status_code == 422
+
+
+async def test_list_books_past_the_end_is_not_found(client):
+    await create_book(client)
+
+    assert len((await client.get("/books/", params={"limit": 100})).json()) == 1
+    assert (await client.get("/books/", params={"skip": 1})).status_code == 404
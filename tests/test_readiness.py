@@ -0,0 +1,29 @@
+import pytest
+
+from app import main
+from app.crud.books_crud import BookCRUD
+from app.utils.readiness import Readiness
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_warm_up_is_reported_without_blocking_readiness(db_client, monkeypatch):
+    async def failing_warm_cache(self, limit):
+        raise RuntimeError("cache unavailable")
+
+    monkeypatch.setattr(BookCRUD, "warm_cache", failing_warm_cache)
+    readiness = Readiness(["cache"])
+
+    await main.warm_up(readiness)
+
+    assert readiness.ready
+    assert readiness.report()["checks"]["cache"]["warning"] == "cache unavailable"
+
+
+async def test_warm_up_passes_without_a_warning(db_client):
+    readiness = Readiness(["cache"])
+
+    await main.warm_up(readiness)
+
+    assert readiness.report()["checks"]["cache"] == {"ok": True, "seconds": readiness.passed_after["cache"],
+                                                     "error": None, "warning": None}
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.main import container
+from tests.conftest import create_book
+
+pytestmark = pytest.mark.anyio
+
+
+async def stock(books, book_id: str) -> int:
+    return (await books.find_one({"_id": ObjectId(book_id)}))["stock"]
+
+
+async def test_out_of_range_hold_is_rejected_without_taking_stock(client, books):
+    book_id = await create_book(client, stock=5)
+
+    response = await client.post("/reservations/", json={"items": [{"book_id": book_id, "quantity": 2}],
+                                                         "hold_seconds": 10 ** 12})
+
+    assert response.status_code == 422
+    assert await stock(books, book_id) == 5
+
+
+async def test_failed_cart_puts_taken_stock_back(client, books):
+    plenty = await create_book(client, stock=5)
+    scarce = await create_book(client, title="Emma", stock=1)
+
+    response = await client.post("/reservations/", json={"items": [{"book_id": plenty, "quantity": 3},
+                                                                   {"book_id": scarce, "quantity": 2}]})
+
+    assert response.status_code == 409
+    assert await stock(books, plenty) == 5
+    assert await stock(books, scarce) == 1
+
+
+async def test_release_restores_stock(client, books):
+    book_id = await create_book(client, stock=5)
+    hold = (await client.post("/reservations/", json={"items": [{"book_id": book_id, "quantity": 2}]})).json()
+    assert await stock(books, book_id) == 3
+
+    response = await client.delete(f"/reservations/{hold['id']}")
+
+    assert response.json()["status"] == "released"
+    assert await stock(books, book_id) == 5
+    assert (await client.delete(f"/reservations/{hold['id']}")).status_code == 409
+
+
+async def test_expired_hold_cannot_be_confirmed_and_returns_its_stock(client, books):
+    book_id = await create_book(client, stock=5)
+    hold = (await client.post("/reservations/", json={"items": [{"book_id": book_id, "quantity": 2}],
+                                                      "hold_seconds": 1})).json()
+    await asyncio.sleep(1.1)
+
+    assert (await client.post(f"/reservations/{hold['id']}/confirm")).status_code == 409
+    assert await container.reservations().release_expired() == 1
+    assert await container.reservations().release_expired() == 0
+    assert (await client.get(f"/reservations/{hold['id']}")).json()["status"] == "expired"
+    assert await stock(books, book_id) == 5
+
+
+async def test_confirmed_hold_keeps_its_stock(client, books):
+    book_id = await create_book(client, stock=5)
+    hold = (await client.post("/reservations/", json={"items": [{"book_id": book_id, "quantity": 2}],
+                                                      "hold_seconds": 1})).json()
+
+    assert (await client.post(f"/reservations/{hold['id']}/confirm")).json()["status"] == "confirmed"
+    await asyncio.sleep(1.1)
+    assert await container.reservations().release_expired() == 0
+    assert await stock(books, book_id) == 3
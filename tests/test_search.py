@@ -0,0 +1,58 @@
+import pytest
+from bson import ObjectId
+
+from app.utils.search import PREFIX_MAX_RESULTS, with_search_terms
+from tests.conftest import create_book
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed(client, books, titles_and_authors):
+    template = await books.find_one({"_id": ObjectId(await create_book(client, title="Template"))})
+    await books.delete_many({})
+    await books.insert_many([
+        with_search_terms({**template, "_id": ObjectId(), "title": title,
+                           "author_ids": [{"_id": ObjectId(), "name": author}]})
+        for title, author in titles_and_authors])
+
+
+async def search_all(client, q, limit):
+    titles, skip = [], 0
+    while skip is not None:
+        response = await client.get("/books/search/", params={"q": q, "mode": "prefix", "skip": skip, "limit": limit})
+        assert response.status_code == 200, response.text
+        titles += [book["title"] for book in response.json()["books"]]
+        skip = response.json()["next_skip"]
+    return titles
+
+
+async def test_prefix_ranks_across_the_whole_match_set(client, books):
+    # Author-only partial matches first in natural order, more than a fixed candidate window would hold
+    await seed(client, books, [(f"Book {i:03}", "Dunemore") for i in range(300)]
+               + [("Sand", "Dune"), ("Dunes of Mars", "Ann"), ("Dune", "Frank Herbert")])
+
+    titles = await search_all(client, "dune", limit=50)
+
+    assert titles[:4] == ["Dune", "Dunes of Mars", "Sand", "Book 000"]
+    assert titles[4:] == [f"Book {i:03}" for i in range(1, 300)]
+
+
+async def test_prefix_pages_do_not_overlap(client, books):
+    await seed(client, books, [(f"Dune {i:02}", "Ann") for i in range(30)] + [("Other", "Dunemore")])
+
+    titles = await search_all(client, "dune", limit=7)
+
+    assert titles == [f"Dune {i:02}" for i in range(30)] + ["Other"]
+
+
+async def test_prefix_paging_stops_at_the_result_cap(client, books):
+    await seed(client, books, [(f"Dune {i:04}", "Ann") for i in range(PREFIX_MAX_RESULTS + 5)])
+
+    last = await client.get("/books/search/", params={"q": "dune", "mode": "prefix", "skip": PREFIX_MAX_RESULTS - 10,
+                                                      "limit": 20})
+    past = await client.get("/books/search/", params={"q": "dune", "mode": "prefix", "skip": PREFIX_MAX_RESULTS})
+
+    assert [book["title"] for book in last.json()["books"]] == \
+        [f"Dune {i:04}" for i in range(PREFIX_MAX_RESULTS - 10, PREFIX_MAX_RESULTS)]
+    assert last.json()["next_skip"] is None
+    assert past.json() == {"books": [], "next_skip": None}
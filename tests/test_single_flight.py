@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from app.crud.books_crud import BookCRUD
+from app.utils.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reads_differing_only_in_allow_disk_use_are_not_coalesced(books):
+    single_flight = SingleFlight()
+    crud = BookCRUD(books, single_flight=single_flight)
+    query = {"price": {"$gte": 0}}
+
+    await asyncio.gather(crud._find(books, query, None, 10, allow_disk_use=False),
+                         crud._find(books, query, None, 10, allow_disk_use=True))
+
+    assert (single_flight.calls, single_flight.coalesced) == (2, 0)